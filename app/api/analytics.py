@@ -0,0 +1,87 @@
+from datetime import date
+from decimal import Decimal
+from typing import Any, Optional
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.api import deps
+from app.core.principal import Principal
+from app.db.models import InvoiceHeader, InvoiceLineItem
+from app.schemas.analytics import HsnTaxReport, HsnTaxRow, SupplierInvoice, SupplierInvoices
+
+router = APIRouter()
+
+# Aggregates read the normalized tables (app.services.normalization), never
+# extracted_json, so each is a single indexed query.
+
+@router.get("/tax-by-hsn", response_model=HsnTaxReport)
+def tax_by_hsn(
+    db: Session = Depends(deps.get_db),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    current_user: Principal = Depends(deps.get_current_user)
+) -> Any:
+    """Taxable value and tax per HSN code for invoices dated in
+    [date_from, date_to]; both bounds are optional and inclusive."""
+    stmt = (
+        select(
+            InvoiceLineItem.hsn_code,
+            func.count().label("line_count"),
+            func.count(func.distinct(InvoiceLineItem.invoice_id)).label("invoice_count"),
+            func.coalesce(func.sum(InvoiceLineItem.taxable_value), 0).label("taxable_value"),
+            func.coalesce(func.sum(InvoiceLineItem.tax_amount), 0).label("tax_amount"),
+        )
+        .where(InvoiceLineItem.user_id == current_user.id)
+        .group_by(InvoiceLineItem.hsn_code)
+        .order_by(func.sum(InvoiceLineItem.tax_amount).desc(), InvoiceLineItem.hsn_code)
+    )
+    if date_from:
+        stmt = stmt.where(InvoiceLineItem.invoice_date >= date_from)
+    if date_to:
+        stmt = stmt.where(InvoiceLineItem.invoice_date <= date_to)
+    rows = [
+        HsnTaxRow(
+            hsn_code=row.hsn_code,
+            line_count=row.line_count,
+            invoice_count=row.invoice_count,
+            taxable_value=Decimal(str(row.taxable_value)),
+            tax_amount=Decimal(str(row.tax_amount)),
+        )
+        for row in db.execute(stmt)
+    ]
+    return HsnTaxReport(date_from=date_from, date_to=date_to, rows=rows)
+
+@router.get("/suppliers/{gstin}/invoices", response_model=SupplierInvoices)
+def supplier_invoices(
+    gstin: str,
+    db: Session = Depends(deps.get_db),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    limit: int = Query(100, ge=1, le=500),
+    current_user: Principal = Depends(deps.get_current_user)
+) -> Any:
+    """Invoices from one supplier GSTIN, newest first, with the count and
+    total over the whole (optionally date-bounded) range."""
+    gstin = gstin.strip().upper()
+    conditions = [InvoiceHeader.user_id == current_user.id, InvoiceHeader.supplier_gstin == gstin]
+    if date_from:
+        conditions.append(InvoiceHeader.invoice_date >= date_from)
+    if date_to:
+        conditions.append(InvoiceHeader.invoice_date <= date_to)
+
+    count, total = db.execute(
+        select(func.count(), func.coalesce(func.sum(InvoiceHeader.total_amount), 0)).where(*conditions)
+    ).one()
+    headers = db.scalars(
+        select(InvoiceHeader)
+        .where(*conditions)
+        .order_by(InvoiceHeader.invoice_date.desc(), InvoiceHeader.invoice_id.desc())
+        .limit(limit)
+    ).all()
+    return SupplierInvoices(
+        gstin=gstin,
+        invoice_count=count,
+        total_amount=Decimal(str(total)),
+        items=[SupplierInvoice.from_orm(header) for header in headers],
+    )
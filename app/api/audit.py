@@ -3,6 +3,7 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from app.api import deps
 from app.db.models import AuditLog
+from app.services.audit_service import AuditService
 
 router = APIRouter()
 
@@ -13,3 +14,10 @@ def get_audit_logs(
     current_user = Depends(deps.get_current_active_admin)
 ) -> Any:
     return db.query(AuditLog).filter(AuditLog.run_id == run_id).all()
+
+@router.get("/verify", response_model=None)
+def verify_audit_chain(
+    db: Session = Depends(deps.get_db),
+    current_user = Depends(deps.get_current_active_admin)
+) -> Any:
+    return AuditService.verify_chain(db)
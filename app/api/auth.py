@@ -1,56 +1,83 @@
 from datetime import timedelta
-from typing import Any
+from typing import Any, Optional
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
 from app.api import deps
 from app.core import security
 from app.core.config import settings
-from app.utils.hashing import Hasher
+from app.utils.hashing import Hasher, HashPoolBusy, password_pool
 from app.db.models import User
-from app.schemas.user import UserCreate, UserResponse, GoogleLoginRequest
+from app.core.principal import Principal, principal_cache
+from app.schemas.user import UserCreate, UserResponse, GoogleLoginRequest, UserRoleUpdate
 from app.schemas.token import Token
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
-import secrets
+from app.services.audit_service import AuditService
+from app.core.google_auth import google_verifier
 
 router = APIRouter()
 
+def _get_user_by_email(db: Session, email: str) -> Optional[User]:
+    return db.query(User).filter(User.email == email).first()
+
+def _create_user(db: Session, email: str, password_hash: str) -> User:
+    user = User(email=email, password_hash=password_hash, role="user")
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+def _update_password_hash(db: Session, user: User, password_hash: str) -> None:
+    user.password_hash = password_hash
+    db.commit()
+
+async def _hash_in_pool(coro):
+    try:
+        return await coro
+    except HashPoolBusy:
+        raise HTTPException(status_code=503, detail="Too many sign-in attempts in progress, retry shortly", headers={"Retry-After": "1"})
+
+# bcrypt runs on the dedicated password pool and the short DB calls on the
+# threadpool, so a login burst does not hold threadpool slots for ~250ms each.
 @router.post("/signup", response_model=UserResponse)
-def create_user(
+async def create_user(
     user_in: UserCreate,
     db: Session = Depends(deps.get_db)
 ) -> Any:
-    user = db.query(User).filter(User.email == user_in.email).first()
+    user = await run_in_threadpool(_get_user_by_email, db, user_in.email)
     if user:
         raise HTTPException(
             status_code=400,
             detail="The user with this username already exists in the system.",
         )
-    user = User(
-        email=user_in.email,
-        password_hash=Hasher.get_password_hash(user_in.password),
-        role="user" 
-    )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
+    password_hash = await _hash_in_pool(password_pool.hash(user_in.password))
+    user = await run_in_threadpool(_create_user, db, user_in.email, password_hash)
+    AuditService.log_event(db, user.id, "/auth/signup", "user_created")
     return user
 
 @router.post("/login", response_model=Token)
-def login_access_token(
+async def login_access_token(
     db: Session = Depends(deps.get_db),
     form_data: OAuth2PasswordRequestForm = Depends()
 ) -> Any:
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not Hasher.verify_password(form_data.password, user.password_hash):
+    user = await run_in_threadpool(_get_user_by_email, db, form_data.username)
+    if not user:
         raise HTTPException(status_code=400, detail="Incorrect email or password")
-    
+    valid, new_hash = await _hash_in_pool(password_pool.verify_and_update(form_data.password, user.password_hash))
+    if not valid:
+        AuditService.log_event(db, user.id, "/auth/login", "login_failed")
+        raise HTTPException(status_code=400, detail="Incorrect email or password")
+    claims = security.user_token_claims(user)
+    if new_hash:
+        # BCRYPT_ROUNDS changed since this hash was made
+        await run_in_threadpool(_update_password_hash, db, user, new_hash)
+    AuditService.log_event(db, claims["uid"], "/auth/login", "login")
+
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     return {
         "access_token": security.create_access_token(
-            data={"sub": user.email}, expires_delta=access_token_expires
+            data=claims, expires_delta=access_token_expires
         ),
         "refresh_token": security.create_refresh_token(
             data={"sub": user.email}
@@ -69,58 +96,72 @@ def refresh_token(
         email = payload.get("sub")
     except security.jwt.JWTError:
          raise HTTPException(status_code=403, detail="Invalid refresh token")
-         
+
+    # Re-read the user so the new access token carries the current role
+    user = db.query(User).filter(User.email == email).first()
+    if not user:
+        raise HTTPException(status_code=403, detail="Invalid refresh token")
+
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     return {
         "access_token": security.create_access_token(
-            data={"sub": email}, expires_delta=access_token_expires
+            data=security.user_token_claims(user), expires_delta=access_token_expires
         ),
         "refresh_token": refresh_token,
         "token_type": "bearer",
     }
 
-@router.post("/google", response_model=Token)
-def google_login(
-    login_data: GoogleLoginRequest,
-    db: Session = Depends(deps.get_db)
-) -> Any:
+def _google_user(db: Session, token: str) -> User:
     try:
-        # Verify token
-        # Specify the CLIENT_ID of the app that accesses the backend:
-        id_info = id_token.verify_oauth2_token(
-            login_data.token, 
-            google_requests.Request(), 
-            settings.GOOGLE_CLIENT_ID
-        )
-
-        # ID token is valid. Get the user's Google Account ID from the decoded token.
-        # userid = id_info['sub']
+        # Checked against locally cached Google certs; no round trip per login
+        id_info = google_verifier.verify(token)
         email = id_info['email']
-    except ValueError as e:
+    except (ValueError, KeyError) as e:
         # Invalid token
         raise HTTPException(status_code=400, detail=f"Invalid Google token: {str(e)}")
 
-    user = db.query(User).filter(User.email == email).first()
+    user = _get_user_by_email(db, email)
     if not user:
-        # Create user
-        # Generate a random password since they use Google
-        random_password = secrets.token_urlsafe(16)
-        user = User(
-            email=email,
-            password_hash=Hasher.get_password_hash(random_password),
-            role="user" 
-        )
-        db.add(user)
-        db.commit()
-        db.refresh(user)
+        # Google-only accounts get an unusable password; nothing to bcrypt
+        user = _create_user(db, email, Hasher.unusable_password())
+    return user
+
+@router.post("/google", response_model=Token)
+async def google_login(
+    login_data: GoogleLoginRequest,
+    db: Session = Depends(deps.get_db)
+) -> Any:
+    user = await run_in_threadpool(_google_user, db, login_data.token)
+    AuditService.log_event(db, user.id, "/auth/google", "login")
     
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     return {
         "access_token": security.create_access_token(
-            data={"sub": user.email}, expires_delta=access_token_expires
+            data=security.user_token_claims(user), expires_delta=access_token_expires
         ),
         "refresh_token": security.create_refresh_token(
             data={"sub": user.email}
         ),
         "token_type": "bearer",
     }
+
+@router.put("/users/{user_id}/role", response_model=UserResponse)
+def update_user_role(
+    user_id: int,
+    role_in: UserRoleUpdate,
+    db: Session = Depends(deps.get_db),
+    current_user: Principal = Depends(deps.get_current_active_admin)
+) -> Any:
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    user.role = role_in.role.value
+    db.commit()
+    db.refresh(user)
+    # Cached principals and role claims in already-issued tokens are stale now
+    principal_cache.invalidate_user(user.id)
+    AuditService.log_event(
+        db, current_user.id, "/auth/users/{user_id}/role", "role_changed",
+        payload={"user_id": user.id, "role": user.role},
+    )
+    return user
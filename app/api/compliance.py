@@ -1,52 +1,175 @@
-from typing import Any
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import asyncio
+import json
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, List, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from app.api import deps
-from app.db.models import Run, Invoice, User, RunStatus
-from app.schemas.compliance import RunResponse
-from app.services.compliance_engine import ComplianceEngine
+from app.core.principal import Principal
+from app.core.config import settings
+from app.db.models import Run, Invoice, InvoiceData, RunStatus, ComplianceBatch, Violation
+from app.schemas.compliance import RunResponse, BatchRunRequest, BatchResponse, ViolationSchema
+from app.services.audit_service import AuditService
+from app.services.batch_compliance import BatchComplianceService
+from app.services.run_executor import RunEvent, run_executor
 import uuid
 
 router = APIRouter()
 
-@router.post("/run", response_model=RunResponse)
+@router.post("/run", response_model=RunResponse, status_code=202)
 def run_compliance(
     invoice_id: int,
     db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user)
+    current_user: Principal = Depends(deps.get_current_user)
 ) -> Any:
-    invoice = db.query(Invoice).filter(Invoice.id == invoice_id, Invoice.user_id == current_user.id).first()
+    invoice = db.query(Invoice.id).filter(Invoice.id == invoice_id, Invoice.user_id == current_user.id).first()
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
-        
-    if not invoice.data:
+
+    # Existence check only; the executor loads extracted_json itself
+    if not db.query(InvoiceData.id).filter(InvoiceData.invoice_id == invoice_id).first():
          raise HTTPException(status_code=400, detail="Invoice not processed yet. Wait for ingestion.")
 
     # Create Run
     run_id = str(uuid.uuid4())
-    run = Run(
+    start_ts = datetime.utcnow()
+    db.add(Run(
         run_id=run_id,
         user_id=current_user.id,
-        invoice_id=invoice.id,
-        status=RunStatus.RUNNING
-    )
-    db.add(run)
+        invoice_id=invoice_id,
+        status=RunStatus.RUNNING,
+        start_ts=start_ts,
+        # Evaluating rules calls no LLM; the extraction's spend stays on
+        # InvoiceData, counted once however often the invoice is checked
+        token_cost=0.0
+    ))
     db.commit()
-    
-    # Execute Compliance Engine (Synchronous for MVP simplicity, could be backgrounded)
-    engine = ComplianceEngine(db)
-    engine.run_compliance_checks(run, invoice.data.extracted_json)
-    
-    db.refresh(run)
-    return run
+    AuditService.log_event(
+        db, current_user.id, "/compliance/run", "compliance_run_started",
+        payload={"invoice_id": invoice_id}, run_id=run_id,
+    )
+
+    # Evaluate in the background; poll GET /runs/{run_id} or stream /runs/{run_id}/events
+    run_executor.submit(db.get_bind(), run_id)
+    return RunResponse(run_id=run_id, status=RunStatus.RUNNING.value, start_ts=start_ts, end_ts=None, token_cost=0.0)
 
 @router.get("/runs/{run_id}", response_model=RunResponse)
-def get_run(
+async def get_run(
     run_id: str,
-    db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user)
+    db: AsyncSession = Depends(deps.get_async_db),
+    current_user: Principal = Depends(deps.get_current_user)
 ) -> Any:
-    run = db.query(Run).filter(Run.run_id == run_id, Run.user_id == current_user.id).first()
+    # Polled by clients while a run is in progress: read on the event loop
+    # through the async engine instead of holding a threadpool thread
+    run = await db.scalar(
+        select(Run)
+        .options(selectinload(Run.violations))
+        .where(Run.run_id == run_id, Run.user_id == current_user.id)
+    )
     if not run:
         raise HTTPException(status_code=404, detail="Run not found")
     return run
+
+def _sse(name: str, payload: dict) -> str:
+    return f"event: {name}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+def _load_finished_run(bind: Engine, run_id: str) -> Tuple[str, datetime, List[dict]]:
+    db = Session(bind=bind)
+    try:
+        status, start_ts = db.query(Run.status, Run.start_ts).filter(Run.run_id == run_id).one()
+        if status == RunStatus.RUNNING:
+            return status, start_ts, []
+        violations = db.query(Violation).filter(Violation.run_id == run_id).order_by(Violation.id).all()
+        return status, start_ts, [ViolationSchema.from_orm(v).dict() for v in violations]
+    finally:
+        db.close()
+
+async def _replay_from_db(bind: Engine, run_id: str) -> AsyncIterator[RunEvent]:
+    # The run is executing in another process, or finished long enough ago
+    # that its channel was dropped: wait for it in the DB, then replay.
+    yield "status", {"run_id": run_id, "status": RunStatus.RUNNING.value}
+    timeout = timedelta(seconds=settings.COMPLIANCE_RUN_STREAM_TIMEOUT_SECONDS)
+    while True:
+        status, start_ts, violations = await run_in_threadpool(_load_finished_run, bind, run_id)
+        if status != RunStatus.RUNNING:
+            break
+        # Measured from the run's start, so reconnecting does not extend it;
+        # a run whose executor died never leaves RUNNING
+        if datetime.utcnow() - start_ts >= timeout:
+            yield "error", {"run_id": run_id, "detail": f"Run did not finish within {int(timeout.total_seconds())} seconds"}
+            return
+        await asyncio.sleep(settings.COMPLIANCE_RUN_STREAM_POLL_SECONDS)
+    for violation in violations:
+        yield "violation", violation
+    yield "status", {"run_id": run_id, "status": status}
+
+@router.get("/runs/{run_id}/events")
+def stream_run_events(
+    run_id: str,
+    db: Session = Depends(deps.get_db),
+    current_user: Principal = Depends(deps.get_current_user)
+) -> Any:
+    if not db.query(Run.run_id).filter(Run.run_id == run_id, Run.user_id == current_user.id).first():
+        raise HTTPException(status_code=404, detail="Run not found")
+
+    channel = run_executor.channel(run_id)
+    events = channel.subscribe() if channel else _replay_from_db(db.get_bind(), run_id)
+
+    async def body() -> AsyncIterator[str]:
+        async for name, payload in events:
+            yield _sse(name, payload)
+
+    return StreamingResponse(body(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@router.post("/batches", response_model=BatchResponse)
+def run_compliance_batch(
+    batch_in: BatchRunRequest,
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(deps.get_db),
+    current_user: Principal = Depends(deps.get_current_user)
+) -> Any:
+    if batch_in.invoice_ids is None and not (batch_in.status or batch_in.uploaded_from or batch_in.uploaded_to):
+        raise HTTPException(status_code=400, detail="Provide invoice_ids or at least one filter")
+
+    service = BatchComplianceService(db)
+    invoice_ids = service.resolve_invoice_ids(
+        current_user.id,
+        invoice_ids=batch_in.invoice_ids,
+        status=batch_in.status,
+        uploaded_from=batch_in.uploaded_from,
+        uploaded_to=batch_in.uploaded_to,
+    )
+    if len(invoice_ids) > settings.COMPLIANCE_BATCH_MAX_INVOICES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch too large ({len(invoice_ids)} invoices, max {settings.COMPLIANCE_BATCH_MAX_INVOICES})",
+        )
+
+    batch = service.run_batch(current_user.id, invoice_ids)
+    AuditService.log_event(
+        db, current_user.id, "/compliance/batches", "compliance_batch_run",
+        payload={"batch_id": batch.batch_id, "invoice_count": len(invoice_ids)},
+    )
+    response = BatchResponse.from_orm(batch)
+    response.results = service.get_results(batch.batch_id, limit=limit)
+    return response
+
+@router.get("/batches/{batch_id}", response_model=BatchResponse)
+def get_batch(
+    batch_id: str,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(deps.get_db),
+    current_user: Principal = Depends(deps.get_current_user)
+) -> Any:
+    batch = db.query(ComplianceBatch).filter(ComplianceBatch.batch_id == batch_id, ComplianceBatch.user_id == current_user.id).first()
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    response = BatchResponse.from_orm(batch)
+    response.results = BatchComplianceService(db).get_results(batch_id, skip=skip, limit=limit)
+    return response
@@ -1,13 +1,15 @@
-from typing import Generator, Optional
+from typing import AsyncGenerator, Generator, Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from redis import Redis
-from rq import Queue
 
 from app.core.config import settings
-from app.db.session import SessionLocal
+from app.core.metrics import metrics
+from app.core.principal import Principal, principal_cache
+from app.core.queue import JobQueue, job_queue
+from app.db.session import SessionLocal, get_async_sessionmaker
 from app.db.models import User
 from app.schemas.token import TokenPayload
 
@@ -20,14 +22,21 @@ def get_db() -> Generator:
     finally:
         db.close()
 
-def get_queue() -> Queue:
-    redis_conn = Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
-    return Queue(connection=redis_conn)
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+def get_queue() -> JobQueue:
+    return job_queue
 
 def get_current_user(
     db: Session = Depends(get_db),
     token: str = Depends(reusable_oauth2)
-) -> User:
+) -> Principal:
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
@@ -38,15 +47,31 @@ def get_current_user(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user = db.query(User).filter(User.email == token_data.sub).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
+
+    if (
+        settings.AUTH_TRUST_TOKEN_CLAIMS
+        and token_data.uid is not None and token_data.role and token_data.sub
+        and not principal_cache.claims_revoked(token_data.uid, token_data.iat)
+    ):
+        principal = Principal(id=token_data.uid, email=token_data.sub, role=token_data.role)
+    else:
+        metrics.inc("auth_db_lookups")
+        user = db.query(User.id, User.email, User.role).filter(User.email == token_data.sub).first()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        principal = Principal(id=user.id, email=user.email, role=user.role)
+
+    principal_cache.put(token, principal, token_data.exp)
+    return principal
 
 def get_current_active_admin(
-    current_user: User = Depends(get_current_user),
-) -> User:
-    if current_user.role != "admin":
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+) -> Principal:
+    # Cached principals and token claims may predate a demotion made in
+    # another process; admin access is always confirmed against the DB
+    role = db.query(User.role).filter(User.id == current_user.id).scalar()
+    if role != "admin":
         raise HTTPException(
             status_code=400, detail="The user doesn't have enough privileges"
         )
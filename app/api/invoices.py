@@ -1,84 +1,266 @@
-import shutil
 import uuid
 import os
-from typing import List, Any
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
-from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, insert, select, tuple_
+from sqlalchemy.orm import Session, joinedload
 from pathlib import Path
-from redis import Redis
-from rq import Queue
 
 from app.api import deps
-from app.db.models import Invoice, User, InvoiceStatus, InvoiceData
-from app.schemas.invoice import InvoiceResponse, InvoiceDetail
+from app.core.principal import Principal
+from app.core.queue import JobQueue
+from app.db.models import Invoice, InvoiceStatus, InvoiceData, Run, Violation
+from app.schemas.invoice import InvoiceResponse, InvoiceDetail, InvoicePage, InvoiceSummary, LatestRunSummary, BulkUploadResponse
 from app.core.config import settings
-from app.utils.file_utils import FileUtils
-
-# Redis Setup
-try:
-    redis_conn = Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, socket_connect_timeout=1)
-    redis_conn.ping()
-    q = Queue(connection=redis_conn)
-except Exception as e:
-    print(f"Warning: Redis not connected. Background tasks will fail. {e}")
-    q = None
+from app.utils.file_utils import FileUtils, StoredUpload, UploadRejected
+from app.utils.pagination import Cursor
+from app.services.audit_service import AuditService
+from app.services.dedup_service import DedupService
+from app.services.normalization import NormalizationService
 
 router = APIRouter()
 
+def _register_upload(db: Session, user_id: int, filename: str, file_path: Path, stored: StoredUpload, q: JobQueue) -> Invoice:
+    # Create DB Entry
+    invoice = Invoice(
+        user_id=user_id,
+        filename=filename,
+        stored_path=str(file_path),
+        invoice_hash=stored.sha256,
+        page_count=stored.page_count,
+        status=InvoiceStatus.UPLOADED
+    )
+
+    # Same bytes already extracted: reuse the result instead of re-running OCR
+    dedup = DedupService(db)
+    match = dedup.find_processed(stored.sha256, user_id)
+    if match:
+        dedup.link_duplicate(invoice, *match)
+        os.remove(file_path)
+    else:
+        db.add(invoice)
+    db.commit()
+    db.refresh(invoice)
+    AuditService.log_event(
+        db, user_id, "/invoices/upload", "invoice_uploaded",
+        payload={"invoice_id": invoice.id, "filename": filename, "sha256": stored.sha256},
+    )
+    if match:
+        return invoice
+
+    # Enqueue for the ingestion workers (runs in process if Redis is down)
+    q.enqueue_invoices([invoice.id], priority="interactive")
+
+    return invoice
+
 @router.post("/upload", response_model=InvoiceResponse)
-def upload_invoice(
+async def upload_invoice(
     file: UploadFile = File(...),
     db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user),
-    q: Queue = Depends(deps.get_queue)
+    current_user: Principal = Depends(deps.get_current_user),
+    q: JobQueue = Depends(deps.get_queue)
 ) -> Any:
-    if not file.filename.endswith(".pdf"):
-
+    if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files allowed")
 
     # Save file
     file_id = str(uuid.uuid4())
     safe_filename = f"{file_id}_{file.filename}"
     file_path = Path(settings.UPLOAD_FOLDER) / safe_filename
-    
-    FileUtils.save_upload_file(file, file_path)
-    
-    # Create DB Entry
-    invoice = Invoice(
-        user_id=current_user.id,
-        filename=file.filename,
-        stored_path=str(file_path),
-        status=InvoiceStatus.UPLOADED
-    )
-    db.add(invoice)
+
+    # Stream to disk on the event loop: hash, size cap, %PDF check and page
+    # count all happen while the bytes are written.
+    try:
+        stored = await FileUtils.stream_upload_file(file, file_path, settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    # The DB work is short but blocking, so it goes to the threadpool
+    return await run_in_threadpool(_register_upload, db, current_user.id, file.filename, file_path, stored, q)
+
+def _register_bulk(db: Session, user_id: int, accepted: List[Tuple[str, Path, StoredUpload]], q: JobQueue) -> List[dict]:
+    matches = DedupService(db).find_processed_many([stored.sha256 for _, _, stored in accepted], user_id)
+
+    now = datetime.utcnow()
+    rows = []
+    for filename, file_path, stored in accepted:
+        row = {
+            "user_id": user_id,
+            "filename": filename,
+            "stored_path": str(file_path),
+            "invoice_hash": stored.sha256,
+            "page_count": stored.page_count,
+            "duplicate_of_id": None,
+            "status": InvoiceStatus.UPLOADED,
+            "uploaded_at": now,
+        }
+        match = matches.get(stored.sha256)
+        if match:
+            row.update(stored_path=match[0].stored_path, duplicate_of_id=match[0].id, status=InvoiceStatus.COMPLETED)
+            os.remove(file_path)
+        rows.append(row)
+
+    # One multi-row INSERT for the whole batch
+    invoice_ids = db.scalars(insert(Invoice).returning(Invoice.id, sort_by_parameter_order=True), rows).all()
+    duplicate_data = [
+        DedupService.duplicate_data(invoice_id, matches[row["invoice_hash"]][1])
+        for invoice_id, row in zip(invoice_ids, rows)
+        if row["duplicate_of_id"]
+    ]
+    if duplicate_data:
+        db.execute(insert(InvoiceData), duplicate_data)
+        NormalizationService(db).stage({
+            invoice_id: matches[row["invoice_hash"]][1].extracted_json
+            for invoice_id, row in zip(invoice_ids, rows)
+            if row["duplicate_of_id"] and DedupService.counts_separately(user_id, matches[row["invoice_hash"]][0])
+        })
     db.commit()
-    db.refresh(invoice)
+    AuditService.log_event(
+        db, user_id, "/invoices/bulk-upload", "invoices_uploaded",
+        payload={"invoice_ids": list(invoice_ids), "duplicates": len(duplicate_data)},
+    )
 
-    # Enqueue Job
-    if q:
-        from app.workers.ingestion_worker import process_invoice_job
-        q.enqueue(process_invoice_job, invoice.id)
-    else:
-        print("Redis queue not available. Skipping background job.")
+    pending = [invoice_id for invoice_id, row in zip(invoice_ids, rows) if not row["duplicate_of_id"]]
+    # Behind single uploads, in one RPUSH
+    q.enqueue_invoices(pending, priority="bulk")
 
-    return invoice
+    return [
+        {"invoice_id": invoice_id, "filename": row["filename"], "status": row["status"], "duplicate_of_id": row["duplicate_of_id"]}
+        for invoice_id, row in zip(invoice_ids, rows)
+    ]
 
-@router.get("/", response_model=List[InvoiceResponse])
+@router.post("/bulk-upload", response_model=BulkUploadResponse)
+async def bulk_upload_invoices(
+    files: List[UploadFile] = File(...),
+    db: Session = Depends(deps.get_db),
+    current_user: Principal = Depends(deps.get_current_user),
+    q: JobQueue = Depends(deps.get_queue)
+) -> Any:
+    """Upload many PDFs at once, loose or inside ZIP archives."""
+    folder = Path(settings.UPLOAD_FOLDER)
+    max_bytes = settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024
+    accepted: List[Tuple[str, Path, StoredUpload]] = []
+    rejected: List[dict] = []
+    # Shared by every archive in the request
+    extract_budget = settings.MAX_ARCHIVE_EXTRACTED_MB * 1024 * 1024
+
+    for file in files:
+        remaining = settings.MAX_BULK_FILES - len(accepted) - len(rejected)
+        name = file.filename or ""
+        try:
+            if remaining <= 0:
+                raise UploadRejected(413, f"More than {settings.MAX_BULK_FILES} files in one request")
+            if name.lower().endswith(".zip"):
+                # Decompression is CPU work: one threadpool hop per archive
+                members, member_rejections = await run_in_threadpool(
+                    FileUtils.extract_zip_pdfs, file.file, folder, max_bytes, remaining, extract_budget
+                )
+                extract_budget -= sum(stored.size for _, _, stored in members)
+                accepted.extend(members)
+                rejected.extend({"filename": f"{name}/{member}", "reason": reason} for member, reason in member_rejections)
+            elif name.lower().endswith(".pdf"):
+                file_path = folder / f"{uuid.uuid4()}_{name}"
+                accepted.append((name, file_path, await FileUtils.stream_upload_file(file, file_path, max_bytes)))
+            else:
+                raise UploadRejected(400, "Only PDF or ZIP files allowed")
+        except UploadRejected as e:
+            rejected.append({"filename": name, "reason": e.detail})
+        finally:
+            await file.close()
+
+    created = await run_in_threadpool(_register_bulk, db, current_user.id, accepted, q) if accepted else []
+    return {"created": created, "rejected": rejected}
+
+def _latest_runs(db: Session, invoice_ids: List[int]) -> Dict[int, LatestRunSummary]:
+    """Most recent run per invoice with its violation count, in one query."""
+    if not invoice_ids:
+        return {}
+    ranked = (
+        select(
+            Run.run_id, Run.invoice_id, Run.status, Run.start_ts, Run.end_ts,
+            func.row_number().over(partition_by=Run.invoice_id, order_by=(Run.start_ts.desc(), Run.run_id.desc())).label("rn"),
+        )
+        .where(Run.invoice_id.in_(invoice_ids))
+        .subquery()
+    )
+    rows = db.execute(
+        select(ranked.c.run_id, ranked.c.invoice_id, ranked.c.status, ranked.c.start_ts, ranked.c.end_ts, func.count(Violation.id))
+        .outerjoin(Violation, Violation.run_id == ranked.c.run_id)
+        .where(ranked.c.rn == 1)
+        .group_by(ranked.c.run_id, ranked.c.invoice_id, ranked.c.status, ranked.c.start_ts, ranked.c.end_ts)
+    ).all()
+    return {
+        invoice_id: LatestRunSummary(run_id=run_id, status=status, start_ts=start_ts, end_ts=end_ts, violation_count=count)
+        for run_id, invoice_id, status, start_ts, end_ts, count in rows
+    }
+
+@router.get("/", response_model=InvoicePage, response_model_exclude_unset=True)
 def get_invoices(
     db: Session = Depends(deps.get_db),
-    skip: int = 0,
-    limit: int = 100,
-    current_user: User = Depends(deps.get_current_user)
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    status: Optional[str] = None,
+    uploaded_from: Optional[datetime] = None,
+    uploaded_to: Optional[datetime] = None,
+    filename_prefix: Optional[str] = None,
+    include: Optional[str] = None,
+    current_user: Principal = Depends(deps.get_current_user)
 ) -> Any:
-    return db.query(Invoice).filter(Invoice.user_id == current_user.id).offset(skip).limit(limit).all()
+    """Newest first, paginated by keyset on (uploaded_at, id): pass
+    `next_cursor` back as `cursor`. Deep pages cost the same as the first.
+
+    `include=summary` adds extraction status and the latest run per
+    invoice; the page still costs a fixed number of queries."""
+    query = db.query(Invoice).filter(Invoice.user_id == current_user.id)
+    if status:
+        query = query.filter(Invoice.status == status)
+    if uploaded_from:
+        query = query.filter(Invoice.uploaded_at >= uploaded_from)
+    if uploaded_to:
+        query = query.filter(Invoice.uploaded_at < uploaded_to)
+    if filename_prefix:
+        query = query.filter(Invoice.filename.startswith(filename_prefix, autoescape=True))
+    if cursor:
+        try:
+            after_ts, after_id = Cursor.decode(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.filter(tuple_(Invoice.uploaded_at, Invoice.id) < (after_ts, after_id))
+    query = query.order_by(Invoice.uploaded_at.desc(), Invoice.id.desc())
+
+    if include == "summary":
+        # extracted_text/json can be large; only the columns the summary needs
+        query = query.options(joinedload(Invoice.data).load_only(InvoiceData.id, InvoiceData.extraction_quality))
+    # One extra row tells whether there is a next page
+    invoices = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(invoices) > limit:
+        invoices = invoices[:limit]
+        next_cursor = Cursor.encode(invoices[-1].uploaded_at, invoices[-1].id)
+
+    items = [InvoiceSummary.from_orm(invoice) for invoice in invoices]
+    if include == "summary":
+        latest = _latest_runs(db, [invoice.id for invoice in invoices])
+        for invoice, summary in zip(invoices, items):
+            summary.has_extraction = invoice.data is not None
+            summary.extraction_quality = invoice.data.extraction_quality if invoice.data else None
+            summary.latest_run = latest.get(invoice.id)
+    return InvoicePage(items=items, next_cursor=next_cursor)
 
 @router.get("/{invoice_id}", response_model=InvoiceDetail)
 def get_invoice(
     invoice_id: int,
     db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user)
+    current_user: Principal = Depends(deps.get_current_user)
 ) -> Any:
-    invoice = db.query(Invoice).filter(Invoice.id == invoice_id, Invoice.user_id == current_user.id).first()
+    invoice = (
+        db.query(Invoice)
+        .options(joinedload(Invoice.data))
+        .filter(Invoice.id == invoice_id, Invoice.user_id == current_user.id)
+        .first()
+    )
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
     
@@ -0,0 +1,88 @@
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Optional
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.api import deps
+from app.core.principal import Principal
+from app.db.models import MonthlySummary, MonthlyTaxSlabSummary, MonthlyViolationSummary
+from app.schemas.reports import MonthlyReport, MonthReport, RuleViolationSummary, TaxSlabSummary
+
+router = APIRouter()
+
+CENTS = Decimal("0.01")
+AMOUNT_COLUMNS = ("taxable_value", "cgst_amount", "sgst_amount", "igst_amount", "total_amount")
+
+
+def _period(value: Optional[str], name: str) -> Optional[date]:
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be YYYY-MM")
+
+
+def _cents(value: Any) -> Decimal:
+    return Decimal(str(value or 0)).quantize(CENTS)
+
+
+@router.get("/monthly", response_model=MonthlyReport)
+def monthly_report(
+    db: Session = Depends(deps.get_db),
+    period_from: Optional[str] = None,
+    period_to: Optional[str] = None,
+    current_user: Principal = Depends(deps.get_current_user)
+) -> Any:
+    """GSTR-style monthly summary for the months in [period_from,
+    period_to] (YYYY-MM, inclusive, both optional): invoice totals, tax by
+    rate slab and violations by rule and severity.
+
+    Served from the summary tables maintained by app.services.reporting,
+    three primary-key range reads whatever the size of the history."""
+    start, end = _period(period_from, "period_from"), _period(period_to, "period_to")
+
+    def in_range(model):
+        stmt = select(model).where(model.user_id == current_user.id)
+        if start:
+            stmt = stmt.where(model.period >= start)
+        if end:
+            stmt = stmt.where(model.period <= end)
+        return db.scalars(stmt.order_by(*model.__table__.primary_key.columns)).all()
+
+    months: Dict[date, MonthReport] = {}
+
+    def month(period: date) -> MonthReport:
+        if period not in months:
+            months[period] = MonthReport(period=period.strftime("%Y-%m"))
+        return months[period]
+
+    for row in in_range(MonthlySummary):
+        report = month(row.period)
+        report.invoice_count = row.invoice_count
+        report.runs_completed = row.runs_completed
+        report.violation_count = row.violation_count
+        for column in AMOUNT_COLUMNS:
+            setattr(report, column, _cents(getattr(row, column)))
+    for row in in_range(MonthlyTaxSlabSummary):
+        if row.line_count:
+            month(row.period).tax_slabs.append(TaxSlabSummary(
+                tax_rate=_cents(row.tax_rate),
+                line_count=row.line_count,
+                taxable_value=_cents(row.taxable_value),
+                tax_amount=_cents(row.tax_amount),
+            ))
+    for row in in_range(MonthlyViolationSummary):
+        if row.violation_count:
+            month(row.period).violations.append(RuleViolationSummary(
+                rule_id=row.rule_id, severity=row.severity, violation_count=row.violation_count,
+            ))
+
+    # Summary rows whose invoices were all re-dated elsewhere are all zero
+    reports = [
+        report for _, report in sorted(months.items())
+        if report.invoice_count or report.runs_completed or report.tax_slabs or report.violations
+    ]
+    return MonthlyReport(months=reports)
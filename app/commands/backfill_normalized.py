@@ -0,0 +1,75 @@
+"""Backfill InvoiceHeader / InvoiceLineItem from existing extractions.
+
+    python -m app.commands.backfill_normalized [--chunk-size N] [--all]
+
+Walks invoice_data by primary key in chunks, committing each chunk, so it
+can be stopped and re-run at any point: by default only invoices without
+a header row are normalized. --all re-normalizes everything, e.g. after
+a change to app.services.normalization. A duplicate upload is skipped
+when its original belongs to the same user, as it is at upload time, so
+each user's aggregates count a document once; a duplicate of another
+user's invoice is that user's only copy and is normalized.
+"""
+import argparse
+import logging
+from typing import Callable, Tuple
+
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session, aliased
+
+from app.db.models import Invoice, InvoiceData, InvoiceHeader
+from app.db.session import SessionLocal
+from app.services.normalization import NormalizationService
+
+logger = logging.getLogger(__name__)
+
+
+def backfill(session_factory: Callable[[], Session] = SessionLocal, chunk_size: int = 500, redo: bool = False) -> Tuple[int, int]:
+    """(invoices, line items) normalized."""
+    invoices = lines = 0
+    after_id = 0
+    db = session_factory()
+    try:
+        normalizer = NormalizationService(db)
+        source = aliased(Invoice)
+        while True:
+            stmt = (
+                select(InvoiceData.id, InvoiceData.invoice_id, InvoiceData.extracted_json)
+                .join(Invoice, Invoice.id == InvoiceData.invoice_id)
+                .outerjoin(source, source.id == Invoice.duplicate_of_id)
+                .where(InvoiceData.id > after_id, or_(source.id.is_(None), source.user_id != Invoice.user_id))
+                .order_by(InvoiceData.id)
+                .limit(chunk_size)
+            )
+            if not redo:
+                stmt = stmt.outerjoin(InvoiceHeader, InvoiceHeader.invoice_id == InvoiceData.invoice_id).where(
+                    InvoiceHeader.invoice_id.is_(None)
+                )
+            rows = db.execute(stmt).all()
+            if not rows:
+                break
+            after_id = rows[-1].id
+            lines += normalizer.stage({row.invoice_id: row.extracted_json for row in rows})
+            db.commit()
+            invoices += len(rows)
+            logger.info("Normalized %d invoices (%d line items), up to invoice_data.id %d", invoices, lines, after_id)
+    finally:
+        db.close()
+    return invoices, lines
+
+
+def main() -> None:
+    from app.core.logging import setup_logging
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--all", action="store_true", help="re-normalize invoices that already have rows")
+    args = parser.parse_args()
+
+    setup_logging()
+    invoices, lines = backfill(chunk_size=args.chunk_size, redo=args.all)
+    print(f"Normalized {invoices} invoices, {lines} line items")
+
+
+if __name__ == "__main__":
+    main()
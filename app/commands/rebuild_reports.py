@@ -0,0 +1,59 @@
+"""Recompute the monthly reporting summaries from scratch.
+
+    python -m app.commands.rebuild_reports [--check] [--chunk-size N]
+
+The summaries are normally kept current incrementally (see
+app.services.reporting). This recomputes every summary row from
+invoice_headers, invoice_line_items, runs and violations and replaces the
+stored rows in one transaction. With --check nothing is written: rows
+that differ from the recomputation are printed and the exit status is 1
+if there are any.
+"""
+import argparse
+import logging
+import sys
+from typing import Callable, List
+
+from sqlalchemy.orm import Session
+
+from app.db.session import SessionLocal
+from app.services.reporting import compute_summaries, diff_summaries
+
+logger = logging.getLogger(__name__)
+
+
+def rebuild(session_factory: Callable[[], Session] = SessionLocal, chunk_size: int = 1000, check: bool = False) -> List[str]:
+    """Differences between the stored and recomputed summaries; unless
+    `check`, the stored summaries are then replaced."""
+    db = session_factory()
+    try:
+        expected = compute_summaries(db, chunk_size)
+        problems = diff_summaries(db, expected)
+        if not check:
+            written = expected.replace(db)
+            db.commit()
+            logger.info("Rebuilt %d summary rows (%d differed)", written, len(problems))
+        return problems
+    finally:
+        db.close()
+
+
+def main() -> None:
+    from app.core.logging import setup_logging
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--check", action="store_true", help="only report differences, write nothing")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_logging()
+    problems = rebuild(chunk_size=args.chunk_size, check=args.check)
+    for problem in problems:
+        print(problem)
+    print(f"{len(problems)} summary rows differed")
+    if args.check and problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
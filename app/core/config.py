@@ -40,21 +40,142 @@ class Settings(BaseSettings):
              # Fallback to SQLite
              return "sqlite:///./gst_compliance.db"
 
+    # DATABASE POOL
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", 20))
+    DB_POOL_TIMEOUT_SECONDS: int = int(os.getenv("DB_POOL_TIMEOUT_SECONDS", 30))
+    DB_POOL_RECYCLE_SECONDS: int = int(os.getenv("DB_POOL_RECYCLE_SECONDS", 1800))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    DB_CONNECT_TIMEOUT_SECONDS: int = int(os.getenv("DB_CONNECT_TIMEOUT_SECONDS", 10))
+    DB_STATEMENT_TIMEOUT_MS: int = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 30000))
+    # SQLite pragmas for local runs
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+
     # JWT
     SECRET_KEY: str = os.getenv("SECRET_KEY", "supersecretkeywhichshouldbechanged")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    # bcrypt cost factor; stored hashes with another cost are re-hashed on login
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", 12))
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+    # Hashes admitted at once (running + queued) before logins get a 503
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 64))
+    AUTH_CACHE_TTL_SECONDS: int = int(os.getenv("AUTH_CACHE_TTL_SECONDS", 60))
+    AUTH_CACHE_MAX_ENTRIES: int = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", 10000))
+    # Trust uid/role embedded in access tokens instead of looking the user up.
+    # Revocations are shared through Redis; with Redis down claims are not
+    # trusted. Admin routes always re-check the role in the DB.
+    AUTH_TRUST_TOKEN_CLAIMS: bool = os.getenv("AUTH_TRUST_TOKEN_CLAIMS", "false").lower() == "true"
 
     # REDIS
     REDIS_HOST: str = os.getenv("REDIS_HOST", "localhost")
     REDIS_PORT: int = int(os.getenv("REDIS_PORT", 6379))
+    REDIS_MAX_CONNECTIONS: int = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+    REDIS_CONNECT_TIMEOUT_SECONDS: float = float(os.getenv("REDIS_CONNECT_TIMEOUT_SECONDS", 1))
+    REDIS_SOCKET_TIMEOUT_SECONDS: float = float(os.getenv("REDIS_SOCKET_TIMEOUT_SECONDS", 5))
+    REDIS_HEALTH_CHECK_INTERVAL_SECONDS: int = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL_SECONDS", 30))
+    # After a failed ping, skip Redis for this long before trying again
+    REDIS_RETRY_AFTER_SECONDS: int = int(os.getenv("REDIS_RETRY_AFTER_SECONDS", 10))
+    # Threads that run jobs in the API process while Redis is down
+    QUEUE_FALLBACK_WORKERS: int = int(os.getenv("QUEUE_FALLBACK_WORKERS", 2))
+
+    # INGESTION WORKERS (python -m app.workers.runtime)
+    INGESTION_QUEUE_PREFIX: str = os.getenv("INGESTION_QUEUE_PREFIX", "ingest")
+    # Invoices pulled and committed together
+    INGESTION_BATCH_SIZE: int = int(os.getenv("INGESTION_BATCH_SIZE", 8))
+    INGESTION_POLL_TIMEOUT_SECONDS: int = int(os.getenv("INGESTION_POLL_TIMEOUT_SECONDS", 5))
+    # Heartbeats extend the lease every third of this
+    INGESTION_LEASE_SECONDS: int = int(os.getenv("INGESTION_LEASE_SECONDS", 300))
+    INGESTION_MAX_ATTEMPTS: int = int(os.getenv("INGESTION_MAX_ATTEMPTS", 3))
+    INGESTION_REAP_INTERVAL_SECONDS: int = int(os.getenv("INGESTION_REAP_INTERVAL_SECONDS", 60))
+    # Re-push invoices still UPLOADED after this long (their queue entry was lost)
+    INGESTION_REQUEUE_AFTER_SECONDS: int = int(os.getenv("INGESTION_REQUEUE_AFTER_SECONDS", 900))
+    # Run compliance checks right after extraction, in the same transaction
+    INGESTION_AUTO_COMPLIANCE: bool = os.getenv("INGESTION_AUTO_COMPLIANCE", "false").lower() == "true"
 
     # UPLOAD
     UPLOAD_FOLDER: str = os.path.join(os.getcwd(), "uploads")
+    MAX_UPLOAD_SIZE_MB: int = int(os.getenv("MAX_UPLOAD_SIZE_MB", 25))
+    MAX_BULK_UPLOAD_SIZE_MB: int = int(os.getenv("MAX_BULK_UPLOAD_SIZE_MB", 1024))
+    MAX_BULK_FILES: int = int(os.getenv("MAX_BULK_FILES", 1000))
+    # Decompressed PDF bytes all ZIP archives of one bulk upload may expand to
+    MAX_ARCHIVE_EXTRACTED_MB: int = int(os.getenv("MAX_ARCHIVE_EXTRACTED_MB", 1024))
+    # Reuse extraction results for re-uploaded files: "user", "global" or "off"
+    DEDUP_SCOPE: str = os.getenv("DEDUP_SCOPE", "user")
+
+    # OCR
+    OCR_FAST_TEXT_LAYER: bool = os.getenv("OCR_FAST_TEXT_LAYER", "true").lower() == "true"
+    OCR_MIN_TEXT_LAYER_CHARS: int = int(os.getenv("OCR_MIN_TEXT_LAYER_CHARS", 20))
+    OCR_PROCESS_WORKERS: int = int(os.getenv("OCR_PROCESS_WORKERS", os.cpu_count() or 1))
+    OCR_PARALLEL_MIN_PAGES: int = int(os.getenv("OCR_PARALLEL_MIN_PAGES", 8))
+    OCR_PAGES_PER_TASK: int = int(os.getenv("OCR_PAGES_PER_TASK", 4))
+    OCR_MAX_TASKS_PER_JOB: int = int(os.getenv("OCR_MAX_TASKS_PER_JOB", 4))
+
+    # OCR text of InvoiceData, stored out of row (content-addressed, gzip)
+    TEXT_BLOB_DIR: str = os.getenv("TEXT_BLOB_DIR", os.path.join(os.getcwd(), "uploads", "blobs"))
+    TEXT_BLOB_COMPRESSION_LEVEL: int = int(os.getenv("TEXT_BLOB_COMPRESSION_LEVEL", 6))
+
+    # EXTRACTION CACHE
+    EXTRACTION_CACHE_ENABLED: bool = os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() == "true"
+    EXTRACTION_CACHE_DIR: str = os.getenv("EXTRACTION_CACHE_DIR", os.path.join(os.getcwd(), "uploads", ".extraction_cache"))
+    EXTRACTION_CACHE_MAX_MB: int = int(os.getenv("EXTRACTION_CACHE_MAX_MB", 512))
+    # Share cache entries between workers through Redis
+    EXTRACTION_CACHE_REDIS: bool = os.getenv("EXTRACTION_CACHE_REDIS", "false").lower() == "true"
+    EXTRACTION_CACHE_REDIS_TTL_SECONDS: int = int(os.getenv("EXTRACTION_CACHE_REDIS_TTL_SECONDS", 7 * 24 * 3600))
+
+    # LLM EXTRACTION
+    # "heuristic" (regex parser), "stub" (offline, simulated latency and tokens) or "openai"
+    LLM_PROVIDER: str = os.getenv("LLM_PROVIDER", "heuristic")
+    LLM_BASE_URL: str = os.getenv("LLM_BASE_URL", "https://api.openai.com/v1")
+    LLM_API_KEY: str = os.getenv("LLM_API_KEY", "")
+    LLM_MODEL: str = os.getenv("LLM_MODEL", "gpt-4o-mini")
+    LLM_TIMEOUT_SECONDS: float = float(os.getenv("LLM_TIMEOUT_SECONDS", 60))
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", 4))
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", 4))
+    # Invoices packed into one prompt
+    LLM_MAX_BATCH_SIZE: int = int(os.getenv("LLM_MAX_BATCH_SIZE", 4))
+    LLM_PRICE_PER_1K_INPUT: float = float(os.getenv("LLM_PRICE_PER_1K_INPUT", 0.00015))
+    LLM_PRICE_PER_1K_OUTPUT: float = float(os.getenv("LLM_PRICE_PER_1K_OUTPUT", 0.0006))
+    LLM_STUB_LATENCY_MS: float = float(os.getenv("LLM_STUB_LATENCY_MS", 0))
+
+    # COMPLIANCE
+    RULES_CACHE_TTL_SECONDS: int = int(os.getenv("RULES_CACHE_TTL_SECONDS", 60))
+    COMPLIANCE_BATCH_CHUNK_SIZE: int = int(os.getenv("COMPLIANCE_BATCH_CHUNK_SIZE", 500))
+    COMPLIANCE_BATCH_MAX_INVOICES: int = int(os.getenv("COMPLIANCE_BATCH_MAX_INVOICES", 50000))
+    # Calculation rules switch from per-item loops to NumPy columns at this
+    # many line items per evaluation; below it building the arrays costs more
+    # than it saves (see benchmarks/bench_tax_reconciliation.py)
+    COMPLIANCE_COLUMNAR_MIN_ITEMS: int = int(os.getenv("COMPLIANCE_COLUMNAR_MIN_ITEMS", 500))
+    COMPLIANCE_RUN_WORKERS: int = int(os.getenv("COMPLIANCE_RUN_WORKERS", 4))
+    COMPLIANCE_RUN_EVENT_RETENTION_SECONDS: int = int(os.getenv("COMPLIANCE_RUN_EVENT_RETENTION_SECONDS", 300))
+    # A run still RUNNING this long after it started is reported as timed out
+    # to event streams replaying it from the DB
+    COMPLIANCE_RUN_STREAM_TIMEOUT_SECONDS: int = int(os.getenv("COMPLIANCE_RUN_STREAM_TIMEOUT_SECONDS", 600))
+    COMPLIANCE_RUN_STREAM_POLL_SECONDS: float = float(os.getenv("COMPLIANCE_RUN_STREAM_POLL_SECONDS", 1))
+
+    # AUDIT LOG
+    # Events are queued and bulk-inserted by a background thread
+    AUDIT_BATCH_SIZE: int = int(os.getenv("AUDIT_BATCH_SIZE", 500))
+    AUDIT_FLUSH_INTERVAL_MS: int = int(os.getenv("AUDIT_FLUSH_INTERVAL_MS", 200))
+    AUDIT_QUEUE_MAX: int = int(os.getenv("AUDIT_QUEUE_MAX", 10000))
+    # When the queue is full: "block" (wait up to AUDIT_ENQUEUE_TIMEOUT_MS, then drop) or "drop".
+    # Events recorded on the event loop are always dropped rather than wait
+    AUDIT_OVERFLOW_POLICY: str = os.getenv("AUDIT_OVERFLOW_POLICY", "block")
+    AUDIT_ENQUEUE_TIMEOUT_MS: int = int(os.getenv("AUDIT_ENQUEUE_TIMEOUT_MS", 100))
+    AUDIT_FLUSH_RETRIES: int = int(os.getenv("AUDIT_FLUSH_RETRIES", 3))
+    # Link each audit row to the previous one so tampering shows up in a scan
+    AUDIT_HASH_CHAIN: bool = os.getenv("AUDIT_HASH_CHAIN", "false").lower() == "true"
 
     # GOOGLE AUTH
     GOOGLE_CLIENT_ID: str = os.getenv("GOOGLE_CLIENT_ID", "YOUR_GOOGLE_CLIENT_ID")
+    # PEM certs keyed by kid; cached per the response's Cache-Control
+    GOOGLE_CERTS_URL: str = os.getenv("GOOGLE_CERTS_URL", "https://www.googleapis.com/oauth2/v1/certs")
+    GOOGLE_CERTS_TIMEOUT_SECONDS: float = float(os.getenv("GOOGLE_CERTS_TIMEOUT_SECONDS", 5))
+    # Minimum gap between refetches triggered by an unknown key id
+    GOOGLE_CERTS_MIN_REFRESH_SECONDS: int = int(os.getenv("GOOGLE_CERTS_MIN_REFRESH_SECONDS", 30))
 
     model_config = SettingsConfigDict(case_sensitive=True, env_file=".env")
 
@@ -0,0 +1,140 @@
+import logging
+import re
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+from google.auth import jwt
+from requests.adapters import HTTPAdapter
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+_MAX_AGE = re.compile(r"max-age\s*=\s*(\d+)", re.IGNORECASE)
+
+
+def cache_ttl(headers) -> Optional[int]:
+    """Seconds a certs response stays fresh, from Cache-Control max-age less Age."""
+    cache_control = headers.get("Cache-Control", "")
+    if re.search(r"no-store|no-cache", cache_control, re.IGNORECASE):
+        return 0
+    match = _MAX_AGE.search(cache_control)
+    if not match:
+        return None
+    try:
+        age = int(headers.get("Age", 0))
+    except ValueError:
+        age = 0
+    return max(int(match.group(1)) - age, 0)
+
+
+class GoogleTokenVerifier:
+    """Verifies Google ID tokens locally against cached signing certs.
+
+    Certs are fetched over a pooled requests.Session and kept for as long as
+    the response's Cache-Control allows, so steady-state verification makes
+    no network call. A token signed with a kid we have not seen triggers one
+    early refresh (Google rotates keys ahead of use), rate limited by
+    min_refresh_interval. If a refresh fails, the previous certs are reused.
+    """
+
+    def __init__(
+        self,
+        client_id: str,
+        certs_url: str,
+        timeout: float = 5.0,
+        default_ttl: int = 3600,
+        min_refresh_interval: int = 30,
+        clock_skew: int = 10,
+    ):
+        self.client_id = client_id
+        self.certs_url = certs_url
+        self.timeout = timeout
+        self.default_ttl = default_ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.clock_skew = clock_skew
+        self._lock = threading.Lock()
+        self._session: Optional[requests.Session] = None
+        self._certs: Dict[str, str] = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+
+    def _get_session(self) -> requests.Session:
+        if self._session is None:
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+            session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+            self._session = session
+        return self._session
+
+    def _fetch(self) -> None:
+        # Called with self._lock held, so concurrent misses share one download
+        metrics.inc("google_certs_fetches")
+        now = time.time()
+        self._fetched_at = now
+        try:
+            response = self._get_session().get(self.certs_url, timeout=self.timeout)
+            response.raise_for_status()
+            certs = response.json()
+        except (requests.RequestException, ValueError) as e:
+            metrics.inc("google_certs_fetch_errors")
+            if not self._certs:
+                raise ValueError(f"Could not fetch Google certs: {e}")
+            logger.warning("Google certs refresh failed, keeping cached certs: %s", e)
+            # Retry after the refresh interval rather than on every request
+            self._expires_at = now + self.min_refresh_interval
+            return
+        ttl = cache_ttl(response.headers)
+        self._certs = certs
+        self._expires_at = now + (self.default_ttl if ttl is None else ttl)
+
+    def certs(self, kid: Optional[str] = None) -> Dict[str, str]:
+        with self._lock:
+            now = time.time()
+            stale = now >= self._expires_at
+            unknown_kid = (
+                kid is not None
+                and kid not in self._certs
+                and now - self._fetched_at >= self.min_refresh_interval
+            )
+            if stale or unknown_kid:
+                self._fetch()
+            return self._certs
+
+    def verify(self, token: str) -> dict:
+        """Claims of a valid token; raises ValueError otherwise."""
+        try:
+            kid = jwt.decode_header(token).get("kid")
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Malformed token: {e}")
+        certs = self.certs(kid)
+        if kid is not None and kid not in certs:
+            raise ValueError(f"Token signed with unknown key {kid!r}")
+        claims = jwt.decode(
+            token,
+            certs={kid: certs[kid]} if kid is not None else certs,
+            audience=self.client_id,
+            clock_skew_in_seconds=self.clock_skew,
+        )
+        if claims.get("iss") not in GOOGLE_ISSUERS:
+            raise ValueError(f"Wrong issuer: {claims.get('iss')!r}")
+        return claims
+
+    def close(self) -> None:
+        with self._lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
+
+
+google_verifier = GoogleTokenVerifier(
+    settings.GOOGLE_CLIENT_ID,
+    settings.GOOGLE_CERTS_URL,
+    timeout=settings.GOOGLE_CERTS_TIMEOUT_SECONDS,
+    min_refresh_interval=settings.GOOGLE_CERTS_MIN_REFRESH_SECONDS,
+)
@@ -0,0 +1,32 @@
+import threading
+from collections import defaultdict
+from typing import Dict
+
+
+class Metrics:
+    """In-process counters, exposed as JSON on GET /metrics.
+
+    Values are per process; sum them across workers when scraping.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+
+    def inc(self, name: str, value: float = 1.0) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def get(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0.0)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            data = dict(self._counters)
+        lookups = data.get("dedup_lookups", 0.0)
+        data["dedup_hit_rate"] = data.get("dedup_hits", 0.0) / lookups if lookups else 0.0
+        return data
+
+
+metrics = Metrics()
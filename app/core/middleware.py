@@ -0,0 +1,70 @@
+from typing import Callable, Optional
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class BodySizeLimitMiddleware:
+    """Rejects request bodies above a per-path limit with 413.
+
+    Checks Content-Length up front and counts bytes as they arrive, so an
+    oversized upload is cut off before the multipart parser spools it.
+    """
+
+    def __init__(self, app: ASGIApp, limit_for: Callable[[str], Optional[int]]):
+        self.app = app
+        self.limit_for = limit_for
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        limit = self.limit_for(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            await self._reject(scope, receive, send, limit)
+            return
+
+        received = 0
+        response_started = False
+        rejected = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit and not response_started:
+                    # Answer now and make the app see a disconnect; whatever
+                    # it tries to send afterwards is dropped.
+                    rejected = True
+                    await self._reject(scope, receive, send, limit)
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def tracked_send(message: Message) -> None:
+            nonlocal response_started
+            if rejected:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except Exception:
+            if not rejected:
+                raise
+
+    @staticmethod
+    async def _reject(scope: Scope, receive: Receive, send: Send, limit: int) -> None:
+        response = JSONResponse(
+            {"detail": f"Request body exceeds the {limit} byte limit"},
+            status_code=413,
+            headers={"Connection": "close"},
+        )
+        await response(scope, receive, send)
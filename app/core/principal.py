@@ -0,0 +1,114 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.redis_pool import RedisManager, redis_manager
+
+logger = logging.getLogger(__name__)
+
+REVOKED_KEY = "auth:revoked:{}"
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated caller, as seen by endpoints via deps.get_current_user."""
+
+    id: int
+    email: str
+    role: str
+
+
+class PrincipalCache:
+    """Bounded LRU of bearer token -> Principal with a short TTL.
+
+    Entries never outlive the token's own `exp`. invalidate_user() drops a
+    user's entries and makes tokens issued before it fall back to the DB, so
+    a role change takes effect on the next request in this process. Other
+    processes learn of the revocation through Redis before trusting token
+    claims; their cached entries expire within `ttl_seconds`.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int, manager: Optional[RedisManager] = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.manager = manager
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[Principal, float]]" = OrderedDict()
+        self._revoked_before: Dict[int, float] = {}
+
+    def get(self, token: str) -> Optional[Principal]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                metrics.inc("auth_cache_misses")
+                return None
+            principal, expires_at = entry
+            if expires_at <= now:
+                del self._entries[token]
+                metrics.inc("auth_cache_misses")
+                return None
+            self._entries.move_to_end(token)
+        metrics.inc("auth_cache_hits")
+        return principal
+
+    def put(self, token: str, principal: Principal, token_exp: Optional[float] = None) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        with self._lock:
+            self._entries[token] = (principal, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def claims_revoked(self, user_id: int, issued_at: Optional[float]) -> bool:
+        """Whether uid/role claims issued at `issued_at` can no longer be
+        trusted, here or (per Redis) in any other process. Without Redis
+        the answer is yes, so the caller falls back to the DB."""
+        if issued_at is None:
+            return True
+        with self._lock:
+            revoked_before = self._revoked_before.get(user_id)
+        if revoked_before is None and self.manager is not None:
+            if not self.manager.is_available():
+                return True
+            try:
+                shared = self.manager.client().get(REVOKED_KEY.format(user_id))
+            except RedisError as e:
+                logger.warning("Revocation lookup failed: %s", e)
+                self.manager.mark_down()
+                return True
+            revoked_before = float(shared) if shared is not None else None
+        return revoked_before is not None and issued_at <= revoked_before
+
+    def invalidate_user(self, user_id: int) -> None:
+        now = time.time()
+        with self._lock:
+            self._revoked_before[user_id] = now
+            for token in [t for t, (p, _) in self._entries.items() if p.id == user_id]:
+                del self._entries[token]
+        if self.manager is not None and self.manager.is_available():
+            try:
+                # Kept until every token issued before now has expired
+                self.manager.client().set(
+                    REVOKED_KEY.format(user_id), now, ex=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60 + self.ttl_seconds
+                )
+            except RedisError as e:
+                logger.warning("Could not share revocation of user %s: %s", user_id, e)
+                self.manager.mark_down()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._revoked_before.clear()
+
+
+principal_cache = PrincipalCache(settings.AUTH_CACHE_TTL_SECONDS, settings.AUTH_CACHE_MAX_ENTRIES, redis_manager)
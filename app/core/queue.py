@@ -0,0 +1,80 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.redis_pool import RedisManager, redis_manager
+
+logger = logging.getLogger(__name__)
+
+# Ingestion priorities, highest first: single uploads go ahead of bulk imports
+INGESTION_PRIORITIES = ("interactive", "bulk")
+
+
+def ingestion_key(priority: str) -> str:
+    return f"{settings.INGESTION_QUEUE_PREFIX}:{priority}"
+
+
+class JobQueue:
+    """Shared queue handle handed out by deps.get_queue.
+
+    Invoices go to the ingestion workers' Redis lists over the pooled
+    connection. While Redis is down they run on a small in-process thread
+    pool instead, so uploads are still processed (more slowly) rather than
+    silently left in UPLOADED.
+    """
+
+    def __init__(self, manager: RedisManager = redis_manager):
+        self.manager = manager
+        self._lock = threading.Lock()
+        self._fallback: Optional[ThreadPoolExecutor] = None
+
+    def enqueue_invoices(self, invoice_ids: List[int], priority: str = "interactive") -> None:
+        """Queue invoices for the ingestion workers (app.workers.runtime)."""
+        if priority not in INGESTION_PRIORITIES:
+            raise ValueError(f"Unknown ingestion priority {priority!r}")
+        if not invoice_ids:
+            return
+        if self.manager.is_available():
+            try:
+                # One RPUSH for the whole batch
+                self.manager.client().rpush(ingestion_key(priority), *invoice_ids)
+                metrics.inc("ingestion_enqueued", len(invoice_ids))
+                return
+            except RedisError as e:
+                logger.warning("Enqueue failed, running %d invoices in process: %s", len(invoice_ids), e)
+                self.manager.mark_down()
+        from app.workers.ingestion_worker import process_invoice_job
+        for invoice_id in invoice_ids:
+            self._run_locally(process_invoice_job, (invoice_id,))
+
+    def _run_locally(self, func: Callable, args: tuple) -> None:
+        with self._lock:
+            if self._fallback is None:
+                self._fallback = ThreadPoolExecutor(
+                    max_workers=settings.QUEUE_FALLBACK_WORKERS, thread_name_prefix="queue-fallback"
+                )
+            executor = self._fallback
+        metrics.inc("queue_fallback_jobs")
+        executor.submit(self._call, func, args)
+
+    @staticmethod
+    def _call(func: Callable, args: tuple) -> None:
+        try:
+            func(*args)
+        except Exception:
+            logger.exception("In-process job %s failed", getattr(func, "__name__", func))
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Finish jobs running in process; called from the app lifespan."""
+        with self._lock:
+            executor, self._fallback = self._fallback, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+job_queue = JobQueue()
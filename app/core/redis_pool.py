@@ -0,0 +1,79 @@
+import logging
+import threading
+import time
+from typing import Optional
+
+from redis import ConnectionPool, Redis
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class RedisManager:
+    """One connection pool per process, created on first use.
+
+    Nothing connects at import or startup; the first command does. After a
+    failed ping Redis is treated as down for REDIS_RETRY_AFTER_SECONDS so
+    requests do not each wait out the connect timeout.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pool: Optional[ConnectionPool] = None
+        self._client: Optional[Redis] = None
+        self._checked_at = 0.0
+        self._healthy = True
+
+    @property
+    def pool(self) -> ConnectionPool:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ConnectionPool(
+                    host=settings.REDIS_HOST,
+                    port=settings.REDIS_PORT,
+                    max_connections=settings.REDIS_MAX_CONNECTIONS,
+                    socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT_SECONDS,
+                    socket_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+                    # PING connections idle longer than this before reuse
+                    health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL_SECONDS,
+                )
+            return self._pool
+
+    def client(self) -> Redis:
+        pool = self.pool
+        with self._lock:
+            if self._client is None:
+                self._client = Redis(connection_pool=pool)
+            return self._client
+
+    def is_available(self) -> bool:
+        now = time.monotonic()
+        interval = settings.REDIS_HEALTH_CHECK_INTERVAL_SECONDS if self._healthy else settings.REDIS_RETRY_AFTER_SECONDS
+        if now - self._checked_at < interval:
+            return self._healthy
+        try:
+            self.client().ping()
+            healthy = True
+        except RedisError as e:
+            logger.warning("Redis unavailable: %s", e)
+            healthy = False
+        with self._lock:
+            self._healthy, self._checked_at = healthy, now
+        return healthy
+
+    def mark_down(self) -> None:
+        with self._lock:
+            self._healthy, self._checked_at = False, time.monotonic()
+        metrics.inc("redis_marked_down")
+
+    def close(self) -> None:
+        with self._lock:
+            pool, self._pool, self._client = self._pool, None, None
+        if pool is not None:
+            pool.disconnect()
+
+
+redis_manager = RedisManager()
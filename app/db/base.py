@@ -1 +1,49 @@
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateColumn
+
 from app.db.models import Base
+
+logger = logging.getLogger(__name__)
+
+
+def add_missing_columns(bind: Engine) -> None:
+    """create_all skips tables that already exist, so columns added to the
+    models later are added here with ALTER TABLE, when missing."""
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    raise RuntimeError(
+                        f"Cannot add NOT NULL column {table.name}.{column.name} without a server default"
+                    )
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {CreateColumn(column).compile(dialect=bind.dialect)}"
+                for fk in column.foreign_keys:
+                    ddl += f" REFERENCES {fk.column.table.name} ({fk.column.name})"
+                conn.execute(text(ddl))
+                logger.info("Added column %s.%s", table.name, column.name)
+
+
+def create_missing_indexes(bind: Engine) -> None:
+    """create_all skips tables that already exist, so indexes added to the
+    models later are created here, on their own, when missing."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+
+def upgrade_schema(bind: Engine) -> None:
+    """Bring an existing database up to the models: new tables, then new
+    columns on old tables, then the indexes that may cover those columns."""
+    Base.metadata.create_all(bind=bind)
+    add_missing_columns(bind)
+    create_missing_indexes(bind)
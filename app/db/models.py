@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Optional
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Float, JSON, Enum
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, ForeignKey, Text, Float, JSON, Enum, Index, Numeric
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.orm import DeclarativeBase
 import enum
 
@@ -44,24 +44,132 @@ class Invoice(Base):
     filename = Column(String, nullable=False)
     stored_path = Column(String, nullable=False)
     invoice_hash = Column(String, index=True)
+    duplicate_of_id = Column(Integer, ForeignKey("invoices.id"), nullable=True)
+    page_count = Column(Integer, nullable=True)
     status = Column(String, default=InvoiceStatus.UPLOADED)
     uploaded_at = Column(DateTime, default=datetime.utcnow)
+    # Ingestion worker lease: extended by heartbeats while PROCESSING; the
+    # reaper requeues invoices whose lease ran out
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, default=0)
 
     owner = relationship("User", back_populates="invoices")
     data = relationship("InvoiceData", uselist=False, back_populates="invoice")
     runs = relationship("Run", back_populates="invoice")
 
+    __table_args__ = (
+        # Keyset pagination of GET /invoices/, optionally filtered by status
+        Index("ix_invoices_user_uploaded", "user_id", "uploaded_at", "id"),
+        Index("ix_invoices_user_status_uploaded", "user_id", "status", "uploaded_at", "id"),
+        # Filename prefix search (LIKE 'abc%')
+        Index("ix_invoices_user_filename", "user_id", "filename", postgresql_ops={"filename": "text_pattern_ops"}),
+        # Reaper scan for expired leases
+        Index("ix_invoices_status_lease", "status", "lease_expires_at"),
+    )
+
 class InvoiceData(Base):
     __tablename__ = "invoice_data"
 
     id = Column(Integer, primary_key=True, index=True)
     invoice_id = Column(Integer, ForeignKey("invoices.id"))
     extracted_json = Column(JSON, nullable=True)
-    extracted_text = Column(Text, nullable=True)
+    # Inline OCR text of rows written before text_ref; never loaded unless asked for
+    extracted_text = deferred(Column(Text, nullable=True))
+    # Blob store ref of the OCR text (app.services.blob_store)
+    text_ref = Column(String(80), nullable=True)
     extraction_quality = Column(Float, nullable=True) # 0.0 to 1.0
+    extraction_cpu_ms = Column(Float, nullable=True)
+    llm_tokens = Column(Integer, default=0)
+    token_cost = Column(Float, default=0.0)
 
     invoice = relationship("Invoice", back_populates="data")
 
+class InvoiceHeader(Base):
+    """Header fields of extracted_json as typed, indexed columns, written
+    alongside InvoiceData by app.services.normalization."""
+    __tablename__ = "invoice_headers"
+
+    invoice_id = Column(Integer, ForeignKey("invoices.id"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    invoice_number = Column(String(64), nullable=True)
+    supplier_gstin = Column(String(15), nullable=True)
+    invoice_date = Column(Date, nullable=True)
+    # First day of the reporting month: invoice_date's, else the upload's
+    period = Column(Date, nullable=False)
+    taxable_value = Column(Numeric(14, 2), nullable=True)
+    cgst_amount = Column(Numeric(14, 2), nullable=True)
+    sgst_amount = Column(Numeric(14, 2), nullable=True)
+    igst_amount = Column(Numeric(14, 2), nullable=True)
+    total_amount = Column(Numeric(14, 2), nullable=True)
+
+    __table_args__ = (
+        Index("ix_invoice_headers_user_gstin_date", "user_id", "supplier_gstin", "invoice_date"),
+        Index("ix_invoice_headers_user_date", "user_id", "invoice_date"),
+        Index("ix_invoice_headers_user_number", "user_id", "invoice_number"),
+    )
+
+class InvoiceLineItem(Base):
+    __tablename__ = "invoice_line_items"
+
+    id = Column(Integer, primary_key=True)
+    invoice_id = Column(Integer, ForeignKey("invoices.id"), nullable=False, index=True)
+    line_no = Column(Integer, nullable=False)
+    # Copied from the header so per-period aggregates never join it
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    invoice_date = Column(Date, nullable=True)
+    hsn_code = Column(String(8), nullable=True)
+    description = Column(String(255), nullable=True)
+    taxable_value = Column(Numeric(14, 2), nullable=True)
+    tax_rate = Column(Numeric(5, 2), nullable=True)
+    tax_amount = Column(Numeric(14, 2), nullable=True)
+    cgst_amount = Column(Numeric(14, 2), nullable=True)
+    sgst_amount = Column(Numeric(14, 2), nullable=True)
+
+    __table_args__ = (
+        # "Tax by HSN over a period": range on date, group by HSN
+        Index("ix_invoice_line_items_user_date_hsn", "user_id", "invoice_date", "hsn_code"),
+        Index("ix_invoice_line_items_user_hsn_date", "user_id", "hsn_code", "invoice_date"),
+    )
+
+# Monthly reporting summaries, kept current by app.services.reporting as
+# invoices are normalized and runs complete; never computed on read.
+# Invoice figures are by the header's period, run and violation counts by
+# the month the run completed.
+
+class MonthlySummary(Base):
+    __tablename__ = "monthly_summaries"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    period = Column(Date, primary_key=True)
+    invoice_count = Column(Integer, nullable=False, default=0)
+    taxable_value = Column(Numeric(16, 2), nullable=False, default=0)
+    cgst_amount = Column(Numeric(16, 2), nullable=False, default=0)
+    sgst_amount = Column(Numeric(16, 2), nullable=False, default=0)
+    igst_amount = Column(Numeric(16, 2), nullable=False, default=0)
+    total_amount = Column(Numeric(16, 2), nullable=False, default=0)
+    runs_completed = Column(Integer, nullable=False, default=0)
+    violation_count = Column(Integer, nullable=False, default=0)
+
+class MonthlyTaxSlabSummary(Base):
+    __tablename__ = "monthly_tax_slab_summaries"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    period = Column(Date, primary_key=True)
+    tax_rate = Column(Numeric(5, 2), primary_key=True)
+    line_count = Column(Integer, nullable=False, default=0)
+    taxable_value = Column(Numeric(16, 2), nullable=False, default=0)
+    tax_amount = Column(Numeric(16, 2), nullable=False, default=0)
+
+class MonthlyViolationSummary(Base):
+    __tablename__ = "monthly_violation_summaries"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    period = Column(Date, primary_key=True)
+    rule_id = Column(String, primary_key=True)
+    severity = Column(String, primary_key=True)
+    violation_count = Column(Integer, nullable=False, default=0)
+
 class Rule(Base):
     __tablename__ = "rules"
 
@@ -78,6 +186,7 @@ class Run(Base):
     run_id = Column(String, primary_key=True, index=True) # UUID
     user_id = Column(Integer, ForeignKey("users.id"))
     invoice_id = Column(Integer, ForeignKey("invoices.id"))
+    batch_id = Column(String, ForeignKey("compliance_batches.batch_id"), nullable=True, index=True)
     status = Column(String, default=RunStatus.RUNNING)
     start_ts = Column(DateTime, default=datetime.utcnow)
     end_ts = Column(DateTime, nullable=True)
@@ -85,13 +194,30 @@ class Run(Base):
 
     user = relationship("User", back_populates="runs")
     invoice = relationship("Invoice", back_populates="runs")
+    batch = relationship("ComplianceBatch", back_populates="runs")
     violations = relationship("Violation", back_populates="run")
 
+class ComplianceBatch(Base):
+    __tablename__ = "compliance_batches"
+
+    batch_id = Column(String, primary_key=True, index=True) # UUID
+    user_id = Column(Integer, ForeignKey("users.id"))
+    status = Column(String, default=RunStatus.RUNNING)
+    rules_version = Column(String, nullable=True)
+    invoice_count = Column(Integer, default=0)
+    skipped_count = Column(Integer, default=0)
+    violation_count = Column(Integer, default=0)
+    start_ts = Column(DateTime, default=datetime.utcnow)
+    end_ts = Column(DateTime, nullable=True)
+
+    runs = relationship("Run", back_populates="batch")
+
 class Violation(Base):
     __tablename__ = "violations"
 
     id = Column(Integer, primary_key=True, index=True)
-    run_id = Column(String, ForeignKey("runs.run_id"))
+    # Every run detail and report loads violations by run
+    run_id = Column(String, ForeignKey("runs.run_id"), index=True)
     rule_id = Column(String, ForeignKey("rules.rule_id"))
     detected_value = Column(String, nullable=True)
     expected_value = Column(String, nullable=True)
@@ -113,5 +239,8 @@ class AuditLog(Base):
     response_hash = Column(String, nullable=True)
     token_cost = Column(Float, default=0.0)
     timestamp = Column(DateTime, default=datetime.utcnow)
+    # Hash chain (AUDIT_HASH_CHAIN): row_hash commits to prev_hash and this row
+    prev_hash = Column(String(64), nullable=True)
+    row_hash = Column(String(64), nullable=True)
 
     user = relationship("User", back_populates="audit_logs")
@@ -1,10 +1,97 @@
-from sqlalchemy import create_engine
+from typing import Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
-connect_args = {}
-if "sqlite" in settings.SQLALCHEMY_DATABASE_URI:
-    connect_args = {"check_same_thread": False}
 
-engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, connect_args=connect_args)
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    return _is_sqlite(url) and make_url(url).database in (None, "", ":memory:")
+
+
+def engine_options(url: str, is_async: bool = False) -> dict:
+    """create_engine keyword arguments for `url`, driven by Settings."""
+    if _is_sqlite(url):
+        options = {"connect_args": {"check_same_thread": False}}
+        if not _is_memory_sqlite(url):
+            options.update(pool_size=settings.DB_POOL_SIZE, max_overflow=settings.DB_MAX_OVERFLOW)
+        return options
+
+    options = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        # Render closes idle connections; recycle before that and ping on checkout
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    if is_async:
+        # asyncpg
+        options["connect_args"] = {
+            "timeout": settings.DB_CONNECT_TIMEOUT_SECONDS,
+            "server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)},
+        }
+    else:
+        # psycopg2
+        options["connect_args"] = {
+            "connect_timeout": settings.DB_CONNECT_TIMEOUT_SECONDS,
+            "options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}",
+        }
+    return options
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """Local-run profile: WAL lets readers proceed during writes, and the
+    busy timeout makes writers wait for the lock instead of failing."""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    finally:
+        cursor.close()
+
+
+def build_engine(url: str):
+    engine = create_engine(url, **engine_options(url))
+    if _is_sqlite(url) and not _is_memory_sqlite(url):
+        event.listen(engine, "connect", set_sqlite_pragmas)
+    return engine
+
+
+def async_database_url(url: str) -> str:
+    """The same database through its async driver (asyncpg / aiosqlite)."""
+    parsed = make_url(url)
+    driver = "aiosqlite" if parsed.get_backend_name() == "sqlite" else "asyncpg"
+    return parsed.set(drivername=f"{parsed.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+
+engine = build_engine(settings.SQLALCHEMY_DATABASE_URI)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+_async_engine: Optional[AsyncEngine] = None
+_async_sessionmaker: Optional[async_sessionmaker] = None
+
+
+def get_async_sessionmaker() -> async_sessionmaker:
+    """Created on first use so the async driver is only needed by callers."""
+    global _async_engine, _async_sessionmaker
+    if _async_sessionmaker is None:
+        url = async_database_url(settings.SQLALCHEMY_DATABASE_URI)
+        _async_engine = create_async_engine(url, **engine_options(url, is_async=True))
+        if _is_sqlite(url) and not _is_memory_sqlite(url):
+            event.listen(_async_engine.sync_engine, "connect", set_sqlite_pragmas)
+        _async_sessionmaker = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_sessionmaker
+
+
+async def dispose_async_engine() -> None:
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = _async_sessionmaker = None
@@ -1,20 +1,50 @@
+import logging
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
-from app.api import auth, invoices, compliance, audit
-from app.db.session import engine
-from app.db.models import Base
+from app.api import deps, auth, invoices, compliance, audit, analytics, reports
+from app.db.session import SessionLocal, dispose_async_engine, engine
+from app.db.base import upgrade_schema
 from app.core.logging import setup_logging
+from app.core.metrics import metrics
+from app.core.middleware import BodySizeLimitMiddleware
+from app.core.google_auth import google_verifier
+from app.core.queue import job_queue
+from app.core.redis_pool import redis_manager
+from app.services.audit_service import audit_writer
+from app.services.llm_providers import close_llm_client
+from app.services.rule_engine import seed_default_rules
+from app.utils.hashing import password_pool
+from app.services.run_executor import run_executor
+from app.workers.runtime import read_worker_stats
+
+logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Create tables (For production, use Alembic)
+    # Create tables and add columns/indexes new to the models (For
+    # production, use Alembic). A failure here stops startup: serving on a
+    # half-upgraded schema only moves the error into every request.
     try:
-        Base.metadata.create_all(bind=engine)
-    except Exception as e:
-        print(f"Warning: Could not connect to database on startup: {e}")
+        upgrade_schema(engine)
+        # Once here, in its own session, rather than from inside requests
+        with SessionLocal() as db:
+            seed_default_rules(db)
+    except Exception:
+        logger.exception("Database schema upgrade failed on startup")
+        raise
     yield
+    run_executor.shutdown(wait=True)
+    job_queue.shutdown(wait=True)
+    # After the executors, so events they recorded are written too
+    audit_writer.shutdown()
+    password_pool.shutdown()
+    google_verifier.close()
+    close_llm_client()
+    redis_manager.close()
+    await dispose_async_engine()
+    engine.dispose()
 
 setup_logging()
 
@@ -33,12 +63,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Cut oversized uploads off at the transport level; the slack covers the
+# multipart framing around the file itself.
+MULTIPART_SLACK_BYTES = 64 * 1024
+
+def upload_body_limit(path: str):
+    if path == f"{settings.API_V1_STR}/invoices/upload":
+        return settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024 + MULTIPART_SLACK_BYTES
+    if path == f"{settings.API_V1_STR}/invoices/bulk-upload":
+        return settings.MAX_BULK_UPLOAD_SIZE_MB * 1024 * 1024 + MULTIPART_SLACK_BYTES
+    return None
+
+app.add_middleware(BodySizeLimitMiddleware, limit_for=upload_body_limit)
+
 # Routers
 app.include_router(auth.router, prefix=f"{settings.API_V1_STR}/auth", tags=["auth"])
 app.include_router(invoices.router, prefix=f"{settings.API_V1_STR}/invoices", tags=["invoices"])
 app.include_router(compliance.router, prefix=f"{settings.API_V1_STR}/compliance", tags=["compliance"])
 app.include_router(audit.router, prefix=f"{settings.API_V1_STR}/audit", tags=["audit"])
+app.include_router(analytics.router, prefix=f"{settings.API_V1_STR}/analytics", tags=["analytics"])
+app.include_router(reports.router, prefix=f"{settings.API_V1_STR}/reports", tags=["reports"])
 
 @app.get("/")
 def health_check():
     return {"status": "ok", "service": "GST Compliance Backend"}
+
+@app.get("/metrics")
+def get_metrics():
+    return metrics.snapshot()
+
+@app.get("/metrics/workers", dependencies=[Depends(deps.get_current_active_admin)])
+def get_worker_metrics():
+    # Published by each ingestion worker process through Redis
+    return read_worker_stats()
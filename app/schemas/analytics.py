@@ -0,0 +1,34 @@
+from typing import List, Optional
+from pydantic import BaseModel
+from datetime import date
+from decimal import Decimal
+
+class HsnTaxRow(BaseModel):
+    # null groups line items the extraction found no HSN code for
+    hsn_code: Optional[str] = None
+    line_count: int
+    invoice_count: int
+    taxable_value: Decimal
+    tax_amount: Decimal
+
+class HsnTaxReport(BaseModel):
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    rows: List[HsnTaxRow] = []
+
+class SupplierInvoice(BaseModel):
+    invoice_id: int
+    invoice_number: Optional[str] = None
+    invoice_date: Optional[date] = None
+    taxable_value: Optional[Decimal] = None
+    total_amount: Optional[Decimal] = None
+
+    class Config:
+        from_attributes = True
+
+class SupplierInvoices(BaseModel):
+    gstin: str
+    invoice_count: int
+    total_amount: Decimal
+    # Newest first, at most `limit`; invoice_count and total_amount cover all
+    items: List[SupplierInvoice] = []
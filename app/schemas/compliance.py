@@ -22,3 +22,29 @@ class RunResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+class BatchRunRequest(BaseModel):
+    invoice_ids: Optional[List[int]] = None
+    status: Optional[str] = None
+    uploaded_from: Optional[datetime] = None
+    uploaded_to: Optional[datetime] = None
+
+class BatchRunResult(BaseModel):
+    run_id: str
+    invoice_id: int
+    status: str
+    violation_count: int
+
+class BatchResponse(BaseModel):
+    batch_id: str
+    status: str
+    rules_version: Optional[str]
+    invoice_count: int
+    skipped_count: int
+    violation_count: int
+    start_ts: datetime
+    end_ts: Optional[datetime]
+    results: List[BatchRunResult] = []
+
+    class Config:
+        from_attributes = True
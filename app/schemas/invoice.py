@@ -1,4 +1,4 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from pydantic import BaseModel
 from datetime import datetime
 
@@ -10,6 +10,8 @@ class InvoiceResponse(InvoiceBase):
     user_id: int
     status: str
     invoice_hash: Optional[str] = None
+    duplicate_of_id: Optional[int] = None
+    page_count: Optional[int] = None
     uploaded_at: datetime
 
     class Config:
@@ -17,3 +19,35 @@ class InvoiceResponse(InvoiceBase):
 
 class InvoiceDetail(InvoiceResponse):
     extracted_data: Optional[Dict[str, Any]] = None
+
+class LatestRunSummary(BaseModel):
+    run_id: str
+    status: str
+    start_ts: datetime
+    end_ts: Optional[datetime] = None
+    violation_count: int
+
+class InvoiceSummary(InvoiceResponse):
+    # Only filled in by GET /invoices/?include=summary
+    has_extraction: Optional[bool] = None
+    extraction_quality: Optional[float] = None
+    latest_run: Optional[LatestRunSummary] = None
+
+class InvoicePage(BaseModel):
+    items: List[InvoiceSummary]
+    # Pass back as ?cursor= for the next page; null on the last page
+    next_cursor: Optional[str] = None
+
+class BulkUploadItem(BaseModel):
+    invoice_id: int
+    filename: str
+    status: str
+    duplicate_of_id: Optional[int] = None
+
+class BulkUploadRejection(BaseModel):
+    filename: str
+    reason: str
+
+class BulkUploadResponse(BaseModel):
+    created: List[BulkUploadItem] = []
+    rejected: List[BulkUploadRejection] = []
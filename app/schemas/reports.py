@@ -0,0 +1,33 @@
+from typing import List
+from pydantic import BaseModel
+from decimal import Decimal
+
+class TaxSlabSummary(BaseModel):
+    tax_rate: Decimal
+    line_count: int
+    taxable_value: Decimal
+    tax_amount: Decimal
+
+class RuleViolationSummary(BaseModel):
+    rule_id: str
+    severity: str
+    violation_count: int
+
+class MonthReport(BaseModel):
+    # YYYY-MM. Invoice figures are by invoice date (upload date when the
+    # invoice has none); runs and violations by the month the run completed.
+    period: str
+    invoice_count: int = 0
+    taxable_value: Decimal = Decimal("0.00")
+    cgst_amount: Decimal = Decimal("0.00")
+    sgst_amount: Decimal = Decimal("0.00")
+    igst_amount: Decimal = Decimal("0.00")
+    total_amount: Decimal = Decimal("0.00")
+    runs_completed: int = 0
+    violation_count: int = 0
+    tax_slabs: List[TaxSlabSummary] = []
+    violations: List[RuleViolationSummary] = []
+
+class MonthlyReport(BaseModel):
+    # Oldest first; months with no activity are left out
+    months: List[MonthReport] = []
@@ -8,3 +8,7 @@ class Token(BaseModel):
 
 class TokenPayload(BaseModel):
     sub: Optional[str] = None
+    uid: Optional[int] = None
+    role: Optional[str] = None
+    exp: Optional[float] = None
+    iat: Optional[float] = None
@@ -1,6 +1,7 @@
 from typing import Optional
 from pydantic import BaseModel, EmailStr
 from datetime import datetime
+from app.db.models import UserRole
 
 class UserBase(BaseModel):
     email: EmailStr
@@ -14,6 +15,9 @@ class UserLogin(UserBase):
 class GoogleLoginRequest(BaseModel):
     token: str
 
+class UserRoleUpdate(BaseModel):
+    role: UserRole
+
 class UserResponse(UserBase):
     id: int
     role: str
@@ -1,16 +1,268 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Mapping
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import metrics
 from app.db.models import AuditLog
-import json
+from app.utils.digest import chain_digest, payload_digest
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+# Serialises chain appends across processes on Postgres
+_CHAIN_LOCK_KEY = 0x61756469  # "audi"
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def chain_record(row) -> dict:
+    """The fields of an AuditLog row (dict or ORM object) a chain link covers."""
+    get = row.get if isinstance(row, Mapping) else lambda name: getattr(row, name)
+    return {
+        "user_id": get("user_id"),
+        "run_id": get("run_id"),
+        "endpoint": get("endpoint"),
+        "event": get("event"),
+        "payload_hash": get("payload_hash"),
+        "response_hash": get("response_hash"),
+        "token_cost": float(get("token_cost") or 0.0),
+        "timestamp": get("timestamp").isoformat(),
+    }
+
+
+class AuditWriter:
+    """Background writer for AuditLog rows.
+
+    record() only timestamps the event and puts it on a bounded in-memory
+    queue. A single thread drains the queue and bulk-inserts a batch once
+    it reaches batch_size rows or the oldest queued event is
+    flush_interval old. Rows are grouped by engine, like RunExecutor jobs
+    carry the request's bind.
+
+    If the database falls behind and the queue fills up, overflow_policy
+    decides: "block" waits up to enqueue_timeout for room, "drop" gives up
+    at once. Either way dropped events are counted (audit_events_dropped)
+    and logged; request handling never fails because of auditing.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        flush_interval: float,
+        max_queue: int,
+        overflow_policy: str = "block",
+        enqueue_timeout: float = 0.1,
+        flush_retries: int = 3,
+        hash_chain: bool = False,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.enqueue_timeout = enqueue_timeout
+        self.flush_retries = flush_retries
+        self.hash_chain = hash_chain
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(
+        self,
+        bind: Engine,
+        event: str,
+        endpoint: str,
+        user_id: Optional[int] = None,
+        run_id: Optional[str] = None,
+        payload: Optional[dict] = None,
+        response: Optional[dict] = None,
+        token_cost: float = 0.0,
+    ) -> None:
+        row = {
+            "user_id": user_id,
+            "run_id": run_id,
+            "endpoint": endpoint,
+            "event": event,
+            "payload": payload,
+            "response": response,
+            "token_cost": token_cost,
+            "timestamp": datetime.utcnow(),
+        }
+        self._ensure_started()
+        try:
+            # Waiting for room would stall every coroutine on an event loop,
+            # so async handlers always get the drop path
+            if self.overflow_policy == "block" and not _on_event_loop():
+                self._queue.put((bind, row), timeout=self.enqueue_timeout)
+            else:
+                self._queue.put_nowait((bind, row))
+        except queue.Full:
+            metrics.inc("audit_events_dropped")
+            logger.error("Audit queue full, dropped %s event for user %s", event, user_id)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything recorded so far is written (or dropped)."""
+        with self._lock:
+            running = self._thread is not None
+        if not running:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def shutdown(self, timeout: Optional[float] = None) -> None:
+        """Write out the queue and stop the thread; called from the app lifespan."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        pending: List[Tuple[Engine, dict]] = []
+        deadline = 0.0
+        while True:
+            timeout = max(deadline - time.monotonic(), 0) if pending else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._write(pending)
+                pending = []
+                continue
+            if item is _STOP:
+                self._write(pending)
+                return
+            if isinstance(item, threading.Event):
+                self._write(pending)
+                pending = []
+                item.set()
+                continue
+            if not pending:
+                deadline = time.monotonic() + self.flush_interval
+            pending.append(item)
+            if len(pending) >= self.batch_size:
+                self._write(pending)
+                pending = []
+
+    def _write(self, pending: List[Tuple[Engine, dict]]) -> None:
+        by_bind: Dict[Engine, List[dict]] = defaultdict(list)
+        for bind, row in pending:
+            # Hashing happens here rather than on the request path
+            row = dict(row, payload_hash=payload_digest(row["payload"]), response_hash=payload_digest(row["response"]))
+            del row["payload"], row["response"]
+            by_bind[bind].append(row)
+        for bind, rows in by_bind.items():
+            self._insert(bind, rows)
+
+    def _insert(self, bind: Engine, rows: List[dict]) -> None:
+        for attempt in range(self.flush_retries):
+            db = Session(bind=bind)
+            try:
+                if self.hash_chain:
+                    self._link(db, rows)
+                # One executemany INSERT per batch
+                db.execute(insert(AuditLog), rows)
+                db.commit()
+                metrics.inc("audit_flushes")
+                metrics.inc("audit_events_written", len(rows))
+                return
+            except SQLAlchemyError as e:
+                db.rollback()
+                metrics.inc("audit_flush_errors")
+                logger.warning("Audit flush of %d rows failed (attempt %d): %s", len(rows), attempt + 1, e)
+                time.sleep(min(0.1 * 2 ** attempt, 2.0))
+            finally:
+                db.close()
+        metrics.inc("audit_events_dropped", len(rows))
+        logger.error("Dropped %d audit events after %d failed flushes", len(rows), self.flush_retries)
+
+    @staticmethod
+    def _link(db: Session, rows: List[dict]) -> None:
+        # Read the chain head and append inside one transaction; on Postgres
+        # the advisory lock keeps other writer processes from forking it.
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _CHAIN_LOCK_KEY})
+        prev_hash = db.scalar(
+            select(AuditLog.row_hash).where(AuditLog.row_hash.isnot(None)).order_by(AuditLog.id.desc()).limit(1)
+        )
+        for row in rows:
+            row["prev_hash"] = prev_hash
+            row["row_hash"] = prev_hash = chain_digest(prev_hash, chain_record(row))
+
+
+audit_writer = AuditWriter(
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    flush_interval=settings.AUDIT_FLUSH_INTERVAL_MS / 1000,
+    max_queue=settings.AUDIT_QUEUE_MAX,
+    overflow_policy=settings.AUDIT_OVERFLOW_POLICY,
+    enqueue_timeout=settings.AUDIT_ENQUEUE_TIMEOUT_MS / 1000,
+    flush_retries=settings.AUDIT_FLUSH_RETRIES,
+    hash_chain=settings.AUDIT_HASH_CHAIN,
+)
+
+
+@dataclass
+class ChainVerification:
+    ok: bool
+    checked: int
+    broken_at: Optional[int] = None
+    reason: Optional[str] = None
+
 
 class AuditService:
     @staticmethod
-    def log_event(db: Session, user_id: int, endpoint: str, event: str, payload: dict = None, response: dict = None):
-        log = AuditLog(
-            user_id=user_id,
-            endpoint=endpoint,
-            event=event,
-            payload_hash=str(hash(json.dumps(payload))) if payload else None,
-            response_hash=str(hash(json.dumps(response))) if response else None
+    def log_event(db: Session, user_id: int, endpoint: str, event: str, payload: dict = None, response: dict = None,
+                  run_id: str = None, token_cost: float = 0.0):
+        # Queued for the background writer; no commit on the caller's session
+        audit_writer.record(
+            db.get_bind(), event, endpoint, user_id=user_id, run_id=run_id,
+            payload=payload, response=response, token_cost=token_cost,
+        )
+
+    @staticmethod
+    def verify_chain(db: Session, batch_size: int = 1000) -> ChainVerification:
+        """One sequential scan by id. Each chained row must point at the
+        previous chained row and hash to its stored row_hash; a deleted,
+        edited or reordered row breaks the first link after it. Rows written
+        with the chain disabled are skipped."""
+        stmt = (
+            select(AuditLog.__table__)
+            .where(AuditLog.row_hash.isnot(None))
+            .order_by(AuditLog.id)
+            .execution_options(yield_per=batch_size)
         )
-        db.add(log)
-        db.commit()
+        last_hash = None
+        checked = 0
+        for row in db.execute(stmt).mappings():
+            if row["prev_hash"] != last_hash:
+                return ChainVerification(False, checked, row["id"], "prev_hash does not match the previous row")
+            if chain_digest(row["prev_hash"], chain_record(row)) != row["row_hash"]:
+                return ChainVerification(False, checked, row["id"], "row contents do not match row_hash")
+            last_hash = row["row_hash"]
+            checked += 1
+        return ChainVerification(True, checked)
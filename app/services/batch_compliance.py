@@ -0,0 +1,115 @@
+import uuid
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import ComplianceBatch, Invoice, InvoiceData, Run, RunStatus, Violation
+from app.services.reporting import SummaryDelta
+from app.services.rule_engine import RuleRegistry, rule_registry
+
+
+def _chunks(ids: List[int], size: int) -> Iterator[List[int]]:
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+class BatchComplianceService:
+    def __init__(self, db: Session, registry: RuleRegistry = rule_registry):
+        self.db = db
+        self.registry = registry
+
+    def resolve_invoice_ids(
+        self,
+        user_id: int,
+        invoice_ids: Optional[List[int]] = None,
+        status: Optional[str] = None,
+        uploaded_from: Optional[datetime] = None,
+        uploaded_to: Optional[datetime] = None,
+    ) -> List[int]:
+        if invoice_ids is not None:
+            # Ownership and extraction state are enforced by the chunk query.
+            return sorted(set(invoice_ids))
+        query = select(Invoice.id).where(Invoice.user_id == user_id)
+        if status:
+            query = query.where(Invoice.status == status)
+        if uploaded_from:
+            query = query.where(Invoice.uploaded_at >= uploaded_from)
+        if uploaded_to:
+            query = query.where(Invoice.uploaded_at < uploaded_to)
+        return list(self.db.scalars(query.order_by(Invoice.id)))
+
+    def run_batch(self, user_id: int, invoice_ids: List[int]) -> ComplianceBatch:
+        ruleset = self.registry.get(self.db)
+        batch = ComplianceBatch(
+            batch_id=str(uuid.uuid4()),
+            user_id=user_id,
+            status=RunStatus.RUNNING,
+            rules_version=ruleset.version,
+            start_ts=datetime.utcnow(),
+        )
+        self.db.add(batch)
+        self.db.flush()
+
+        evaluated = 0
+        violation_count = 0
+        delta = SummaryDelta()
+        for chunk in _chunks(invoice_ids, settings.COMPLIANCE_BATCH_CHUNK_SIZE):
+            rows = self.db.execute(
+                select(InvoiceData.invoice_id, InvoiceData.extracted_json)
+                .join(Invoice, Invoice.id == InvoiceData.invoice_id)
+                .where(Invoice.user_id == user_id, InvoiceData.invoice_id.in_(chunk))
+            ).all()
+
+            now = datetime.utcnow()
+            run_rows = []
+            violation_rows = []
+            results = ruleset.evaluate_many([data or {} for _, data in rows])
+            for (invoice_id, _), violations in zip(rows, results):
+                delta.add_run(user_id, now, violations)
+                run_id = str(uuid.uuid4())
+                run_rows.append({
+                    "run_id": run_id,
+                    "user_id": user_id,
+                    "invoice_id": invoice_id,
+                    "batch_id": batch.batch_id,
+                    "status": RunStatus.COMPLETED,
+                    "start_ts": now,
+                    "end_ts": now,
+                    "token_cost": 0.0,
+                })
+                violation_rows.extend(dict(v, run_id=run_id) for v in violations)
+
+            if run_rows:
+                self.db.execute(insert(Run), run_rows)
+            if violation_rows:
+                self.db.execute(insert(Violation), violation_rows)
+            evaluated += len(run_rows)
+            violation_count += len(violation_rows)
+
+        batch.invoice_count = evaluated
+        batch.skipped_count = len(invoice_ids) - evaluated
+        batch.violation_count = violation_count
+        batch.status = RunStatus.COMPLETED
+        batch.end_ts = datetime.utcnow()
+        # One upsert per touched summary row for the whole batch
+        delta.apply(self.db)
+        self.db.commit()
+        return batch
+
+    def get_results(self, batch_id: str, skip: int = 0, limit: int = 100) -> List[dict]:
+        rows = self.db.execute(
+            select(Run.run_id, Run.invoice_id, Run.status, func.count(Violation.id))
+            .outerjoin(Violation, Violation.run_id == Run.run_id)
+            .where(Run.batch_id == batch_id)
+            .group_by(Run.run_id, Run.invoice_id, Run.status)
+            .order_by(Run.invoice_id)
+            .offset(skip)
+            .limit(limit)
+        ).all()
+        return [
+            {"run_id": run_id, "invoice_id": invoice_id, "status": status, "violation_count": count}
+            for run_id, invoice_id, status, count in rows
+        ]
@@ -0,0 +1,61 @@
+import gzip
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.utils.digest import digest_bytes
+
+REF_PREFIX = "b2:"
+
+
+class BlobStore:
+    """Content-addressed, gzip-compressed blobs on local disk.
+
+    A blob's ref is the BLAKE2b of its uncompressed bytes, so identical
+    OCR text (re-uploads, duplicates) is stored once and rows can share a
+    ref. Blobs are immutable: writes go to a temp file and are renamed
+    into place, and an existing blob is never rewritten.
+    """
+
+    def __init__(self, root: Path, compression_level: int = 6):
+        self.root = Path(root)
+        self.compression_level = compression_level
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:4] / f"{digest}.gz"
+
+    def put_text(self, text: str) -> str:
+        data = text.encode()
+        digest = digest_bytes(data)
+        path = self._path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            compressed = gzip.compress(data, compresslevel=self.compression_level, mtime=0)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(compressed)
+            os.replace(tmp, path)
+            metrics.inc("text_blobs_written")
+            metrics.inc("text_blob_bytes_saved", len(data) - len(compressed))
+        return REF_PREFIX + digest
+
+    def get_text(self, ref: str) -> Optional[str]:
+        if not ref.startswith(REF_PREFIX):
+            raise ValueError(f"Not a blob ref: {ref!r}")
+        try:
+            return gzip.decompress(self._path(ref[len(REF_PREFIX):]).read_bytes()).decode()
+        except FileNotFoundError:
+            return None
+
+
+def load_extracted_text(data, store: Optional[BlobStore] = None) -> Optional[str]:
+    """OCR text of an InvoiceData row: from the blob store, or from the
+    deferred inline column for rows written before text_ref existed."""
+    if data.text_ref:
+        return (store or text_blobs).get_text(data.text_ref)
+    return data.extracted_text
+
+
+text_blobs = BlobStore(settings.TEXT_BLOB_DIR, settings.TEXT_BLOB_COMPRESSION_LEVEL)
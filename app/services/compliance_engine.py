@@ -1,73 +1,65 @@
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from app.db.models import Violation, Run, Rule, RunStatus
-from app.utils.validators import GSTValidator
+from app.db.models import Violation, Run, RunStatus
+from app.services.reporting import SummaryDelta
+from app.services.rule_engine import RuleRegistry, RuleSet, rule_registry
 from datetime import datetime
-import uuid
 
 class ComplianceEngine:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, registry: RuleRegistry = rule_registry):
         self.db = db
+        self.registry = registry
 
-    def run_compliance_checks(self, run: Run, data: dict):
-        violations = []
-        
-        # Rule 1: GSTIN Presence
-        if not data.get("gstin"):
-            violations.append(self._create_violation(run.run_id, "RULE_001", "GSTIN Missing", "high", None, "Present", "Ensure GSTIN is clearly visible"))
-        else:
-            # Rule 2: GSTIN Format
-            if not GSTValidator.validate_gstin(data.get("gstin")):
-                violations.append(self._create_violation(run.run_id, "RULE_002", "Invalid GSTIN Format", "high", data.get("gstin"), "Valid Regex", "Check for typos in GSTIN"))
-
-        # Rule 3: HSN Check
-        items = data.get("line_items", [])
-        hsn_missing = any(not item.get("hsn_code") for item in items)
-        if hsn_missing:
-            violations.append(self._create_violation(run.run_id, "RULE_003", "HSN Code Missing", "medium", "Missing", "Present", "Add HSN codes for all items"))
+    def run_compliance_checks(self, run: Run, data: dict, on_violation: Optional[Callable[[dict], None]] = None):
+        # Rules are compiled once per rule-set version, so evaluating an
+        # invoice never goes back to the database.
+        ruleset = self.registry.get(self.db)
+        violations = [dict(v, run_id=run.run_id) for v in ruleset.evaluate(data or {})]
+        if on_violation:
+            for violation in violations:
+                on_violation(violation)
 
-        # Rule 4: Tax Calculation
-        # Simple check: Tax Amount ~ Taxable Value * Rate
-        for idx, item in enumerate(items):
-            try:
-                taxable = float(item.get("taxable_value", 0))
-                rate = float(item.get("tax_rate", 0))
-                tax_amt = float(item.get("tax_amount", 0))
-                
-                expected_tax = taxable * (rate / 100)
-                if abs(expected_tax - tax_amt) > 1.0: # 1 rupee tolerance
-                    violations.append(self._create_violation(
-                        run.run_id, 
-                        "RULE_004", 
-                        f"Tax Mismatch Item {idx+1}", 
-                        "high", 
-                        str(tax_amt), 
-                        str(expected_tax), 
-                        "Recalculate tax amount"
-                    ))
-            except (ValueError, TypeError):
-                pass
-        
-        # Save violations
+        # Save violations in one executemany instead of an INSERT per row
         if violations:
-            self.db.add_all(violations)
-        
+            self.db.execute(insert(Violation), violations)
+
         run.status = RunStatus.COMPLETED
         run.end_ts = datetime.utcnow()
+        delta = SummaryDelta()
+        delta.add_run(run.user_id, run.end_ts, violations)
+        delta.apply(self.db)
         self.db.commit()
 
-    def _create_violation(self, run_id, rule_id, rule_title, severity, detected, expected, suggestion):
-        # Ensure rule exists (idempotent for demo)
-        rule = self.db.query(Rule).filter(Rule.rule_id == rule_id).first()
-        if not rule:
-            rule = Rule(rule_id=rule_id, title=rule_title, severity=severity, check_type="standard")
-            self.db.add(rule)
-            self.db.commit()
-
-        return Violation(
-            run_id=run_id,
-            rule_id=rule_id,
-            detected_value=detected,
-            expected_value=expected,
-            suggestion=suggestion,
-            severity=severity
-        )
+    def stage_runs(self, invoices: List[Tuple[int, int, dict]], ruleset: Optional[RuleSet] = None) -> Dict[int, str]:
+        """Evaluate freshly extracted (invoice_id, user_id, extracted_json)
+        and add a COMPLETED Run with its violations for each, without
+        committing. Returns invoice_id -> run_id."""
+        if not invoices:
+            return {}
+        ruleset = ruleset or self.registry.get(self.db)
+        now = datetime.utcnow()
+        run_ids: Dict[int, str] = {}
+        run_rows = []
+        violation_rows = []
+        delta = SummaryDelta()
+        results = ruleset.evaluate_many([data or {} for _, _, data in invoices])
+        for (invoice_id, user_id, _), violations in zip(invoices, results):
+            delta.add_run(user_id, now, violations)
+            run_id = run_ids[invoice_id] = str(uuid.uuid4())
+            run_rows.append({
+                "run_id": run_id,
+                "user_id": user_id,
+                "invoice_id": invoice_id,
+                "status": RunStatus.COMPLETED,
+                "start_ts": now,
+                "end_ts": now,
+                "token_cost": 0.0,
+            })
+            violation_rows.extend(dict(v, run_id=run_id) for v in violations)
+        self.db.execute(insert(Run), run_rows)
+        if violation_rows:
+            self.db.execute(insert(Violation), violation_rows)
+        delta.apply(self.db)
+        return run_ids
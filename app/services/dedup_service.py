@@ -0,0 +1,73 @@
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.models import Invoice, InvoiceData, InvoiceStatus
+from app.services.normalization import NormalizationService
+
+class DedupService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def find_processed(self, file_hash: str, user_id: int) -> Optional[Tuple[Invoice, InvoiceData]]:
+        """Earliest completed invoice with the same content hash, within DEDUP_SCOPE."""
+        return self.find_processed_many([file_hash], user_id).get(file_hash)
+
+    def find_processed_many(self, file_hashes: List[str], user_id: int) -> Dict[str, Tuple[Invoice, InvoiceData]]:
+        """Like find_processed for a whole upload batch, in one query."""
+        if settings.DEDUP_SCOPE == "off" or not file_hashes:
+            return {}
+        query = (
+            self.db.query(Invoice, InvoiceData)
+            .join(InvoiceData, InvoiceData.invoice_id == Invoice.id)
+            .filter(Invoice.invoice_hash.in_(set(file_hashes)), Invoice.status == InvoiceStatus.COMPLETED)
+        )
+        if settings.DEDUP_SCOPE != "global":
+            query = query.filter(Invoice.user_id == user_id)
+
+        matches: Dict[str, Tuple[Invoice, InvoiceData]] = {}
+        for invoice, data in query.order_by(Invoice.id):
+            matches.setdefault(invoice.invoice_hash, (invoice, data))
+
+        hits = [h for h in file_hashes if h in matches]
+        metrics.inc("dedup_lookups", len(file_hashes))
+        metrics.inc("dedup_hits", len(hits))
+        metrics.inc("dedup_cpu_ms_saved", sum(matches[h][1].extraction_cpu_ms or 0.0 for h in hits))
+        return matches
+
+    @staticmethod
+    def duplicate_data(invoice_id: int, source_data: InvoiceData) -> dict:
+        """Column values for the InvoiceData copy of a duplicate upload."""
+        return {
+            "invoice_id": invoice_id,
+            "extracted_json": source_data.extracted_json,
+            # Content-addressed, so the copy shares the source's blob
+            "text_ref": source_data.text_ref,
+            # Only rows from before the blob store still carry inline text
+            "extracted_text": None if source_data.text_ref else source_data.extracted_text,
+            "extraction_quality": source_data.extraction_quality,
+            "extraction_cpu_ms": 0.0,
+            "llm_tokens": 0,
+            "token_cost": 0.0,
+        }
+
+    @staticmethod
+    def counts_separately(user_id: int, source: Invoice) -> bool:
+        """Whether a duplicate of `source` uploaded by `user_id` needs its own
+        normalized rows: with DEDUP_SCOPE=global the original may be another
+        user's, and that user's rows do not show up in this one's aggregates."""
+        return source.user_id != user_id
+
+    def link_duplicate(self, invoice: Invoice, source: Invoice, source_data: InvoiceData) -> InvoiceData:
+        """Point `invoice` at the stored file of `source` and copy its extraction."""
+        invoice.stored_path = source.stored_path
+        invoice.duplicate_of_id = source.id
+        invoice.status = InvoiceStatus.COMPLETED
+        self.db.add(invoice)
+        self.db.flush()
+
+        data = InvoiceData(**self.duplicate_data(invoice.id, source_data))
+        self.db.add(data)
+        if self.counts_separately(invoice.user_id, source):
+            NormalizationService(self.db).stage({invoice.id: source_data.extracted_json})
+        return data
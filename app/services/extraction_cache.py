@@ -0,0 +1,176 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import zlib
+from pathlib import Path
+from typing import Optional
+
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.redis_pool import RedisManager, redis_manager
+
+logger = logging.getLogger(__name__)
+
+
+class DiskLRUStore:
+    """Size-capped byte store on local disk, evicting least recently used.
+
+    File mtimes double as the LRU clock: reads touch the file, and eviction
+    removes the oldest files until the store is back under 90% of the cap.
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            value = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return value
+
+    def put(self, key: str, value: bytes) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(value)
+        with self._lock:
+            # An overwritten entry's bytes leave the store with it
+            try:
+                replaced = path.stat().st_size
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(tmp, path)
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(value) - replaced
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _files(self):
+        return [p for p in self.root.glob("*/*") if p.is_file() and not p.name.endswith(".tmp")]
+
+    def _scan_size(self) -> int:
+        return sum(p.stat().st_size for p in self._files())
+
+    def _evict(self) -> None:
+        entries = []
+        for p in self._files():
+            try:
+                stat = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, p))
+        entries.sort()
+        size = sum(entry[1] for entry in entries)
+        target = self.max_bytes * 0.9
+        for _, file_size, p in entries:
+            if size <= target:
+                break
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+            size -= file_size
+        self._size = size
+
+
+class RedisStore:
+    """Shared tier across workers. Failures degrade to a cache miss."""
+
+    def __init__(self, manager: RedisManager, ttl_seconds: int, prefix: str = "extraction-cache:"):
+        self.manager = manager
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        if not self.manager.is_available():
+            return None
+        try:
+            return self.manager.client().get(self.prefix + key)
+        except RedisError as e:
+            logger.warning("Extraction cache Redis get failed: %s", e)
+            self.manager.mark_down()
+            return None
+
+    def put(self, key: str, value: bytes) -> None:
+        if not self.manager.is_available():
+            return
+        try:
+            self.manager.client().set(self.prefix + key, value, ex=self.ttl_seconds)
+        except RedisError as e:
+            logger.warning("Extraction cache Redis set failed: %s", e)
+            self.manager.mark_down()
+
+
+class ExtractionCache:
+    """Two-level cache for the ingestion pipeline.
+
+    - page text keyed by (file SHA-256, OCR engine version)
+    - structured JSON keyed by (text SHA-256, parser version)
+
+    A parser upgrade therefore misses only the second level and re-parses
+    from cached text without touching the PDF.
+    """
+
+    def __init__(self, disk: DiskLRUStore, shared: Optional[RedisStore] = None):
+        self.disk = disk
+        self.shared = shared
+
+    @staticmethod
+    def _key(kind: str, content_hash: str, version: str) -> str:
+        return hashlib.sha256(f"{kind}:{content_hash}:{version}".encode()).hexdigest()
+
+    def _get(self, kind: str, key: str) -> Optional[bytes]:
+        value = self.disk.get(key)
+        if value is None and self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.disk.put(key, value)
+        metrics.inc(f"extraction_cache_{kind}_{'hits' if value is not None else 'misses'}")
+        return value
+
+    def _put(self, key: str, value: bytes) -> None:
+        self.disk.put(key, value)
+        if self.shared is not None:
+            self.shared.put(key, value)
+
+    def get_text(self, file_hash: str, ocr_version: str) -> Optional[str]:
+        value = self._get("text", self._key("text", file_hash, ocr_version))
+        return zlib.decompress(value).decode() if value is not None else None
+
+    def put_text(self, file_hash: str, ocr_version: str, text: str) -> None:
+        self._put(self._key("text", file_hash, ocr_version), zlib.compress(text.encode()))
+
+    def get_json(self, text_hash: str, parser_version: str) -> Optional[dict]:
+        value = self._get("json", self._key("json", text_hash, parser_version))
+        return json.loads(value) if value is not None else None
+
+    def put_json(self, text_hash: str, parser_version: str, data: dict) -> None:
+        self._put(self._key("json", text_hash, parser_version), json.dumps(data).encode())
+
+
+def build_extraction_cache() -> Optional[ExtractionCache]:
+    if not settings.EXTRACTION_CACHE_ENABLED:
+        return None
+    disk = DiskLRUStore(Path(settings.EXTRACTION_CACHE_DIR), settings.EXTRACTION_CACHE_MAX_MB * 1024 * 1024)
+    shared = None
+    if settings.EXTRACTION_CACHE_REDIS:
+        shared = RedisStore(redis_manager, settings.EXTRACTION_CACHE_REDIS_TTL_SECONDS)
+    return ExtractionCache(disk, shared)
+
+
+extraction_cache = build_extraction_cache()
@@ -1,29 +1,145 @@
+import hashlib
+from typing import Dict, List, Optional, Tuple, Union
+from sqlalchemy import insert, select, update
 from sqlalchemy.orm import Session
 from app.db.models import InvoiceData
+from app.services.blob_store import BlobStore, text_blobs
+from app.services.extraction_cache import ExtractionCache, extraction_cache
 from app.services.ocr_service import OCRService
+from app.services.llm_providers import LLMResult
 from app.services.llm_service import LLMService
+from app.services.normalization import NormalizationService
+from app.utils.file_utils import FileUtils
 
 class ExtractionService:
-    def __init__(self, db: Session):
+    def __init__(
+        self,
+        db: Session,
+        cache: Optional[ExtractionCache] = extraction_cache,
+        llm: Optional[LLMService] = None,
+        blobs: BlobStore = text_blobs,
+    ):
         self.db = db
+        self.blobs = blobs
         self.ocr = OCRService()
-        self.llm = LLMService()
-
-    def process_invoice(self, invoice_id: int, file_path: str):
-        # 1. OCR
-        text = self.ocr.extract_text_from_pdf(file_path)
-        
-        # 2. LLM / Extraction
-        extracted_data = self.llm.parse_invoice_text(text)
-        
-        # 3. Store
-        invoice_data = InvoiceData(
-            invoice_id=invoice_id,
-            extracted_text=text,
-            extracted_json=extracted_data,
-            extraction_quality=0.85 # Mock quality score
-        )
-        self.db.add(invoice_data)
+        self.llm = llm or LLMService()
+        self.cache = cache
+        self.normalizer = NormalizationService(db)
+
+    def process_invoice(self, invoice_id: int, file_path: str, file_hash: Optional[str] = None):
+        _, errors = self.stage_many([(invoice_id, file_path, file_hash)])
+        if invoice_id in errors:
+            raise errors[invoice_id]
         self.db.commit()
-        self.db.refresh(invoice_data)
-        return invoice_data
+        return self.db.query(InvoiceData).filter(InvoiceData.invoice_id == invoice_id).one()
+
+    def stage_many(self, jobs: List[Tuple[int, str, Optional[str]]]) -> Tuple[Dict[int, dict], Dict[int, Exception]]:
+        """Extract (invoice_id, file_path, file_hash) jobs and write their
+        InvoiceData rows in the current transaction without committing.
+        Returns the column values written per invoice and the per-invoice
+        errors."""
+        staged, errors = self.extract_many(jobs)
+        self.write_many(staged)
+        return staged, errors
+
+    def extract_many(self, jobs: List[Tuple[int, str, Optional[str]]]) -> Tuple[Dict[int, dict], Dict[int, Exception]]:
+        """The InvoiceData column values for each job, without writing them.
+
+        Files are OCR'd one by one; the texts are then parsed together so an
+        LLM provider can pack them into as few prompts as it allows. Returns
+        the column values per invoice and the per-invoice errors.
+        """
+        texts: Dict[int, str] = {}
+        ocr_cpu_ms: Dict[int, float] = {}
+        errors: Dict[int, Exception] = {}
+
+        # 1. OCR (cached per file content and OCR engine version)
+        for invoice_id, file_path, file_hash in jobs:
+            try:
+                texts[invoice_id], ocr_cpu_ms[invoice_id] = self._extract_text(file_path, file_hash)
+            except Exception as e:
+                errors[invoice_id] = e
+        if not texts:
+            return {}, errors
+
+        # 2. LLM / Extraction (cached per text and provider version)
+        invoice_ids = list(texts)
+        try:
+            results = self._parse_many([texts[invoice_id] for invoice_id in invoice_ids])
+        except Exception as e:
+            errors.update((invoice_id, e) for invoice_id in invoice_ids)
+            return {}, errors
+
+        staged: Dict[int, dict] = {}
+        for invoice_id, result in zip(invoice_ids, results):
+            if isinstance(result, Exception):
+                errors[invoice_id] = result
+                continue
+            staged[invoice_id] = {
+                "invoice_id": invoice_id,
+                # The text goes to the blob store; rows only keep its ref
+                "text_ref": self.blobs.put_text(texts[invoice_id]),
+                "extracted_text": None,
+                "extracted_json": result.data,
+                "extraction_quality": 0.85, # Mock quality score
+                # Reported as "saved" when a duplicate upload reuses this row.
+                # Measured where the work ran (pool process, LLM client
+                # thread), so it is this invoice's alone; zero when cached.
+                "extraction_cpu_ms": ocr_cpu_ms[invoice_id] + result.cpu_ms,
+                # Zero when the parse came from the cache
+                "llm_tokens": result.usage.prompt_tokens + result.usage.completion_tokens,
+                "token_cost": result.usage.cost,
+            }
+        return staged, errors
+
+    def write_many(self, staged: Dict[int, dict]) -> None:
+        """Write extract_many's rows in the current transaction, replacing the
+        previous result of re-processed invoices: one executemany INSERT,
+        one UPDATE, and their normalized header and line-item rows."""
+        if not staged:
+            return
+        existing = dict(self.db.execute(
+            select(InvoiceData.invoice_id, InvoiceData.id).where(InvoiceData.invoice_id.in_(list(staged)))
+        ).all())
+        new_rows = [row for invoice_id, row in staged.items() if invoice_id not in existing]
+        if new_rows:
+            self.db.execute(insert(InvoiceData), new_rows)
+        updates = [dict(row, id=existing[invoice_id]) for invoice_id, row in staged.items() if invoice_id in existing]
+        if updates:
+            # ORM bulk UPDATE by primary key
+            self.db.execute(update(InvoiceData), updates)
+        self.normalizer.stage({invoice_id: row["extracted_json"] for invoice_id, row in staged.items()})
+
+    def _extract_text(self, file_path: str, file_hash: Optional[str]) -> Tuple[str, float]:
+        """The file's text and the CPU ms its OCR took."""
+        if self.cache is None:
+            result = self.ocr.read_pdf(file_path)
+            return result.text, result.cpu_ms
+        file_hash = file_hash or FileUtils.compute_file_hash(file_path)
+        text = self.cache.get_text(file_hash, OCRService.VERSION)
+        if text is not None:
+            return text, 0.0
+        result = self.ocr.read_pdf(file_path)
+        # Empty text is also what a failed extraction returns; retry those
+        if result.text:
+            self.cache.put_text(file_hash, OCRService.VERSION, result.text)
+        return result.text, result.cpu_ms
+
+    def _parse_many(self, texts: List[str]) -> List[Union[LLMResult, Exception]]:
+        """One result per text, or the exception that text failed with."""
+        if self.cache is None:
+            return self.llm.extract_many(texts, return_exceptions=True)
+        text_hashes = [hashlib.sha256(text.encode()).hexdigest() for text in texts]
+        results: List[Optional[Union[LLMResult, Exception]]] = []
+        misses = []
+        for i, text_hash in enumerate(text_hashes):
+            data = self.cache.get_json(text_hash, self.llm.version)
+            results.append(LLMResult(data) if data is not None else None)
+            if data is None:
+                misses.append(i)
+        if misses:
+            for i, result in zip(misses, self.llm.extract_many([texts[i] for i in misses], return_exceptions=True)):
+                if not isinstance(result, Exception):
+                    self.cache.put_json(text_hashes[i], self.llm.version, result.data)
+                results[i] = result
+        return results
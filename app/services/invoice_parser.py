@@ -0,0 +1,170 @@
+"""Heuristic field extraction from OCR'd invoice text.
+
+The text is scanned once, line by line. Cheap substring checks on the
+lower-cased line decide which of the precompiled patterns below are worth
+running, so most lines cost a handful of C-level `in` tests.
+
+Tabular line items are recognised by an HSN/SAC code column (4, 6 or 8
+digits) followed by numeric columns laid out as
+
+    [sr] description  hsn  [qty] [rate/unit]  taxable  rate%  tax  [total]
+
+or, for intra-state invoices, `taxable  cgst%  cgst  sgst%  sgst  [total]`.
+A bare number is accepted as the rate column when it is a GST slab.
+"""
+import re
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Optional
+
+# Bump whenever the parsing logic changes so cached results are not reused
+PARSER_VERSION = "heuristic-2"
+
+INVOICE_NO_RE = re.compile(
+    r"invoice\s*(?:no\.?|number|num\.?|#)\s*[:\-]?\s*([A-Z0-9][A-Z0-9/\-]*)", re.IGNORECASE
+)
+GSTIN_RE = re.compile(r"\b([0-9]{2}[A-Z]{5}[0-9]{4}[A-Z][1-9A-Z]Z[0-9A-Z])\b", re.IGNORECASE)
+DATE_RE = re.compile(r"date\s*[:\-]?\s*(\d{1,2}[/\-.]\d{1,2}[/\-.]\d{2,4})", re.IGNORECASE)
+TAX_LABEL_RE = re.compile(r"\b(c|s|ut|i)gst\b")
+TOTAL_RE = re.compile(
+    r"(grand\s+total|invoice\s+total|total\s+invoice\s+value|total\s+amount|amount\s+payable|"
+    r"net\s+payable|total\s+tax|sub\s*-?\s*total|taxable\s+(?:value|amount)|total)\b"
+    r"[^\d\n]*?(\d[\d,]*(?:\.\d+)?)(?![\d%])"
+)
+# A number that is not part of a word, a date or a percentage
+AMOUNT_RE = re.compile(r"(?<![\w.,/])(\d[\d,]*(?:\.\d+)?)(?![\w%.,/])")
+NUMBER_RE = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+GST_RATES = {0.1, 0.25, 1.0, 1.5, 3.0, 5.0, 6.0, 7.5, 9.0, 12.0, 14.0, 18.0, 28.0}
+HSN_LENGTHS = (4, 6, 8)
+
+TAXABLE_LABELS = ("sub", "taxable")
+
+
+def _decimal(raw: str) -> Optional[Decimal]:
+    try:
+        return Decimal(raw.replace(",", ""))
+    except InvalidOperation:
+        return None
+
+
+def _number(token: str) -> Optional[float]:
+    if not NUMBER_RE.fullmatch(token):
+        return None
+    return float(token.replace(",", ""))
+
+
+def _find_hsn(tokens: List[str]) -> Optional[int]:
+    """Index of the HSN/SAC column: the first all-digit token of HSN length
+    that comes after some descriptive text."""
+    seen_text = False
+    for i, token in enumerate(tokens):
+        if token.isdigit():
+            if seen_text and len(token) in HSN_LENGTHS:
+                return i
+        elif not seen_text and any(c.isalpha() for c in token):
+            seen_text = True
+    return None
+
+
+def _parse_line_item(tokens: List[str], hsn_idx: int) -> Optional[dict]:
+    values = []  # (number, written with a % sign)
+    for token in tokens[hsn_idx + 1:]:
+        is_rate = token.endswith("%")
+        number = _number(token.rstrip("%"))
+        if number is not None:
+            values.append((number, is_rate))
+
+    rates = [i for i, (_, is_rate) in enumerate(values) if is_rate]
+    if not rates:
+        rates = [i for i in range(1, len(values) - 1) if values[i][0] in GST_RATES][:1]
+    if not rates or rates[0] == 0 or rates[0] + 1 >= len(values):
+        return None
+
+    first = rates[0]
+    start = 1 if tokens[0].isdigit() else 0  # serial number column
+    item = {
+        "description": " ".join(tokens[start:hsn_idx]),
+        "hsn_code": tokens[hsn_idx],
+        "taxable_value": values[first - 1][0],
+    }
+    if len(rates) > 1 and rates[1] == first + 2 and first + 3 < len(values):
+        cgst, sgst = values[first + 1][0], values[first + 3][0]
+        item["tax_rate"] = values[first][0] + values[first + 2][0]
+        item["tax_amount"] = round(cgst + sgst, 2)
+        item["cgst_amount"] = cgst
+        item["sgst_amount"] = sgst
+    else:
+        item["tax_rate"] = values[first][0]
+        item["tax_amount"] = values[first + 1][0]
+    return item
+
+
+def parse_invoice_text(text: str) -> dict:
+    invoice_number = date = None
+    gstins: List[str] = []
+    grand_total = plain_total = taxable_total = None
+    tax_sums: Dict[str, Decimal] = {}
+    tax_totals: Dict[str, Decimal] = {}
+    line_items = []
+
+    for line in text.splitlines():
+        lower = line.lower()
+
+        if invoice_number is None and "invoice" in lower:
+            match = INVOICE_NO_RE.search(line)
+            if match:
+                invoice_number = match.group(1)
+        if "z" in lower:  # every GSTIN has a literal Z in position 14
+            for match in GSTIN_RE.finditer(line):
+                gstin = match.group(1).upper()
+                if gstin not in gstins:
+                    gstins.append(gstin)
+        if date is None and "date" in lower:
+            match = DATE_RE.search(line)
+            if match:
+                date = match.group(1)
+
+        if "gst" in lower and (label := TAX_LABEL_RE.search(lower)):
+            amounts = AMOUNT_RE.findall(line, label.end())
+            amount = _decimal(amounts[-1]) if amounts else None
+            if amount is not None:
+                kind = "sgst" if label.group(1) in ("s", "ut") else label.group(1) + "gst"
+                if "total" in lower:
+                    tax_totals[kind] = amount
+                else:
+                    tax_sums[kind] = tax_sums.get(kind, Decimal(0)) + amount
+        elif "total" in lower or "payable" in lower or "taxable" in lower:
+            match = TOTAL_RE.search(lower)
+            if match:
+                label, amount = match.group(1), match.group(2).replace(",", "")
+                if label.startswith(TAXABLE_LABELS):
+                    taxable_total = amount
+                elif label == "total tax":
+                    pass
+                elif label == "total":
+                    # Tables often repeat "Total" per section; the last one is the bottom line
+                    plain_total = amount
+                else:
+                    grand_total = grand_total or amount
+        else:
+            tokens = line.split()
+            hsn_idx = _find_hsn(tokens) if len(tokens) >= 4 else None
+            if hsn_idx is not None:
+                item = _parse_line_item(tokens, hsn_idx)
+                if item:
+                    line_items.append(item)
+
+    taxes = {**tax_sums, **tax_totals}
+    return {
+        "invoice_number": invoice_number,
+        "gstin": gstins[0] if gstins else None,
+        "gstins": gstins,
+        "date": date,
+        "taxable_value": taxable_total,
+        "cgst_amount": str(taxes["cgst"]) if "cgst" in taxes else None,
+        "sgst_amount": str(taxes["sgst"]) if "sgst" in taxes else None,
+        "igst_amount": str(taxes["igst"]) if "igst" in taxes else None,
+        # "0.00" when no total is found, as the rules expect
+        "total_amount": grand_total or plain_total or "0.00",
+        "line_items": line_items,
+    }
@@ -0,0 +1,313 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Coroutine, List, Optional, Tuple, Union
+
+import httpx
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services import invoice_parser
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LLMUsage:
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float = 0.0
+
+    def __add__(self, other: "LLMUsage") -> "LLMUsage":
+        return LLMUsage(
+            self.prompt_tokens + other.prompt_tokens,
+            self.completion_tokens + other.completion_tokens,
+            self.cost + other.cost,
+        )
+
+
+@dataclass
+class LLMResult:
+    data: dict
+    usage: LLMUsage = field(default_factory=LLMUsage)
+    # CPU spent in this process producing data; remote work shows in usage
+    cpu_ms: float = 0.0
+
+
+def token_cost(prompt_tokens: int, completion_tokens: int) -> float:
+    return (
+        prompt_tokens / 1000 * settings.LLM_PRICE_PER_1K_INPUT
+        + completion_tokens / 1000 * settings.LLM_PRICE_PER_1K_OUTPUT
+    )
+
+
+class LLMProvider(ABC):
+    """Turns invoice texts into extracted_json.
+
+    `complete_batch` receives at most `max_batch_size` texts and returns one
+    result per text, in order. Providers that cannot pack several invoices
+    into one prompt keep max_batch_size at 1.
+    """
+
+    name = "base"
+    max_batch_size = 1
+
+    @property
+    def version(self) -> str:
+        """Cache key component; changes whenever output could change."""
+        return self.name
+
+    @abstractmethod
+    async def complete_batch(self, texts: List[str]) -> List[LLMResult]:
+        ...
+
+    async def aclose(self) -> None:
+        pass
+
+
+def _parse(text: str) -> Tuple[dict, float]:
+    """The regex parser's output and the CPU ms it took on this thread."""
+    started = time.thread_time()
+    data = invoice_parser.parse_invoice_text(text)
+    return data, (time.thread_time() - started) * 1000
+
+
+class HeuristicProvider(LLMProvider):
+    """The regex parser; free and synchronous, so no tokens are reported."""
+
+    name = "heuristic"
+
+    @property
+    def version(self) -> str:
+        return invoice_parser.PARSER_VERSION
+
+    async def complete_batch(self, texts: List[str]) -> List[LLMResult]:
+        return [LLMResult(data, cpu_ms=cpu_ms) for data, cpu_ms in map(_parse, texts)]
+
+
+class StubProvider(HeuristicProvider):
+    """Offline stand-in for a remote model: heuristic output, a fixed
+    latency per call and token counts estimated at ~4 characters a token."""
+
+    name = "stub"
+
+    def __init__(self, latency_ms: float = 0.0, max_batch_size: int = 1):
+        self.latency_ms = latency_ms
+        self.max_batch_size = max_batch_size
+        self.calls = 0
+
+    @property
+    def version(self) -> str:
+        return f"stub+{invoice_parser.PARSER_VERSION}"
+
+    async def complete_batch(self, texts: List[str]) -> List[LLMResult]:
+        self.calls += 1
+        await asyncio.sleep(self.latency_ms / 1000)
+        results = []
+        for text in texts:
+            data, cpu_ms = _parse(text)
+            prompt_tokens = len(text) // 4 + 1
+            completion_tokens = len(json.dumps(data)) // 4 + 1
+            usage = LLMUsage(prompt_tokens, completion_tokens, token_cost(prompt_tokens, completion_tokens))
+            results.append(LLMResult(data, usage, cpu_ms))
+        return results
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code == 429 or exc.response.status_code >= 500
+    return isinstance(exc, httpx.TransportError)
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """Chat-completions API (OpenAI or any compatible server) in JSON mode.
+
+    Several invoices go into one prompt as numbered documents; the model
+    answers with {"invoices": [...]} in the same order.
+    """
+
+    name = "openai"
+    PROMPT_VERSION = "1"
+    SYSTEM_PROMPT = (
+        "You extract fields from Indian GST invoices. For each numbered document "
+        "return an object with invoice_number, gstin, date, total_amount, "
+        "cgst_amount, sgst_amount, igst_amount and line_items (description, "
+        "hsn_code, taxable_value, tax_rate, tax_amount). Use null for missing "
+        'fields. Reply with JSON: {"invoices": [...]} in document order.'
+    )
+
+    def __init__(self, base_url: str, api_key: str, model: str, max_batch_size: int, timeout: float, max_retries: int):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_retries = max_retries
+        self.retry_wait = wait_exponential_jitter(initial=1, max=30)
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=timeout,
+        )
+
+    @property
+    def version(self) -> str:
+        return f"openai:{self.model}:prompt-{self.PROMPT_VERSION}"
+
+    async def complete_batch(self, texts: List[str]) -> List[LLMResult]:
+        documents = "\n\n".join(f"### Document {i + 1}\n{text}" for i, text in enumerate(texts))
+        payload = {
+            "model": self.model,
+            "response_format": {"type": "json_object"},
+            "temperature": 0,
+            "messages": [
+                {"role": "system", "content": self.SYSTEM_PROMPT},
+                {"role": "user", "content": documents},
+            ],
+        }
+        async for attempt in AsyncRetrying(
+            retry=retry_if_exception(_is_retryable),
+            stop=stop_after_attempt(self.max_retries),
+            wait=self.retry_wait,
+            reraise=True,
+            before_sleep=lambda state: logger.warning(
+                "LLM call failed (attempt %d), retrying: %s", state.attempt_number, state.outcome.exception()
+            ),
+        ):
+            with attempt:
+                response = await self.client.post("/chat/completions", json=payload)
+                response.raise_for_status()
+
+        body = response.json()
+        invoices = json.loads(body["choices"][0]["message"]["content"]).get("invoices") or []
+        if len(invoices) != len(texts):
+            raise ValueError(f"Expected {len(texts)} invoices from the model, got {len(invoices)}")
+
+        # Usage is per call; attribute it to invoices by prompt length
+        usage = body.get("usage") or {}
+        prompt_tokens, completion_tokens = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+        total_chars = sum(len(text) for text in texts) or 1
+        results = []
+        for text, data in zip(texts, invoices):
+            share = len(text) / total_chars
+            p, c = round(prompt_tokens * share), round(completion_tokens * share)
+            results.append(LLMResult(data, LLMUsage(p, c, token_cost(prompt_tokens, completion_tokens) * share)))
+        return results
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+def build_provider() -> LLMProvider:
+    if settings.LLM_PROVIDER == "stub":
+        return StubProvider(settings.LLM_STUB_LATENCY_MS, settings.LLM_MAX_BATCH_SIZE)
+    if settings.LLM_PROVIDER == "openai":
+        return OpenAICompatibleProvider(
+            settings.LLM_BASE_URL, settings.LLM_API_KEY, settings.LLM_MODEL,
+            settings.LLM_MAX_BATCH_SIZE, settings.LLM_TIMEOUT_SECONDS, settings.LLM_MAX_RETRIES,
+        )
+    return HeuristicProvider()
+
+
+class LLMClient:
+    """Runs a provider on one background event loop per process.
+
+    Sync callers (RQ jobs, threadpool endpoints) submit coroutines to the
+    loop, so every caller shares the provider's HTTP connection pool and
+    the LLM_MAX_CONCURRENCY semaphore.
+    """
+
+    def __init__(self, provider: LLMProvider, max_concurrency: int):
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-client", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def submit(self, coro: Coroutine) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def run(self, coro: Coroutine):
+        return self.submit(coro).result()
+
+    async def _call(self, texts: List[str]) -> List[LLMResult]:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            started = time.perf_counter()
+            results = await self.provider.complete_batch(texts)
+        if len(results) != len(texts):
+            raise ValueError(f"{self.provider.name} returned {len(results)} results for {len(texts)} invoices")
+        usage = sum((result.usage for result in results), LLMUsage())
+        metrics.inc("llm_calls")
+        metrics.inc("llm_documents", len(texts))
+        metrics.inc("llm_prompt_tokens", usage.prompt_tokens)
+        metrics.inc("llm_completion_tokens", usage.completion_tokens)
+        metrics.inc("llm_cost", usage.cost)
+        metrics.inc("llm_ms", (time.perf_counter() - started) * 1000)
+        return results
+
+    async def _call_each(self, texts: List[str]) -> List[Union[LLMResult, Exception]]:
+        """A failed batch is retried one invoice at a time, so one document
+        the model chokes on costs only its own result; the failures are
+        returned in place of results."""
+        try:
+            return await self._call(texts)
+        except Exception as e:
+            if len(texts) == 1:
+                return [e]
+            logger.warning("LLM batch of %d invoices failed, retrying them one by one: %s", len(texts), e)
+            metrics.inc("llm_batch_splits")
+        results = await asyncio.gather(*(self._call([text]) for text in texts), return_exceptions=True)
+        return [result[0] if isinstance(result, list) else result for result in results]
+
+    async def extract_many(self, texts: List[str], return_exceptions: bool = False) -> List[Union[LLMResult, Exception]]:
+        """Pack texts into provider-sized batches and run them concurrently.
+        With return_exceptions, invoices that could not be extracted get
+        their exception in place of a result instead of raising it."""
+        size = max(1, self.provider.max_batch_size)
+        batches = [texts[i:i + size] for i in range(0, len(texts), size)]
+        results = [result for batch in await asyncio.gather(*(self._call_each(batch) for batch in batches)) for result in batch]
+        if not return_exceptions:
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+        return results
+
+    def close(self) -> None:
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(self.provider.aclose(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+
+
+_client: Optional[LLMClient] = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient(build_provider(), settings.LLM_MAX_CONCURRENCY)
+        return _client
+
+
+def close_llm_client() -> None:
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        client.close()
@@ -1,46 +1,33 @@
-import json
-import re
+import asyncio
+from typing import List, Optional, Union
+from app.services.llm_providers import LLMClient, LLMResult, get_llm_client
 
 class LLMService:
+    def __init__(self, client: Optional[LLMClient] = None):
+        self.client = client or get_llm_client()
+
+    @property
+    def version(self) -> str:
+        """Identifies the provider, model and prompt/parser behind the output."""
+        return self.client.provider.version
+
     def parse_invoice_text(self, text: str) -> dict:
+        return self.extract(text).data
+
+    def extract(self, text: str) -> LLMResult:
         """
         Abstraction for LLM.
-        In a real scenario, this would call OpenAI/Anthropic/Gemini.
-        Here, we mock the extraction with Regex or return a dummy structure 
-        to ensure the app is runnable without API keys.
+        The provider is picked by LLM_PROVIDER: the heuristic parser by
+        default, a stub with simulated latency and tokens for offline tests,
+        or an OpenAI-compatible API. The result carries token usage and cost.
         """
-        # Mock logic to extract potential GSTIN, Dates, and Amounts
-        # This is a heuristic fallback since we don't have a live LLM key.
-        
-        data = {
-            "invoice_number": self._extract_field(text, r"Invoice\s*No\.?\s*[:\-]?\s*([A-Z0-9/-]+)"),
-            "gstin": self._extract_field(text, r"GSTIN\s*[:\-]?\s*([0-9]{2}[A-Z]{5}[0-9]{4}[A-Z]{1}[1-9A-Z]{1}Z[0-9A-Z]{1})"),
-            "date": self._extract_field(text, r"Date\s*[:\-]?\s*(\d{2}/\d{2}/\d{4})"),
-            "total_amount": self._extract_amount(text),
-            "line_items": [] # Mock empty for now or try to parse
-        }
-        
-        # Add basic line item if total found
-        if data["total_amount"]:
-             data["line_items"] = [
-                 {
-                     "description": "Service Charge",
-                     "hsn_code": "998311",
-                     "taxable_value": float(data["total_amount"]) * 0.82, # Mock reverse calc
-                     "tax_rate": 18.0,
-                     "tax_amount": float(data["total_amount"]) * 0.18
-                 }
-             ]
-        
-        return data
+        return self.extract_many([text])[0]
 
-    def _extract_field(self, text, pattern):
-        match = re.search(pattern, text, re.IGNORECASE)
-        return match.group(1) if match else None
+    def extract_many(self, texts: List[str], return_exceptions: bool = False) -> List[Union[LLMResult, Exception]]:
+        """Several invoices at once, packed into as few prompts as the provider allows.
+        A batch that fails is retried per invoice; with return_exceptions the
+        invoices that still fail get their exception instead of a result."""
+        return self.client.run(self.client.extract_many(texts, return_exceptions))
 
-    def _extract_amount(self, text):
-        # Look for "Total" followed by number
-        match = re.search(r"Total\s*[:\-]?\s*([\d,]+\.?\d{0,2})", text, re.IGNORECASE)
-        if match:
-             return match.group(1).replace(",", "")
-        return "0.00"
+    async def aextract_many(self, texts: List[str], return_exceptions: bool = False) -> List[Union[LLMResult, Exception]]:
+        return await asyncio.wrap_future(self.client.submit(self.client.extract_many(texts, return_exceptions)))
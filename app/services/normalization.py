@@ -0,0 +1,164 @@
+"""Typed, indexed copies of extracted_json for aggregate queries.
+
+extracted_json stays the source of truth. InvoiceHeader and InvoiceLineItem
+hold the fields dashboards filter and sum on, so "tax by HSN this quarter"
+or "all invoices from GSTIN X" is one indexed SQL query instead of loading
+and parsing every blob. Values that do not parse are stored as NULL rather
+than failing the extraction.
+"""
+import re
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from app.core.metrics import metrics
+from app.db.models import Invoice, InvoiceHeader, InvoiceLineItem
+from app.services.reporting import SummaryDelta, month_start
+
+DATE_SPLIT_RE = re.compile(r"[/\-.]")
+CENTS = Decimal("0.01")
+# Numeric(14, 2) and Numeric(5, 2)
+AMOUNT_LIMIT = Decimal(10) ** 12
+RATE_LIMIT = Decimal(1000)
+# InvoiceHeader columns the monthly summaries are computed from
+SUMMARY_HEADER_COLUMNS = ("user_id", "period", "taxable_value", "cgst_amount", "sgst_amount", "igst_amount", "total_amount")
+
+
+def parse_invoice_date(raw: Any) -> Optional[date]:
+    """ISO dates as written by LLM providers, otherwise the day-first
+    dd/mm/yy(yy) the parser finds on Indian invoices."""
+    if not isinstance(raw, str) or not raw.strip():
+        return None
+    raw = raw.strip()
+    try:
+        return date.fromisoformat(raw)
+    except ValueError:
+        pass
+    parts = DATE_SPLIT_RE.split(raw)
+    if len(parts) != 3 or not all(p.isdigit() for p in parts):
+        return None
+    day, month, year = (int(p) for p in parts)
+    if year < 100:
+        year += 2000
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _decimal(value: Any, limit: Decimal = AMOUNT_LIMIT) -> Optional[Decimal]:
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        result = Decimal(str(value).replace(",", "").strip())
+    except InvalidOperation:
+        return None
+    if not result.is_finite() or abs(result) >= limit:
+        return None
+    return result.quantize(CENTS)
+
+
+def _text(value: Any, length: int) -> Optional[str]:
+    if value is None:
+        return None
+    return str(value).strip()[:length] or None
+
+
+def normalize(
+    invoice_id: int, user_id: int, data: Optional[dict], uploaded_at: Optional[datetime] = None
+) -> Tuple[dict, List[dict]]:
+    """InvoiceHeader and InvoiceLineItem column values for one extraction.
+    Undated invoices are reported in the month they were uploaded."""
+    data = data or {}
+    invoice_date = parse_invoice_date(data.get("date"))
+    header = {
+        "invoice_id": invoice_id,
+        "user_id": user_id,
+        "invoice_number": _text(data.get("invoice_number"), 64),
+        "supplier_gstin": _text(data.get("gstin"), 15),
+        "invoice_date": invoice_date,
+        "period": month_start(invoice_date or uploaded_at),
+        "taxable_value": _decimal(data.get("taxable_value")),
+        "cgst_amount": _decimal(data.get("cgst_amount")),
+        "sgst_amount": _decimal(data.get("sgst_amount")),
+        "igst_amount": _decimal(data.get("igst_amount")),
+        "total_amount": _decimal(data.get("total_amount")),
+    }
+    if header["supplier_gstin"]:
+        header["supplier_gstin"] = header["supplier_gstin"].upper()
+
+    items = data.get("line_items")
+    lines = []
+    for line_no, item in enumerate(items if isinstance(items, list) else [], start=1):
+        if not isinstance(item, dict):
+            continue
+        lines.append({
+            "invoice_id": invoice_id,
+            "line_no": line_no,
+            "user_id": user_id,
+            "invoice_date": invoice_date,
+            "hsn_code": _text(item.get("hsn_code"), 8),
+            "description": _text(item.get("description"), 255),
+            "taxable_value": _decimal(item.get("taxable_value")),
+            "tax_rate": _decimal(item.get("tax_rate"), RATE_LIMIT),
+            "tax_amount": _decimal(item.get("tax_amount")),
+            "cgst_amount": _decimal(item.get("cgst_amount")),
+            "sgst_amount": _decimal(item.get("sgst_amount")),
+        })
+    return header, lines
+
+
+class NormalizationService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def stage(self, extracted: Dict[int, Optional[dict]]) -> int:
+        """Replace the normalized rows of {invoice_id: extracted_json} in the
+        current transaction without committing, and move the monthly
+        summaries from the old rows to the new ones. Returns the number of
+        line items written."""
+        if not extracted:
+            return 0
+        invoice_ids = list(extracted)
+        invoices = {
+            row.id: row for row in self.db.execute(
+                select(Invoice.id, Invoice.user_id, Invoice.uploaded_at).where(Invoice.id.in_(invoice_ids))
+            )
+        }
+
+        # Re-extraction replaces the previous rows wholesale; take them out
+        # of the summaries first
+        delta = SummaryDelta()
+        old_lines = defaultdict(list)
+        for line in self.db.execute(
+            select(InvoiceLineItem.invoice_id, InvoiceLineItem.tax_rate, InvoiceLineItem.taxable_value, InvoiceLineItem.tax_amount)
+            .where(InvoiceLineItem.invoice_id.in_(invoice_ids))
+        ).mappings():
+            old_lines[line["invoice_id"]].append(line)
+        for header in self.db.execute(
+            select(InvoiceHeader.invoice_id, *(getattr(InvoiceHeader, column) for column in SUMMARY_HEADER_COLUMNS))
+            .where(InvoiceHeader.invoice_id.in_(invoice_ids))
+        ).mappings():
+            delta.add_invoice(header, old_lines[header["invoice_id"]], sign=-1)
+
+        headers, lines = [], []
+        for invoice_id, data in extracted.items():
+            invoice = invoices[invoice_id]
+            header, items = normalize(invoice_id, invoice.user_id, data, invoice.uploaded_at)
+            delta.add_invoice(header, items)
+            headers.append(header)
+            lines.extend(items)
+
+        self.db.execute(delete(InvoiceLineItem).where(InvoiceLineItem.invoice_id.in_(invoice_ids)))
+        self.db.execute(delete(InvoiceHeader).where(InvoiceHeader.invoice_id.in_(invoice_ids)))
+        self.db.execute(insert(InvoiceHeader), headers)
+        if lines:
+            self.db.execute(insert(InvoiceLineItem), lines)
+        delta.apply(self.db)
+        metrics.inc("normalized_invoices", len(headers))
+        metrics.inc("normalized_line_items", len(lines))
+        return len(lines)
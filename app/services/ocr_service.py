@@ -1,16 +1,180 @@
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
 import pdfplumber
+import pypdfium2 as pdfium
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# PDFium is not thread-safe, and documents are opened from the request and
+# worker threads as well as in the pool processes: every call into it holds
+# this lock. pdfplumber's layout analysis is pure Python and runs outside it.
+_pdfium_lock = threading.Lock()
+
+
+@dataclass
+class PageText:
+    page_number: int  # 1-based
+    text: str
+    method: str  # "text_layer" or "layout"
+    elapsed_ms: float
+    # CPU of the thread that extracted the page, in whichever process that was
+    cpu_ms: float = 0.0
+
+
+@dataclass
+class OCRResult:
+    pages: List[PageText] = field(default_factory=list)
+    elapsed_ms: float = 0.0
+
+    @property
+    def text(self) -> str:
+        return "\n".join(page.text for page in self.pages if page.text)
+
+    @property
+    def cpu_ms(self) -> float:
+        return sum(page.cpu_ms for page in self.pages)
+
+
+def extract_page_range(pdf_path: str, start: int, end: int, fast_text_layer: bool, min_chars: int) -> List[PageText]:
+    """Extract pages [start, end) of one PDF. Runs in a pool process."""
+    pages = []
+    with _pdfium_lock:
+        doc = pdfium.PdfDocument(pdf_path)
+    plumber = None
+    try:
+        for index in range(start, end):
+            page_start = time.perf_counter()
+            cpu_start = time.thread_time()
+            text, method = "", "layout"
+            if fast_text_layer:
+                # Reading the embedded text layer is C code and needs no
+                # layout analysis; scanned or odd pages fall through.
+                with _pdfium_lock:
+                    page = doc[index]
+                    textpage = page.get_textpage()
+                    try:
+                        text = textpage.get_text_range().replace("\r\n", "\n")
+                    finally:
+                        textpage.close()
+                        page.close()
+                if len(text.strip()) >= min_chars:
+                    method = "text_layer"
+            if method == "layout":
+                if plumber is None:
+                    plumber = pdfplumber.open(pdf_path)
+                text = plumber.pages[index].extract_text() or ""
+            pages.append(PageText(
+                index + 1, text, method, (time.perf_counter() - page_start) * 1000, (time.thread_time() - cpu_start) * 1000
+            ))
+    finally:
+        if plumber is not None:
+            plumber.close()
+        with _pdfium_lock:
+            doc.close()
+    return pages
+
 
 class OCRService:
+    VERSION = f"pdfplumber-{pdfplumber.__version__}+pdfium-text-1"
+
+    _pool: Optional[ProcessPoolExecutor] = None
+    _pool_lock = threading.Lock()
+
     @staticmethod
     def extract_text_from_pdf(pdf_path: str) -> str:
-        text_content = []
+        return OCRService.read_pdf(pdf_path).text
+
+    @staticmethod
+    def read_pdf(pdf_path: str) -> OCRResult:
+        """extract_pdf, with an empty result for files that cannot be read."""
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                for page in pdf.pages:
-                    text = page.extract_text()
-                    if text:
-                        text_content.append(text)
-            return "\n".join(text_content)
+            return OCRService.extract_pdf(pdf_path)
         except Exception as e:
             print(f"Error reading PDF: {e}")
-            return ""
+            return OCRResult()
+
+    @staticmethod
+    def extract_pdf(pdf_path: str) -> OCRResult:
+        """Extract every page of a PDF, fanning large documents out to the
+        shared process pool in page ranges and reassembling them in order."""
+        started = time.perf_counter()
+        with _pdfium_lock:
+            doc = pdfium.PdfDocument(pdf_path)
+            try:
+                page_count = len(doc)
+            finally:
+                doc.close()
+
+        args = (settings.OCR_FAST_TEXT_LAYER, settings.OCR_MIN_TEXT_LAYER_CHARS)
+        if page_count < settings.OCR_PARALLEL_MIN_PAGES or settings.OCR_PROCESS_WORKERS <= 1:
+            pages = extract_page_range(pdf_path, 0, page_count, *args)
+        else:
+            pages = OCRService._extract_parallel(pdf_path, page_count, args)
+
+        result = OCRResult(pages=pages, elapsed_ms=(time.perf_counter() - started) * 1000)
+        OCRService._report(pdf_path, result)
+        return result
+
+    @classmethod
+    def _extract_parallel(cls, pdf_path: str, page_count: int, args: tuple) -> List[PageText]:
+        pool = cls._get_pool()
+        step = settings.OCR_PAGES_PER_TASK
+        ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+        done: Dict[int, List[PageText]] = {}
+        in_flight: Dict[Future, int] = {}
+
+        # At most OCR_MAX_TASKS_PER_JOB ranges of this PDF are queued at once,
+        # so one huge document cannot monopolise the shared pool.
+        while ranges or in_flight:
+            while ranges and len(in_flight) < settings.OCR_MAX_TASKS_PER_JOB:
+                start, end = ranges.pop(0)
+                in_flight[pool.submit(extract_page_range, pdf_path, start, end, *args)] = start
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                done[in_flight.pop(future)] = future.result()
+
+        return [page for start in sorted(done) for page in done[start]]
+
+    @classmethod
+    def _get_pool(cls) -> ProcessPoolExecutor:
+        with cls._pool_lock:
+            if cls._pool is None:
+                # Spawned, not forked: a fork copies _pdfium_lock (and any
+                # other lock) in whatever state another thread left it, and a
+                # child started while it was held would block on it forever
+                cls._pool = ProcessPoolExecutor(
+                    max_workers=settings.OCR_PROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn")
+                )
+            return cls._pool
+
+    @classmethod
+    def shutdown_pool(cls) -> None:
+        with cls._pool_lock:
+            if cls._pool is not None:
+                cls._pool.shutdown(wait=True)
+                cls._pool = None
+
+    @staticmethod
+    def _report(pdf_path: str, result: OCRResult) -> None:
+        text_layer = sum(1 for page in result.pages if page.method == "text_layer")
+        metrics.inc("ocr_documents")
+        metrics.inc("ocr_pages", len(result.pages))
+        metrics.inc("ocr_pages_text_layer", text_layer)
+        metrics.inc("ocr_page_ms", sum(page.elapsed_ms for page in result.pages))
+        slowest = max(result.pages, key=lambda page: page.elapsed_ms, default=None)
+        logger.info(
+            "OCR %s: %d pages in %.1f ms (%d from text layer)%s",
+            pdf_path, len(result.pages), result.elapsed_ms, text_layer,
+            f", slowest page {slowest.page_number} {slowest.elapsed_ms:.1f} ms" if slowest else "",
+        )
+        for page in result.pages:
+            logger.debug("OCR %s page %d: %s %.1f ms", pdf_path, page.page_number, page.method, page.elapsed_ms)
@@ -0,0 +1,219 @@
+"""Incrementally maintained monthly summaries behind /reports.
+
+Writers describe what changed as a SummaryDelta (an invoice's normalized
+rows added or removed, runs completed) and apply it in their own
+transaction: each touched summary row gets one additive upsert, so the
+cost of keeping the summaries current does not grow with history and
+reading a report never scans invoices, runs or violations.
+`python -m app.commands.rebuild_reports` recomputes the same rows from
+scratch through the same SummaryDelta.
+"""
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import groupby
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple, Type
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from app.core.metrics import metrics
+from app.db.models import (
+    Base,
+    InvoiceHeader,
+    InvoiceLineItem,
+    MonthlySummary,
+    MonthlyTaxSlabSummary,
+    MonthlyViolationSummary,
+    Run,
+    RunStatus,
+    Violation,
+)
+
+UNKNOWN_SEVERITY = "unknown"
+
+# Summary model -> (key columns, counter columns)
+SUMMARY_TABLES: Dict[Type[Base], Tuple[Tuple[str, ...], Tuple[str, ...]]] = {
+    MonthlySummary: (
+        ("user_id", "period"),
+        ("invoice_count", "taxable_value", "cgst_amount", "sgst_amount", "igst_amount", "total_amount",
+         "runs_completed", "violation_count"),
+    ),
+    MonthlyTaxSlabSummary: (
+        ("user_id", "period", "tax_rate"),
+        ("line_count", "taxable_value", "tax_amount"),
+    ),
+    MonthlyViolationSummary: (
+        ("user_id", "period", "rule_id", "severity"),
+        ("violation_count",),
+    ),
+}
+
+
+def month_start(value: Optional[Any]) -> date:
+    """First day of the month of a date or datetime (now when None)."""
+    value = value or datetime.utcnow()
+    return date(value.year, value.month, 1)
+
+
+def _amount(value: Any) -> Decimal:
+    return Decimal(str(value)) if value is not None else Decimal(0)
+
+
+def _upsert_insert(db: Session, model: Type[Base]):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise NotImplementedError(f"Summary upserts are not implemented for {dialect}")
+    return dialect_insert(model)
+
+
+class SummaryDelta:
+    """Pending additions to the summary tables, summed per summary row."""
+
+    def __init__(self):
+        self._rows: Dict[Type[Base], Dict[tuple, Dict[str, Any]]] = {
+            model: defaultdict(lambda counters=counters: dict.fromkeys(counters, 0))
+            for model, (_, counters) in SUMMARY_TABLES.items()
+        }
+
+    def _add(self, model: Type[Base], key: tuple, **counters: Any) -> None:
+        row = self._rows[model][key]
+        for column, value in counters.items():
+            row[column] += value
+
+    def add_invoice(self, header: Mapping[str, Any], lines: Iterable[Mapping[str, Any]], sign: int = 1) -> None:
+        """Count (sign=1) or uncount (sign=-1) one InvoiceHeader and its
+        InvoiceLineItem rows, given as column mappings."""
+        user_id, period = header["user_id"], header["period"]
+        self._add(
+            MonthlySummary, (user_id, period),
+            invoice_count=sign,
+            **{column: sign * _amount(header[column])
+               for column in ("taxable_value", "cgst_amount", "sgst_amount", "igst_amount", "total_amount")},
+        )
+        for line in lines:
+            self.add_line(user_id, period, line, sign)
+
+    def add_line(self, user_id: int, period: date, line: Mapping[str, Any], sign: int = 1) -> None:
+        # Lines without a rate have no slab to count under
+        if line["tax_rate"] is None:
+            return
+        self._add(
+            MonthlyTaxSlabSummary, (user_id, period, _amount(line["tax_rate"])),
+            line_count=sign,
+            taxable_value=sign * _amount(line["taxable_value"]),
+            tax_amount=sign * _amount(line["tax_amount"]),
+        )
+
+    def add_run(self, user_id: int, end_ts: Optional[datetime], violations: Iterable[Mapping[str, Any]]) -> None:
+        """Count one completed run and the violations it found."""
+        period = month_start(end_ts)
+        count = 0
+        for violation in violations:
+            self._add(
+                MonthlyViolationSummary,
+                (user_id, period, violation["rule_id"], violation["severity"] or UNKNOWN_SEVERITY),
+                violation_count=1,
+            )
+            count += 1
+        self._add(MonthlySummary, (user_id, period), runs_completed=1, violation_count=count)
+
+    def rows(self, model: Type[Base]) -> List[Dict[str, Any]]:
+        """Column values per summary row, skipping rows the delta leaves unchanged."""
+        keys, _ = SUMMARY_TABLES[model]
+        return [
+            dict(zip(keys, key), **counters)
+            for key, counters in self._rows[model].items()
+            if any(counters.values())
+        ]
+
+    def apply(self, db: Session) -> int:
+        """Add the delta to the stored summaries in the current transaction,
+        one executemany upsert per table. Returns the summary rows touched."""
+        touched = 0
+        for model, (keys, counters) in SUMMARY_TABLES.items():
+            rows = self.rows(model)
+            if not rows:
+                continue
+            # Keys are unique within `rows`, so no statement updates a row twice
+            stmt = _upsert_insert(db, model)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(keys),
+                set_={column: getattr(model, column) + getattr(stmt.excluded, column) for column in counters},
+            )
+            db.execute(stmt, rows)
+            touched += len(rows)
+        metrics.inc("report_summary_upserts", touched)
+        return touched
+
+    def replace(self, db: Session) -> int:
+        """Replace all stored summaries with this delta (used by rebuilds)."""
+        written = 0
+        for model in SUMMARY_TABLES:
+            db.query(model).delete(synchronize_session=False)
+            rows = self.rows(model)
+            if rows:
+                db.execute(insert(model), rows)
+            written += len(rows)
+        return written
+
+
+def compute_summaries(db: Session, chunk_size: int = 1000) -> SummaryDelta:
+    """All summary rows recomputed from the normalized tables, runs and
+    violations, streamed in chunks rather than loaded at once."""
+    delta = SummaryDelta()
+    headers = select(
+        InvoiceHeader.user_id, InvoiceHeader.period, InvoiceHeader.taxable_value, InvoiceHeader.cgst_amount,
+        InvoiceHeader.sgst_amount, InvoiceHeader.igst_amount, InvoiceHeader.total_amount,
+    )
+    for header in db.execute(headers.execution_options(yield_per=chunk_size)).mappings():
+        delta.add_invoice(header, ())
+
+    lines = (
+        select(InvoiceHeader.user_id, InvoiceHeader.period, InvoiceLineItem.tax_rate,
+               InvoiceLineItem.taxable_value, InvoiceLineItem.tax_amount)
+        .join(InvoiceHeader, InvoiceHeader.invoice_id == InvoiceLineItem.invoice_id)
+    )
+    for line in db.execute(lines.execution_options(yield_per=chunk_size)).mappings():
+        delta.add_line(line["user_id"], line["period"], line)
+
+    runs = (
+        select(Run.run_id, Run.user_id, Run.end_ts, Violation.rule_id, Violation.severity)
+        .outerjoin(Violation, Violation.run_id == Run.run_id)
+        .where(Run.status == RunStatus.COMPLETED)
+        .order_by(Run.run_id)
+    )
+    rows = db.execute(runs.execution_options(yield_per=chunk_size)).mappings()
+    for _, group in groupby(rows, key=lambda row: row["run_id"]):
+        group = list(group)
+        violations = [row for row in group if row["rule_id"] is not None]
+        delta.add_run(group[0]["user_id"], group[0]["end_ts"], violations)
+    return delta
+
+
+def _comparable(value: Any) -> Any:
+    return _amount(value).quantize(Decimal("0.01")) if isinstance(value, (Decimal, float)) else value
+
+
+def diff_summaries(db: Session, expected: SummaryDelta) -> List[str]:
+    """Stored summary rows that differ from `expected`, one line each.
+    Rows whose counters are all zero count as absent."""
+    problems = []
+    for model, (keys, counters) in SUMMARY_TABLES.items():
+        want = {
+            tuple(_comparable(row[k]) for k in keys): {c: _comparable(row[c]) for c in counters}
+            for row in expected.rows(model)
+        }
+        have = {}
+        for row in db.execute(select(model)).scalars():
+            values = {c: _comparable(getattr(row, c)) for c in counters}
+            if any(values.values()):
+                have[tuple(_comparable(getattr(row, k)) for k in keys)] = values
+        for key in sorted(set(want) | set(have), key=str):
+            if want.get(key) != have.get(key):
+                problems.append(f"{model.__tablename__} {key}: stored {have.get(key)}, expected {want.get(key)}")
+    return problems
@@ -0,0 +1,338 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import Rule
+from app.services.tax_reconciliation import (
+    LineItemFrame,
+    invoice_total_findings,
+    invoice_total_findings_scalar,
+    line_tax_findings,
+    line_tax_findings_scalar,
+    tax_split_findings,
+    tax_split_findings_scalar,
+)
+from app.utils.validators import GSTValidator
+
+logger = logging.getLogger(__name__)
+
+# Built-in rules. They are seeded into the `rules` table the first time the
+# registry loads, after which the table is the source of truth.
+DEFAULT_RULES: List[Dict[str, Any]] = [
+    {
+        "rule_id": "RULE_001",
+        "title": "GSTIN Missing",
+        "severity": "high",
+        "check_type": "presence",
+        "meta": {"field": "gstin", "expected": "Present", "suggestion": "Ensure GSTIN is clearly visible"},
+    },
+    {
+        "rule_id": "RULE_002",
+        "title": "Invalid GSTIN Format",
+        "severity": "high",
+        "check_type": "regex",
+        "meta": {"field": "gstin", "pattern": GSTValidator.GST_REGEX, "expected": "Valid Regex", "suggestion": "Check for typos in GSTIN"},
+    },
+    {
+        "rule_id": "RULE_003",
+        "title": "HSN Code Missing",
+        "severity": "medium",
+        "check_type": "presence",
+        "meta": {"field": "hsn_code", "scope": "line_items", "detected": "Missing", "expected": "Present", "suggestion": "Add HSN codes for all items"},
+    },
+    {
+        "rule_id": "RULE_004",
+        "title": "Tax Mismatch",
+        "severity": "high",
+        "check_type": "calculation",
+        "meta": {"formula": "line_tax", "tolerance": 1.0, "suggestion": "Recalculate tax amount"},
+    },
+    {
+        "rule_id": "RULE_005",
+        "title": "GST Split Mismatch",
+        "severity": "high",
+        "check_type": "calculation",
+        "meta": {"formula": "tax_split", "tolerance": 1.0, "suggestion": "Check the CGST/SGST/IGST split against the tax amount"},
+    },
+    {
+        "rule_id": "RULE_006",
+        "title": "Invoice Total Mismatch",
+        "severity": "medium",
+        "check_type": "calculation",
+        "meta": {"formula": "invoice_total", "tolerance": 1.0, "suggestion": "Reconcile line totals with the invoice total"},
+    },
+]
+
+DEFAULT_RULES_BY_ID = {rule["rule_id"]: rule for rule in DEFAULT_RULES}
+
+# (detected_value, expected_value)
+Finding = Tuple[Optional[str], Optional[str]]
+
+
+class EvaluationContext:
+    """Invoices evaluated together, plus the line-item columns built for them
+    on first use so every calculation rule shares a single conversion.
+    Contexts with fewer than COMPLIANCE_COLUMNAR_MIN_ITEMS line items are
+    evaluated item by item and never build the columns."""
+
+    def __init__(self, invoices: Sequence[dict]):
+        self.invoices = invoices
+        self._frame: Optional[LineItemFrame] = None
+        item_count = sum(len(data.get("line_items") or []) for data in invoices)
+        self.columnar = item_count >= settings.COMPLIANCE_COLUMNAR_MIN_ITEMS
+
+    @property
+    def line_items(self) -> LineItemFrame:
+        if self._frame is None:
+            self._frame = LineItemFrame(self.invoices)
+        return self._frame
+
+
+# Returns one list of findings per invoice in the context
+Checker = Callable[[EvaluationContext], List[List[Finding]]]
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    rule_id: str
+    title: str
+    severity: str
+    check_type: str
+    suggestion: Optional[str]
+    check: Checker
+
+
+class RuleCompileError(ValueError):
+    pass
+
+
+def _per_invoice(check: Callable[[dict], List[Finding]]) -> Checker:
+    return lambda ctx: [check(data) for data in ctx.invoices]
+
+
+def _compile_presence(meta: dict) -> Checker:
+    field = meta["field"]
+    detected = meta.get("detected")
+    expected = meta.get("expected", "Present")
+
+    if meta.get("scope") == "line_items":
+        def check(data: dict) -> List[Finding]:
+            items = data.get("line_items") or []
+            if any(not item.get(field) for item in items):
+                return [(detected, expected)]
+            return []
+    else:
+        def check(data: dict) -> List[Finding]:
+            if not data.get(field):
+                return [(detected, expected)]
+            return []
+    return _per_invoice(check)
+
+
+def _compile_regex(meta: dict) -> Checker:
+    field = meta["field"]
+    try:
+        pattern = re.compile(meta["pattern"], re.IGNORECASE if meta.get("ignore_case") else 0)
+    except re.error as e:
+        raise RuleCompileError(f"Invalid pattern: {e}")
+    expected = meta.get("expected", "Valid Regex")
+    # A missing value is the presence rule's job, so regex rules skip it by default.
+    skip_missing = meta.get("skip_if_missing", True)
+
+    def check(data: dict) -> List[Finding]:
+        value = data.get(field)
+        if not value:
+            return [] if skip_missing else [(None, expected)]
+        if not pattern.match(str(value)):
+            return [(str(value), expected)]
+        return []
+    return _per_invoice(check)
+
+
+def _reconciliation(
+    columnar: Callable[[LineItemFrame, float], List[List[Finding]]],
+    scalar: Callable[[Sequence[dict], float], List[List[Finding]]],
+) -> Callable[[dict], Checker]:
+    def factory(meta: dict) -> Checker:
+        tolerance = float(meta.get("tolerance", 1.0))
+
+        def check(ctx: EvaluationContext) -> List[List[Finding]]:
+            if ctx.columnar:
+                return columnar(ctx.line_items, tolerance)
+            return scalar(ctx.invoices, tolerance)
+        return check
+    return factory
+
+
+CALCULATIONS: Dict[str, Callable[[dict], Checker]] = {
+    "line_tax": _reconciliation(line_tax_findings, line_tax_findings_scalar),
+    "tax_split": _reconciliation(tax_split_findings, tax_split_findings_scalar),
+    "invoice_total": _reconciliation(invoice_total_findings, invoice_total_findings_scalar),
+}
+
+
+def _compile_calculation(meta: dict) -> Checker:
+    formula = meta.get("formula")
+    if formula not in CALCULATIONS:
+        raise RuleCompileError(f"Unknown formula: {formula}")
+    return CALCULATIONS[formula](meta)
+
+
+COMPILERS: Dict[str, Callable[[dict], Checker]] = {
+    "presence": _compile_presence,
+    "regex": _compile_regex,
+    "calculation": _compile_calculation,
+}
+
+
+def compile_rule(rule_id: str, title: str, severity: str, check_type: str, meta: Optional[dict]) -> CompiledRule:
+    # Rows written by the old engine carry check_type="standard" and no meta;
+    # those fall back to the built-in definition of the same rule.
+    if (check_type not in COMPILERS or not meta) and rule_id in DEFAULT_RULES_BY_ID:
+        check_type = DEFAULT_RULES_BY_ID[rule_id]["check_type"]
+        meta = DEFAULT_RULES_BY_ID[rule_id]["meta"]
+    if check_type not in COMPILERS:
+        raise RuleCompileError(f"Unknown check_type: {check_type}")
+    try:
+        check = COMPILERS[check_type](meta or {})
+    except KeyError as e:
+        raise RuleCompileError(f"Missing meta key: {e}")
+    return CompiledRule(
+        rule_id=rule_id,
+        title=title,
+        severity=severity or "medium",
+        check_type=check_type,
+        suggestion=(meta or {}).get("suggestion"),
+        check=check,
+    )
+
+
+class RuleSet:
+    def __init__(self, version: str, rules: List[CompiledRule]):
+        self.version = version
+        self.rules = tuple(rules)
+
+    def evaluate(self, data: dict) -> List[dict]:
+        """Run every compiled rule against one extracted invoice.
+
+        Returns plain dicts with the `Violation` column values (minus run_id),
+        so callers can build ORM objects or bulk-insert rows as they see fit.
+        """
+        return self.evaluate_many([data])[0]
+
+    def evaluate_many(self, invoices: Sequence[dict]) -> List[List[dict]]:
+        ctx = EvaluationContext(invoices)
+        violations: List[List[dict]] = [[] for _ in invoices]
+        for rule in self.rules:
+            for idx, findings in enumerate(rule.check(ctx)):
+                for detected, expected in findings:
+                    violations[idx].append({
+                        "rule_id": rule.rule_id,
+                        "detected_value": detected,
+                        "expected_value": expected,
+                        "suggestion": rule.suggestion,
+                        "severity": rule.severity,
+                    })
+        return violations
+
+
+def _fingerprint(rows: List[dict]) -> str:
+    blob = json.dumps(sorted(rows, key=lambda r: r["rule_id"]), sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode()).hexdigest()[:12]
+
+
+class RuleRegistry:
+    """Process-wide cache of the compiled rule set.
+
+    Rules are re-read at most once per `ttl_seconds` and only recompiled when
+    their fingerprint changes. Call `invalidate()` after editing rules to pick
+    the change up immediately in this process.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._ruleset: Optional[RuleSet] = None
+        self._checked_at = 0.0
+
+    def get(self, db: Session) -> RuleSet:
+        ruleset = self._ruleset
+        if ruleset is not None and time.monotonic() - self._checked_at < self.ttl_seconds:
+            return ruleset
+        with self._lock:
+            if self._ruleset is None or time.monotonic() - self._checked_at >= self.ttl_seconds:
+                self._ruleset = self._load(db)
+                self._checked_at = time.monotonic()
+            return self._ruleset
+
+    def invalidate(self) -> None:
+        self._checked_at = 0.0
+
+    def _load(self, db: Session) -> RuleSet:
+        rows = [
+            {
+                "rule_id": r.rule_id,
+                "title": r.title,
+                "severity": r.severity,
+                "check_type": r.check_type,
+                "meta": r.meta,
+            }
+            for r in db.query(Rule).all()
+        ]
+        if not rows:
+            rows = self._seed(db)
+
+        version = _fingerprint(rows)
+        if self._ruleset is not None and self._ruleset.version == version:
+            return self._ruleset
+
+        compiled = []
+        for row in rows:
+            try:
+                compiled.append(compile_rule(**row))
+            except RuleCompileError as e:
+                logger.warning("Skipping rule %s: %s", row["rule_id"], e)
+        logger.info("Compiled rule set %s (%d rules)", version, len(compiled))
+        return RuleSet(version, compiled)
+
+    @staticmethod
+    def _seed(db: Session) -> List[dict]:
+        """Default rules for an empty rules table (normally seeded at
+        startup by seed_default_rules). They are added under a savepoint so
+        the caller's transaction is neither committed nor rolled back here;
+        they persist when the caller commits."""
+        try:
+            with db.begin_nested():
+                db.add_all([Rule(**rule) for rule in DEFAULT_RULES])
+        except IntegrityError:
+            # Another process seeded them first; theirs are identical.
+            pass
+        return [dict(rule) for rule in DEFAULT_RULES]
+
+
+def seed_default_rules(db: Session) -> bool:
+    """Insert the default rules into an empty rules table and commit. Only
+    an empty table is seeded, so rules an admin deleted stay deleted.
+    Meant for a dedicated session at startup."""
+    if db.query(Rule.rule_id).first() is not None:
+        return False
+    db.add_all([Rule(**rule) for rule in DEFAULT_RULES])
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another process seeded them first; theirs are identical.
+        db.rollback()
+        return False
+    return True
+
+
+rule_registry = RuleRegistry(settings.RULES_CACHE_TTL_SECONDS)
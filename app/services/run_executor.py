@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import InvoiceData, Run, RunStatus
+from app.services.compliance_engine import ComplianceEngine
+
+logger = logging.getLogger(__name__)
+
+# (event name, payload)
+RunEvent = Tuple[str, dict]
+
+
+class RunChannel:
+    """Events of one compliance run, replayable by any number of subscribers.
+
+    Published from the executor thread; subscribers on the event loop are
+    woken with call_soon_threadsafe so nothing polls.
+    """
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.events: List[RunEvent] = []
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+
+    def publish(self, name: str, payload: dict, final: bool = False) -> None:
+        with self._lock:
+            self.events.append((name, payload))
+            if final:
+                self.finished_at = time.monotonic()
+            waiters = list(self._waiters)
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def finish(self, status: str) -> None:
+        self.publish("status", {"run_id": self.run_id, "status": status}, final=True)
+
+    async def subscribe(self) -> AsyncIterator[RunEvent]:
+        loop = asyncio.get_running_loop()
+        waiter = (loop, asyncio.Event())
+        with self._lock:
+            self._waiters.append(waiter)
+        try:
+            sent = 0
+            while True:
+                waiter[1].clear()
+                with self._lock:
+                    pending = self.events[sent:]
+                    finished = self.finished_at is not None
+                for event in pending:
+                    yield event
+                sent += len(pending)
+                if finished:
+                    return
+                await waiter[1].wait()
+        finally:
+            with self._lock:
+                self._waiters.remove(waiter)
+
+
+class RunExecutor:
+    """Runs compliance checks off the request path.
+
+    The endpoint commits the Run in RUNNING and returns; a pool thread opens
+    its own session on the same engine, evaluates the invoice, and publishes
+    the violations to the run's channel once they are committed.
+    """
+
+    def __init__(self, max_workers: int, retention_seconds: float):
+        self.retention_seconds = retention_seconds
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="compliance-run")
+        self._channels: Dict[str, RunChannel] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, bind: Engine, run_id: str) -> RunChannel:
+        channel = RunChannel(run_id)
+        with self._lock:
+            self._prune()
+            self._channels[run_id] = channel
+        channel.publish("status", {"run_id": run_id, "status": RunStatus.RUNNING.value})
+        self._pool.submit(self._execute, bind, run_id, channel)
+        return channel
+
+    def channel(self, run_id: str) -> Optional[RunChannel]:
+        with self._lock:
+            return self._channels.get(run_id)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
+
+    def _prune(self) -> None:
+        cutoff = time.monotonic() - self.retention_seconds
+        for run_id in [r for r, c in self._channels.items() if c.finished_at is not None and c.finished_at < cutoff]:
+            del self._channels[run_id]
+
+    def _execute(self, bind: Engine, run_id: str, channel: RunChannel) -> None:
+        db = Session(bind=bind, autoflush=False)
+        status = RunStatus.FAILED
+        try:
+            run = db.get(Run, run_id)
+            data = db.query(InvoiceData.extracted_json).filter(InvoiceData.invoice_id == run.invoice_id).scalar()
+            violations: List[dict] = []
+            ComplianceEngine(db).run_compliance_checks(run, data, on_violation=violations.append)
+            status = RunStatus.COMPLETED
+            # Only once committed: a run that fails later publishes none
+            for violation in violations:
+                channel.publish("violation", _violation_payload(violation))
+        except Exception:
+            logger.exception("Compliance run %s failed", run_id)
+            db.rollback()
+            db.query(Run).filter(Run.run_id == run_id).update(
+                {Run.status: RunStatus.FAILED, Run.end_ts: datetime.utcnow()}
+            )
+            db.commit()
+        finally:
+            db.close()
+            channel.finish(status.value)
+
+
+def _violation_payload(violation: dict) -> dict:
+    return {
+        "rule_id": violation["rule_id"],
+        "severity": violation["severity"],
+        "detected_value": violation["detected_value"],
+        "expected_value": violation["expected_value"],
+        "suggestion": violation["suggestion"],
+    }
+
+
+run_executor = RunExecutor(settings.COMPLIANCE_RUN_WORKERS, settings.COMPLIANCE_RUN_EVENT_RETENTION_SECONDS)
@@ -0,0 +1,348 @@
+from decimal import Decimal, InvalidOperation
+from functools import cached_property
+from operator import itemgetter
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# (detected_value, expected_value), same shape as rule_engine findings
+Finding = Tuple[Optional[str], Optional[str]]
+
+SPLIT_FIELDS = ("cgst_amount", "sgst_amount", "igst_amount")
+
+
+def _to_float(value: Any) -> float:
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return np.nan
+
+
+def _to_decimal(value: Any) -> Optional[Decimal]:
+    if value is None:
+        return None
+    try:
+        # str() first so 0.1 becomes Decimal("0.1"), not its binary expansion
+        result = Decimal(str(value).replace(",", "").strip())
+    except InvalidOperation:
+        return None
+    return result if result.is_finite() else None
+
+
+def _column(items: Sequence[dict], field: str, default: Any) -> np.ndarray:
+    n = len(items)
+    try:
+        # map(itemgetter) stays in C for the common case of complete items
+        return np.fromiter(map(itemgetter(field), items), dtype=np.float64, count=n)
+    except KeyError:
+        if default is None and not any(field in item for item in items):
+            return np.full(n, np.nan)
+    except (ValueError, TypeError):
+        pass
+    try:
+        return np.fromiter((item.get(field, default) for item in items), dtype=np.float64, count=n)
+    except (ValueError, TypeError):
+        # At least one value is not numeric; parse element-wise and leave NaN
+        # for the Decimal fallback to deal with.
+        return np.array([_to_float(item.get(field, default)) for item in items], dtype=np.float64)
+
+
+class LineItemFrame:
+    """Columnar view of the line items of one or more extracted invoices.
+
+    Rows of invoice `i` are `offsets[i]:offsets[i + 1]`. Values that are
+    missing or not plain numbers are NaN.
+    """
+
+    def __init__(self, invoices: Sequence[dict]):
+        counts = []
+        items: List[dict] = []
+        for data in invoices:
+            invoice_items = data.get("line_items") or []
+            counts.append(len(invoice_items))
+            items.extend(invoice_items)
+
+        self.invoices = invoices
+        self.items = items
+        self.n_invoices = len(invoices)
+        self.offsets = np.zeros(self.n_invoices + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.offsets[1:])
+        self.invoice_idx = np.repeat(np.arange(self.n_invoices), counts)
+
+    # Columns are converted on first use, so a rule set that never looks at
+    # the GST split does not pay for it.
+    @cached_property
+    def taxable(self) -> np.ndarray:
+        return _column(self.items, "taxable_value", 0)
+
+    @cached_property
+    def rate(self) -> np.ndarray:
+        return _column(self.items, "tax_rate", 0)
+
+    @cached_property
+    def tax(self) -> np.ndarray:
+        return _column(self.items, "tax_amount", 0)
+
+    @cached_property
+    def cgst(self) -> np.ndarray:
+        return _column(self.items, "cgst_amount", None)
+
+    @cached_property
+    def sgst(self) -> np.ndarray:
+        return _column(self.items, "sgst_amount", None)
+
+    @cached_property
+    def igst(self) -> np.ndarray:
+        return _column(self.items, "igst_amount", None)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def empty_findings(self) -> List[List[Finding]]:
+        return [[] for _ in range(self.n_invoices)]
+
+
+def _split_problem(cgst: Decimal, sgst: Decimal, igst: Decimal, tax: Optional[Decimal], tolerance: Decimal) -> Optional[str]:
+    if igst > 0 and (cgst > 0 or sgst > 0):
+        return "Either IGST or CGST + SGST"
+    if abs(cgst - sgst) > tolerance:
+        return "CGST equal to SGST"
+    if tax is not None and abs(cgst + sgst + igst - tax) > tolerance:
+        return f"CGST + SGST + IGST = {float(tax)}"
+    return None
+
+
+def _split_detected(cgst, sgst, igst) -> str:
+    return f"CGST {float(cgst)} / SGST {float(sgst)} / IGST {float(igst)}"
+
+
+def line_tax_findings(frame: LineItemFrame, tolerance: float) -> List[List[Finding]]:
+    """Flag items whose tax_amount is not taxable_value * tax_rate%."""
+    findings = frame.empty_findings()
+    if not len(frame):
+        return findings
+
+    taxable, rate, tax = frame.taxable, frame.rate, frame.tax
+    expected = taxable * (rate / 100)
+    diff = np.abs(expected - tax)
+    # Float error is far below this margin, so rows outside it are decided by
+    # the vectorized compare; NaN and near-boundary rows go to Decimal.
+    margin = 1e-9 * np.maximum(1.0, np.abs(expected) + np.abs(tax))
+    with np.errstate(invalid="ignore"):
+        clear_fail = diff > tolerance + margin
+        undecided = ~clear_fail & ~(diff <= tolerance - margin)
+
+    hits = [(row, (str(float(tax[row])), str(float(expected[row])))) for row in np.flatnonzero(clear_fail)]
+
+    tol = Decimal(str(tolerance))
+    for row in np.flatnonzero(undecided):
+        finding = _line_tax_exact(frame.items[row], tol)
+        if finding:
+            hits.append((row, finding))
+
+    # Keep findings in line-item order within each invoice
+    for row, finding in sorted(hits):
+        findings[frame.invoice_idx[row]].append(finding)
+    return findings
+
+
+def _line_tax_exact(item: dict, tol: Decimal) -> Optional[Finding]:
+    taxable = _to_decimal(item.get("taxable_value", 0))
+    rate = _to_decimal(item.get("tax_rate", 0))
+    tax = _to_decimal(item.get("tax_amount", 0))
+    if taxable is None or rate is None or tax is None:
+        return None
+    if abs(taxable * rate / 100 - tax) > tol:
+        return (str(float(tax)), str(float(taxable) * (float(rate) / 100)))
+    return None
+
+
+def line_tax_findings_scalar(invoices: Sequence[dict], tolerance: float) -> List[List[Finding]]:
+    """line_tax_findings one item at a time, for batches too small to repay
+    building the columns. Same float margin, same Decimal fallback."""
+    tol = Decimal(str(tolerance))
+    findings = []
+    for data in invoices:
+        invoice_findings = []
+        for item in data.get("line_items") or ():
+            try:
+                tax = float(item.get("tax_amount", 0))
+                expected = float(item.get("taxable_value", 0)) * (float(item.get("tax_rate", 0)) / 100)
+                diff = abs(expected - tax)
+                scale = abs(expected) + abs(tax)
+                margin = 1e-9 * (scale if scale > 1.0 else 1.0)
+                if diff > tolerance + margin:
+                    invoice_findings.append((str(tax), str(expected)))
+                    continue
+                if diff <= tolerance - margin:
+                    continue
+            except (ValueError, TypeError):
+                pass
+            finding = _line_tax_exact(item, tol)
+            if finding:
+                invoice_findings.append(finding)
+        findings.append(invoice_findings)
+    return findings
+
+
+def tax_split_findings(frame: LineItemFrame, tolerance: float) -> List[List[Finding]]:
+    """Check CGST/SGST/IGST splits per line item and at invoice level."""
+    findings = frame.empty_findings()
+    tol = Decimal(str(tolerance))
+
+    if len(frame):
+        present = ~(np.isnan(frame.cgst) & np.isnan(frame.sgst) & np.isnan(frame.igst))
+        cgst = np.nan_to_num(frame.cgst)
+        sgst = np.nan_to_num(frame.sgst)
+        igst = np.nan_to_num(frame.igst)
+        with np.errstate(invalid="ignore"):
+            ok = (
+                (np.abs(cgst + sgst + igst - frame.tax) <= tolerance)
+                & (np.abs(cgst - sgst) <= tolerance)
+                & ~((igst > 0) & ((cgst > 0) | (sgst > 0)))
+            )
+        for row in np.flatnonzero(present & ~ok):
+            finding = _item_split_exact(frame.items[row], tol)
+            if finding:
+                findings[frame.invoice_idx[row]].append(finding)
+
+    # Header-level split against the sum of line taxes
+    line_tax = np.bincount(frame.invoice_idx, weights=np.nan_to_num(frame.tax), minlength=frame.n_invoices)
+    for idx, data in enumerate(frame.invoices):
+        has_items = frame.offsets[idx + 1] > frame.offsets[idx]
+        finding = _header_split(data, float(line_tax[idx]) if has_items else None, tol)
+        if finding:
+            findings[idx].append(finding)
+    return findings
+
+
+def _item_split_exact(item: dict, tol: Decimal) -> Optional[Finding]:
+    parts = [_to_decimal(item.get(field)) or Decimal(0) for field in SPLIT_FIELDS]
+    problem = _split_problem(*parts, _to_decimal(item.get("tax_amount", 0)), tol)
+    return (_split_detected(*parts), problem) if problem else None
+
+
+def _header_split(data: dict, line_tax: Optional[float], tol: Decimal) -> Optional[Finding]:
+    if all(data.get(field) is None for field in SPLIT_FIELDS):
+        return None
+    parts = [_to_decimal(data.get(field)) or Decimal(0) for field in SPLIT_FIELDS]
+    problem = _split_problem(*parts, Decimal(str(line_tax)) if line_tax is not None else None, tol)
+    return (_split_detected(*parts), problem) if problem else None
+
+
+def _split_floats(item: dict) -> Optional[Tuple[float, float, float]]:
+    """CGST, SGST and IGST as the columns see them: None when none of them
+    is a number, otherwise with the non-numbers as 0."""
+    values = [_to_float(item.get(field)) for field in SPLIT_FIELDS]
+    if all(np.isnan(value) for value in values):
+        return None
+    cgst, sgst, igst = (0.0 if np.isnan(value) else value for value in values)
+    return cgst, sgst, igst
+
+
+def tax_split_findings_scalar(invoices: Sequence[dict], tolerance: float) -> List[List[Finding]]:
+    """tax_split_findings one item at a time."""
+    tol = Decimal(str(tolerance))
+    findings = []
+    for data in invoices:
+        invoice_findings = []
+        items = data.get("line_items") or ()
+        line_tax = 0.0
+        for item in items:
+            try:
+                tax = float(item.get("tax_amount", 0))
+            except (ValueError, TypeError):
+                tax = np.nan
+            if tax == tax:
+                line_tax += tax
+            cgst, sgst, igst = item.get("cgst_amount"), item.get("sgst_amount"), item.get("igst_amount")
+            if cgst is None and sgst is None and igst is None:
+                continue
+            try:
+                cgst, sgst, igst = float(cgst or 0), float(sgst or 0), float(igst or 0)
+                if cgst != cgst or sgst != sgst or igst != igst:
+                    raise ValueError("NaN")
+            except (ValueError, TypeError):
+                parts = _split_floats(item)
+                if parts is None:
+                    continue
+                cgst, sgst, igst = parts
+            if (
+                abs(cgst + sgst + igst - tax) <= tolerance
+                and abs(cgst - sgst) <= tolerance
+                and not (igst > 0 and (cgst > 0 or sgst > 0))
+            ):
+                continue
+            finding = _item_split_exact(item, tol)
+            if finding:
+                invoice_findings.append(finding)
+        finding = _header_split(data, line_tax if items else None, tol)
+        if finding:
+            invoice_findings.append(finding)
+        findings.append(invoice_findings)
+    return findings
+
+
+def invoice_total_findings(frame: LineItemFrame, tolerance: float) -> List[List[Finding]]:
+    """Compare the sum of (taxable_value + tax_amount) with total_amount."""
+    findings = frame.empty_findings()
+    if not len(frame):
+        return findings
+
+    line_total = frame.taxable + frame.tax
+    sums = np.bincount(frame.invoice_idx, weights=np.nan_to_num(line_total), minlength=frame.n_invoices)
+    unparsed = np.bincount(frame.invoice_idx, weights=np.isnan(line_total), minlength=frame.n_invoices)
+    totals = np.array([_to_float(data.get("total_amount")) for data in frame.invoices], dtype=np.float64)
+    has_items = np.diff(frame.offsets) > 0
+
+    with np.errstate(invalid="ignore"):
+        # The parser reports "0.00" when it finds no total, so only positive
+        # totals are checked.
+        suspect = has_items & (totals > 0) & ((unparsed > 0) | ~(np.abs(sums - totals) <= tolerance))
+
+    tol = Decimal(str(tolerance))
+    for idx in np.flatnonzero(suspect):
+        finding = _total_exact(frame.invoices[idx], frame.items[frame.offsets[idx]:frame.offsets[idx + 1]], tol)
+        if finding:
+            findings[idx].append(finding)
+    return findings
+
+
+def _total_exact(data: dict, items: Sequence[dict], tol: Decimal) -> Optional[Finding]:
+    total = _to_decimal(data.get("total_amount"))
+    expected = Decimal(0)
+    for item in items:
+        taxable = _to_decimal(item.get("taxable_value", 0))
+        tax_amt = _to_decimal(item.get("tax_amount", 0))
+        if taxable is None or tax_amt is None:
+            return None
+        expected += taxable + tax_amt
+    if total is not None and abs(expected - total) > tol:
+        return (str(float(total)), str(float(expected)))
+    return None
+
+
+def invoice_total_findings_scalar(invoices: Sequence[dict], tolerance: float) -> List[List[Finding]]:
+    """invoice_total_findings one invoice at a time."""
+    tol = Decimal(str(tolerance))
+    findings = []
+    for data in invoices:
+        items = data.get("line_items") or ()
+        if not items or not _to_float(data.get("total_amount")) > 0:
+            findings.append([])
+            continue
+        line_sum, unparsed = 0.0, False
+        for item in items:
+            try:
+                line_total = float(item.get("taxable_value", 0)) + float(item.get("tax_amount", 0))
+            except (ValueError, TypeError):
+                line_total = np.nan
+            if line_total == line_total:
+                line_sum += line_total
+            else:
+                unparsed = True
+        finding = None
+        if unparsed or not abs(line_sum - _to_float(data.get("total_amount"))) <= tolerance:
+            finding = _total_exact(data, items, tol)
+        findings.append([finding] if finding else [])
+    return findings
@@ -0,0 +1,42 @@
+import hashlib
+from typing import Any, Optional
+
+import orjson
+
+DIGEST_SIZE = 32
+_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any) -> str:
+    # Decimal, UUID, enums without a str base, ...
+    return str(value)
+
+
+def canonical_json(value: Any) -> bytes:
+    """Compact JSON with sorted keys: the same bytes for the same value in
+    every process, unlike json.dumps + hash()."""
+    return orjson.dumps(value, default=_default, option=_OPTIONS)
+
+
+def _new() -> "hashlib._Hash":
+    return hashlib.blake2b(digest_size=DIGEST_SIZE)
+
+
+def digest_bytes(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=DIGEST_SIZE).hexdigest()
+
+
+def payload_digest(value: Any) -> Optional[str]:
+    """BLAKE2b of the canonical JSON of `value`; None for empty payloads."""
+    if not value:
+        return None
+    return digest_bytes(canonical_json(value))
+
+
+def chain_digest(prev_hash: Optional[str], record: Any) -> str:
+    """Hash-chain link: commits to the previous link and this record."""
+    h = _new()
+    h.update((prev_hash or "").encode())
+    h.update(b"\n")
+    h.update(canonical_json(record))
+    return h.hexdigest()
@@ -1,16 +1,84 @@
 import hashlib
-import shutil
+import os
+import re
+import uuid
+import zipfile
+import zlib
+from dataclasses import dataclass
 from pathlib import Path
+from typing import BinaryIO, List, Optional, Tuple
 
-class FileUtils:
-    @staticmethod
-    def save_upload_file(upload_file, destination: Path) -> None:
-        try:
-            with destination.open("wb") as buffer:
-                shutil.copyfileobj(upload_file.file, buffer)
-        finally:
-            upload_file.file.close()
+import aiofiles
+
+CHUNK_SIZE = 1024 * 1024
+
+PDF_MAGIC = b"%PDF"
+# The PDF spec lets the header start anywhere in the first 1024 bytes
+PDF_HEADER_WINDOW = 1024
+# Page objects, not the /Pages tree nodes
+PAGE_OBJECT = re.compile(rb"/Type\s*/Page(?![A-Za-z])")
+# Longest match above, kept between chunks so a token split across two is still seen
+PAGE_OBJECT_OVERLAP = 32
+
+
+class UploadRejected(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class StoredUpload:
+    sha256: str
+    size: int
+    page_count: Optional[int]
+
+
+class PDFStreamInspector:
+    """Validates, hashes and counts pages of a PDF fed to it chunk by chunk.
+
+    The page count comes from uncompressed /Type /Page objects, so it is an
+    estimate for files that keep their page tree in object streams; it is
+    reported as None when no page objects are visible.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+        self._head = b""
+        self._checked = False
+        self._tail = b""
+        self._pages = 0
+
+    def feed(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadRejected(413, f"File exceeds the {self.max_bytes // (1024 * 1024)} MB upload limit")
+        if not self._checked:
+            self._head += chunk[:PDF_HEADER_WINDOW]
+            if len(self._head) >= PDF_HEADER_WINDOW:
+                self._check_magic()
+        self._sha256.update(chunk)
+
+        window = self._tail + chunk
+        self._pages += len(PAGE_OBJECT.findall(window))
+        # Matches that end inside the overlap were already counted last time
+        self._pages -= len(PAGE_OBJECT.findall(self._tail))
+        self._tail = window[-PAGE_OBJECT_OVERLAP:]
+
+    def finish(self) -> StoredUpload:
+        if not self._checked:
+            self._check_magic()
+        return StoredUpload(sha256=self._sha256.hexdigest(), size=self.size, page_count=self._pages or None)
 
+    def _check_magic(self) -> None:
+        if PDF_MAGIC not in self._head[:PDF_HEADER_WINDOW]:
+            raise UploadRejected(400, "File is not a PDF")
+        self._checked = True
+
+class FileUtils:
     @staticmethod
     def compute_file_hash(file_path: Path) -> str:
         sha256_hash = hashlib.sha256()
@@ -18,3 +86,97 @@ class FileUtils:
             for byte_block in iter(lambda: f.read(4096), b""):
                 sha256_hash.update(byte_block)
         return sha256_hash.hexdigest()
+
+    @staticmethod
+    async def stream_upload_file(upload_file, destination: Path, max_bytes: int) -> StoredUpload:
+        """Write the upload to `destination` chunk by chunk without blocking the
+        event loop, rejecting it as soon as it is too large or not a PDF."""
+        inspector = PDFStreamInspector(max_bytes)
+        try:
+            async with aiofiles.open(destination, "wb") as buffer:
+                while chunk := await upload_file.read(CHUNK_SIZE):
+                    inspector.feed(chunk)
+                    await buffer.write(chunk)
+            return inspector.finish()
+        except BaseException:
+            if destination.exists():
+                os.remove(destination)
+            raise
+        finally:
+            await upload_file.close()
+
+    @staticmethod
+    def copy_pdf_stream(source: BinaryIO, destination: Path, max_bytes: int) -> StoredUpload:
+        """Blocking counterpart of stream_upload_file for already-open streams."""
+        inspector = PDFStreamInspector(max_bytes)
+        try:
+            with destination.open("wb") as buffer:
+                for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                    inspector.feed(chunk)
+                    buffer.write(chunk)
+            return inspector.finish()
+        except BaseException:
+            if destination.exists():
+                os.remove(destination)
+            raise
+
+    @staticmethod
+    def extract_zip_pdfs(
+        archive: BinaryIO, folder: Path, max_bytes: int, max_members: int, max_total_bytes: int
+    ) -> Tuple[List[Tuple[str, Path, StoredUpload]], List[Tuple[str, str]]]:
+        """Stream every PDF member of `archive` into `folder`, one at a time.
+
+        Returns (accepted, rejected): accepted as (filename, stored path,
+        StoredUpload), rejected as (member name, reason). Sizes are enforced on
+        the decompressed bytes, not the header, so a lying archive stops at
+        `max_bytes` per member. Once the members written add up to more than
+        `max_total_bytes` the whole archive is rejected with a 413 and the
+        files already extracted from it are removed.
+        """
+        try:
+            zf = zipfile.ZipFile(archive)
+        except zipfile.BadZipFile:
+            raise UploadRejected(400, "Not a valid ZIP archive")
+
+        accepted, rejected = [], []
+        total = 0
+
+        def too_large() -> UploadRejected:
+            for _, path, _ in accepted:
+                if path.exists():
+                    os.remove(path)
+            return UploadRejected(413, f"Archive expands to more than {max_total_bytes // (1024 * 1024)} MB")
+
+        with zf:
+            members = [m for m in zf.infolist() if not m.is_dir() and not m.filename.startswith("__MACOSX/")]
+            if len(members) > max_members:
+                raise UploadRejected(413, f"Archive has {len(members)} files, max {max_members}")
+            for member in members:
+                name = os.path.basename(member.filename)
+                if not name.lower().endswith(".pdf"):
+                    rejected.append((member.filename, "Only PDF files allowed"))
+                    continue
+                if member.file_size > max_bytes:
+                    rejected.append((member.filename, f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit"))
+                    continue
+                budget = max_total_bytes - total
+                if member.file_size > budget:
+                    raise too_large()
+                limit = min(max_bytes, budget)
+                destination = folder / f"{uuid.uuid4()}_{name}"
+                try:
+                    with zf.open(member) as source:
+                        stored = FileUtils.copy_pdf_stream(source, destination, limit)
+                except UploadRejected as e:
+                    if e.status_code == 413 and limit < max_bytes:
+                        # The archive's budget ran out, not the member's
+                        raise too_large()
+                    rejected.append((member.filename, e.detail))
+                    continue
+                except (zipfile.BadZipFile, zlib.error, RuntimeError, NotImplementedError) as e:
+                    # Corrupt, encrypted or unsupported compression
+                    rejected.append((member.filename, f"Unreadable archive member: {e}"))
+                    continue
+                total += stored.size
+                accepted.append((name, destination, stored))
+        return accepted, rejected
@@ -1,12 +1,93 @@
+import asyncio
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.core.config import settings
+from app.core.metrics import metrics
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+# Stored for accounts that sign in through Google only; never matches a password
+UNUSABLE_PASSWORD_PREFIX = "!"
 
 class Hasher:
     @staticmethod
     def verify_password(plain_password: str, hashed_password: str) -> bool:
-        return pwd_context.verify(plain_password, hashed_password)
+        return Hasher.verify_and_update(plain_password, hashed_password)[0]
+
+    @staticmethod
+    def verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """(valid, new_hash); new_hash is set when the stored hash uses an
+        outdated cost factor and should be replaced."""
+        if not hashed_password or hashed_password.startswith(UNUSABLE_PASSWORD_PREFIX):
+            return False, None
+        try:
+            return pwd_context.verify_and_update(plain_password, hashed_password)
+        except ValueError:
+            # Not a hash passlib recognises
+            return False, None
 
     @staticmethod
     def get_password_hash(password: str) -> str:
         return pwd_context.hash(password)
+
+    @staticmethod
+    def unusable_password() -> str:
+        return UNUSABLE_PASSWORD_PREFIX + secrets.token_urlsafe(16)
+
+
+class HashPoolBusy(Exception):
+    """Raised instead of queueing when too many hashes are already pending."""
+
+
+class PasswordHashPool:
+    """Dedicated threads for bcrypt, so login bursts cannot take over the
+    AnyIO threadpool that sync endpoints share. bcrypt releases the GIL, so
+    threads scale across cores.
+
+    At most max_pending operations are admitted (running plus queued);
+    beyond that callers get HashPoolBusy immediately.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+            return self._executor
+
+    async def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            metrics.inc("password_hash_rejected")
+            raise HashPoolBusy()
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return await asyncio.wrap_future(future)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        return await self._run(Hasher.verify_and_update, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(Hasher.get_password_hash, password)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+password_pool = PasswordHashPool(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_PENDING)
@@ -0,0 +1,23 @@
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+
+
+class Cursor:
+    """Opaque keyset cursor for lists ordered by (timestamp, id) descending."""
+
+    @staticmethod
+    def encode(ts: datetime, row_id: int) -> str:
+        raw = json.dumps([ts.isoformat(), row_id], separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+    @staticmethod
+    def decode(cursor: str) -> Tuple[datetime, int]:
+        """Raises ValueError for anything encode() did not produce."""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            ts, row_id = json.loads(raw)
+            return datetime.fromisoformat(ts), int(row_id)
+        except (TypeError, ValueError) as e:
+            raise ValueError("Invalid cursor") from e
@@ -1,25 +1,14 @@
-from app.db.session import SessionLocal
-from app.services.extraction_service import ExtractionService
-from app.db.models import Invoice, InvoiceStatus
+import os
+import threading
+
+from app.workers.runtime import IngestionProcessor
+
 
 def process_invoice_job(invoice_id: int):
-    db = SessionLocal()
+    """One invoice outside the worker runtime: the in-process fallback while
+    Redis is down, or an RQ job. Same claim/lease rules as a batch of one."""
+    processor = IngestionProcessor(f"inproc-{os.getpid()}-{threading.get_ident()}")
     try:
-        invoice = db.query(Invoice).filter(Invoice.id == invoice_id).first()
-        if not invoice:
-            return
-        
-        invoice.status = InvoiceStatus.PROCESSING
-        db.commit()
-
-        service = ExtractionService(db)
-        try:
-            service.process_invoice(invoice.id, invoice.stored_path)
-            invoice.status = InvoiceStatus.COMPLETED
-        except Exception as e:
-            print(f"Extraction failed: {e}")
-            invoice.status = InvoiceStatus.FAILED
-        
-        db.commit()
+        processor.process_batch([invoice_id])
     finally:
-        db.close()
+        processor.close()
@@ -0,0 +1,440 @@
+"""Long-lived ingestion worker.
+
+    python -m app.workers.runtime [--batch-size N] [--worker-id NAME]
+
+Pulls invoice ids from the Redis priority lists filled by
+JobQueue.enqueue_invoices, "interactive" before "bulk", in micro-batches.
+Each batch is claimed in the DB under a lease, extracted with one reused
+ExtractionService and session, and committed together. A heartbeat keeps
+the lease alive while the batch runs; the reaper requeues invoices whose
+worker died.
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from redis.exceptions import RedisError
+from sqlalchemy import and_, func, or_, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.queue import INGESTION_PRIORITIES, JobQueue, ingestion_key, job_queue
+from app.core.redis_pool import RedisManager, redis_manager
+from app.db.models import Invoice, InvoiceStatus
+from app.db.session import SessionLocal
+from app.services.audit_service import AuditService, audit_writer
+from app.services.compliance_engine import ComplianceEngine
+from app.services.extraction_service import ExtractionService
+from app.services.rule_engine import seed_default_rules
+
+logger = logging.getLogger(__name__)
+
+# (invoice_id, stored_path, invoice_hash)
+ClaimedInvoice = Tuple[int, str, Optional[str]]
+
+# Endpoint recorded on audit events of runs started by the pipeline
+AUTO_COMPLIANCE_ENDPOINT = "ingestion:auto-compliance"
+
+
+def worker_stats_key(worker_id: str) -> str:
+    return f"{settings.INGESTION_QUEUE_PREFIX}:workers:{worker_id}"
+
+
+class ThroughputStats:
+    """Invoices per second over a sliding window, plus running totals."""
+
+    def __init__(self, window_seconds: float = 60.0):
+        self.window_seconds = window_seconds
+        self.started_at = time.time()
+        self.processed = 0
+        self.failed = 0
+        self.batches = 0
+        self._recent: "deque[Tuple[float, int]]" = deque()
+
+    def record(self, processed: int, failed: int) -> None:
+        now = time.monotonic()
+        self.processed += processed
+        self.failed += failed
+        self.batches += 1
+        self._recent.append((now, processed + failed))
+        metrics.inc("ingestion_invoices_processed", processed)
+        metrics.inc("ingestion_invoices_failed", failed)
+        metrics.inc("ingestion_batches")
+
+    def rate(self) -> float:
+        now = time.monotonic()
+        while self._recent and self._recent[0][0] < now - self.window_seconds:
+            self._recent.popleft()
+        window = min(self.window_seconds, time.time() - self.started_at) or 1.0
+        return sum(n for _, n in self._recent) / window
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "processed": self.processed,
+            "failed": self.failed,
+            "batches": self.batches,
+            "invoices_per_sec": round(self.rate(), 3),
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+        }
+
+
+class Heartbeat:
+    """Extends the lease of a running batch from a side thread.
+
+    Uses its own connection: the worker's session is busy with the batch.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], owner: str, invoice_ids: List[int], lease_seconds: int):
+        self.session_factory = session_factory
+        self.owner = owner
+        self.invoice_ids = invoice_ids
+        self.lease_seconds = lease_seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ingestion-heartbeat", daemon=True)
+
+    def __enter__(self) -> "Heartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.lease_seconds / 3):
+            db = self.session_factory()
+            try:
+                db.execute(
+                    update(Invoice)
+                    .where(Invoice.id.in_(self.invoice_ids), Invoice.lease_owner == self.owner)
+                    .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=self.lease_seconds))
+                )
+                db.commit()
+                metrics.inc("ingestion_heartbeats")
+            except Exception:
+                db.rollback()
+                logger.exception("Lease heartbeat failed")
+            finally:
+                db.close()
+
+
+class IngestionProcessor:
+    """Claims, extracts and finishes batches of invoices.
+
+    One session and one ExtractionService (with its OCR and LLM services)
+    live as long as the processor; the identity map is cleared after every
+    batch so it does not grow.
+    """
+
+    def __init__(
+        self,
+        owner: str,
+        session_factory: Callable[[], Session] = SessionLocal,
+        queue: JobQueue = job_queue,
+        lease_seconds: int = settings.INGESTION_LEASE_SECONDS,
+        max_attempts: int = settings.INGESTION_MAX_ATTEMPTS,
+        requeue_after_seconds: int = settings.INGESTION_REQUEUE_AFTER_SECONDS,
+        auto_compliance: bool = settings.INGESTION_AUTO_COMPLIANCE,
+    ):
+        self.owner = owner
+        self.session_factory = session_factory
+        self.queue = queue
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.requeue_after_seconds = requeue_after_seconds
+        self.auto_compliance = auto_compliance
+        self.db = session_factory()
+        self.extraction = ExtractionService(self.db)
+        self.compliance = ComplianceEngine(self.db)
+        # invoice_id -> user_id of the current batch
+        self._owners: Dict[int, int] = {}
+
+    def claim(self, invoice_ids: List[int]) -> List[ClaimedInvoice]:
+        """Lease the invoices still waiting; ids already claimed, finished or
+        deleted are skipped, so duplicate queue entries are harmless."""
+        stmt = (
+            update(Invoice)
+            .where(Invoice.id.in_(invoice_ids), Invoice.status == InvoiceStatus.UPLOADED)
+            .values(
+                status=InvoiceStatus.PROCESSING,
+                lease_owner=self.owner,
+                lease_expires_at=datetime.utcnow() + timedelta(seconds=self.lease_seconds),
+                attempts=func.coalesce(Invoice.attempts, 0) + 1,
+            )
+            .returning(Invoice.id, Invoice.stored_path, Invoice.invoice_hash, Invoice.user_id)
+        )
+        rows = self.db.execute(stmt, execution_options={"synchronize_session": False}).all()
+        self.db.commit()
+        self._owners = {row.id: row.user_id for row in rows}
+        return [(row.id, row.stored_path, row.invoice_hash) for row in rows]
+
+    def process_batch(self, invoice_ids: List[int]) -> Tuple[int, int]:
+        """(completed, failed) for the invoices of this batch we claimed."""
+        claimed = self.claim(invoice_ids)
+        if not claimed:
+            return 0, 0
+        claimed_ids = [invoice_id for invoice_id, _, _ in claimed]
+        try:
+            with Heartbeat(self.session_factory, self.owner, claimed_ids, self.lease_seconds):
+                staged, errors = self.extraction.extract_many(claimed)
+            # Nothing is written for invoices whose lease expired and another
+            # worker reclaimed meanwhile; their new owner writes them instead
+            held = self._hold_leases(claimed_ids)
+            lost = [invoice_id for invoice_id in claimed_ids if invoice_id not in held]
+            if lost:
+                logger.warning("Lost the lease on invoices %s before finishing them", lost)
+                metrics.inc("ingestion_leases_lost", len(lost))
+                staged = {invoice_id: row for invoice_id, row in staged.items() if invoice_id in held}
+                errors = {invoice_id: error for invoice_id, error in errors.items() if invoice_id in held}
+            self.extraction.write_many(staged)
+            for invoice_id, error in errors.items():
+                logger.warning("Extraction failed for invoice %s: %s", invoice_id, error)
+            run_ids = self._run_compliance(staged) if self.auto_compliance else {}
+            self._finish(list(staged), InvoiceStatus.COMPLETED)
+            self._finish(list(errors), InvoiceStatus.FAILED)
+            # Extraction results, statuses and runs of the whole batch in one commit
+            self.db.commit()
+            for invoice_id, run_id in run_ids.items():
+                AuditService.log_event(
+                    self.db, self._owners[invoice_id], AUTO_COMPLIANCE_ENDPOINT, "compliance_run_auto",
+                    payload={"invoice_id": invoice_id}, run_id=run_id,
+                )
+        except Exception:
+            # Leases stay in place; the reaper requeues the batch once they expire
+            logger.exception("Ingestion batch %s failed", claimed_ids)
+            self.db.rollback()
+            return 0, 0
+        finally:
+            self.db.expunge_all()
+        return len(staged), len(errors)
+
+    def _run_compliance(self, staged: Dict[int, dict]) -> Dict[int, str]:
+        """Evaluate the batch on the extracted dicts still in memory, instead
+        of a later POST /compliance/run loading them back."""
+        invoices = [
+            (invoice_id, self._owners[invoice_id], data["extracted_json"])
+            for invoice_id, data in staged.items()
+        ]
+        try:
+            # Loaded (and on an empty rules table, seeded) before the
+            # savepoint, so only evaluating and writing runs happens inside it
+            ruleset = self.compliance.registry.get(self.db)
+            # A rule failure must not cost the batch its extraction results
+            with self.db.begin_nested():
+                run_ids = self.compliance.stage_runs(invoices, ruleset)
+        except Exception:
+            logger.exception("Automatic compliance failed for invoices %s", list(staged))
+            metrics.inc("ingestion_auto_compliance_errors")
+            return {}
+        metrics.inc("ingestion_auto_runs", len(run_ids))
+        return run_ids
+
+    def _hold_leases(self, invoice_ids: List[int]) -> set:
+        """Ids of the invoices still leased to us, extending their lease. The
+        UPDATE locks their rows until the batch commits, so they cannot be
+        reclaimed while the results are written."""
+        rows = self.db.execute(
+            update(Invoice)
+            .where(Invoice.id.in_(invoice_ids), Invoice.lease_owner == self.owner)
+            .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=self.lease_seconds))
+            .returning(Invoice.id),
+            execution_options={"synchronize_session": False},
+        ).all()
+        return {row.id for row in rows}
+
+    def _finish(self, invoice_ids: List[int], status: InvoiceStatus) -> None:
+        if not invoice_ids:
+            return
+        self.db.execute(
+            update(Invoice)
+            .where(Invoice.id.in_(invoice_ids), Invoice.lease_owner == self.owner)
+            .values(status=status, lease_owner=None, lease_expires_at=None),
+            execution_options={"synchronize_session": False},
+        )
+
+    def reap(self) -> Tuple[int, int]:
+        """Requeue invoices whose lease expired (worker died mid-batch) and
+        invoices left UPLOADED long after their queue entry should have been
+        picked up. Invoices out of attempts are marked FAILED. Returns
+        (requeued, failed)."""
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=self.lease_seconds)
+        expired = and_(
+            Invoice.status == InvoiceStatus.PROCESSING,
+            or_(
+                Invoice.lease_expires_at < now,
+                # Left PROCESSING by the worker before leases existed
+                and_(Invoice.lease_expires_at.is_(None), Invoice.uploaded_at < stale),
+            ),
+        )
+        exhausted = func.coalesce(Invoice.attempts, 0) >= self.max_attempts
+        try:
+            failed = self.db.execute(
+                update(Invoice).where(expired, exhausted)
+                .values(status=InvoiceStatus.FAILED, lease_owner=None, lease_expires_at=None)
+                .returning(Invoice.id),
+                execution_options={"synchronize_session": False},
+            ).scalars().all()
+            requeued = self.db.execute(
+                update(Invoice).where(expired, ~exhausted)
+                .values(status=InvoiceStatus.UPLOADED, lease_owner=None, lease_expires_at=None)
+                .returning(Invoice.id),
+                execution_options={"synchronize_session": False},
+            ).scalars().all()
+            # lease_expires_at on an UPLOADED invoice means "re-pushed, wait
+            # this long before doing it again"
+            lost = self.db.execute(
+                update(Invoice)
+                .where(
+                    Invoice.status == InvoiceStatus.UPLOADED,
+                    Invoice.uploaded_at < now - timedelta(seconds=self.requeue_after_seconds),
+                    or_(Invoice.lease_expires_at.is_(None), Invoice.lease_expires_at < now),
+                    Invoice.duplicate_of_id.is_(None),
+                )
+                .values(lease_expires_at=now + timedelta(seconds=self.requeue_after_seconds))
+                .returning(Invoice.id),
+                execution_options={"synchronize_session": False},
+            ).scalars().all()
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            logger.exception("Reaper pass failed")
+            return 0, 0
+        requeue = list(requeued) + list(lost)
+        if requeue:
+            logger.warning("Requeueing %d invoices (%d expired leases)", len(requeue), len(requeued))
+            self.queue.enqueue_invoices(requeue, priority="bulk")
+        if failed:
+            logger.error("Invoices %s failed after %d attempts", list(failed), self.max_attempts)
+        metrics.inc("ingestion_reaped", len(requeue))
+        return len(requeue), len(failed)
+
+    def close(self) -> None:
+        self.db.close()
+
+
+class IngestionWorker:
+    """The pull loop around an IngestionProcessor."""
+
+    def __init__(
+        self,
+        processor: IngestionProcessor,
+        manager: RedisManager = redis_manager,
+        batch_size: int = settings.INGESTION_BATCH_SIZE,
+        poll_timeout: int = settings.INGESTION_POLL_TIMEOUT_SECONDS,
+        reap_interval: int = settings.INGESTION_REAP_INTERVAL_SECONDS,
+    ):
+        self.processor = processor
+        self.manager = manager
+        self.batch_size = batch_size
+        self.poll_timeout = poll_timeout
+        self.reap_interval = reap_interval
+        self.stats = ThroughputStats()
+        self._keys = [ingestion_key(priority) for priority in INGESTION_PRIORITIES]
+        self._last_reap = 0.0
+
+    def pop_batch(self) -> List[int]:
+        """Up to batch_size ids, highest priority first; waits up to
+        poll_timeout for the first one."""
+        client = self.manager.client()
+        item = client.blpop(self._keys, timeout=self.poll_timeout)
+        if item is None:
+            return []
+        ids = [int(item[1])]
+        for key in self._keys:
+            if len(ids) >= self.batch_size:
+                break
+            ids.extend(int(i) for i in client.lpop(key, self.batch_size - len(ids)) or [])
+        return ids
+
+    def run_once(self) -> int:
+        if time.monotonic() - self._last_reap >= self.reap_interval:
+            self._last_reap = time.monotonic()
+            self.processor.reap()
+        invoice_ids = self.pop_batch()
+        if invoice_ids:
+            completed, failed = self.processor.process_batch(invoice_ids)
+            self.stats.record(completed, failed)
+        self.publish_stats()
+        return len(invoice_ids)
+
+    def publish_stats(self) -> None:
+        key = worker_stats_key(self.processor.owner)
+        try:
+            client = self.manager.client()
+            client.hset(key, mapping=self.stats.snapshot())
+            client.expire(key, max(60, self.poll_timeout * 3))
+        except RedisError as e:
+            logger.debug("Could not publish worker stats: %s", e)
+
+    def run(self, stop: threading.Event) -> None:
+        logger.info("Ingestion worker %s started", self.processor.owner)
+        while not stop.is_set():
+            try:
+                self.run_once()
+            except RedisError as e:
+                logger.warning("Redis unavailable, retrying: %s", e)
+                stop.wait(settings.REDIS_RETRY_AFTER_SECONDS)
+        logger.info("Ingestion worker %s stopped: %s", self.processor.owner, self.stats.snapshot())
+
+
+def read_worker_stats(manager: RedisManager = redis_manager) -> Dict[str, Dict[str, float]]:
+    """Throughput published by every live worker, keyed by worker id."""
+    if not manager.is_available():
+        return {}
+    prefix = worker_stats_key("")
+    try:
+        client = manager.client()
+        stats = {}
+        for key in client.scan_iter(match=f"{prefix}*"):
+            name = key.decode() if isinstance(key, bytes) else key
+            stats[name[len(prefix):]] = {
+                (k.decode() if isinstance(k, bytes) else k): float(v) for k, v in client.hgetall(key).items()
+            }
+        return stats
+    except RedisError as e:
+        logger.warning("Could not read worker stats: %s", e)
+        return {}
+
+
+def main() -> None:
+    from app.core.logging import setup_logging
+    from app.services.llm_providers import close_llm_client
+    from app.services.ocr_service import OCRService
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=settings.INGESTION_BATCH_SIZE)
+    parser.add_argument("--worker-id", default=f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}")
+    args = parser.parse_args()
+
+    setup_logging()
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        # Finish the current batch, then exit
+        signal.signal(signum, lambda *_: stop.set())
+
+    with SessionLocal() as db:
+        seed_default_rules(db)
+    processor = IngestionProcessor(args.worker_id)
+    try:
+        IngestionWorker(processor, batch_size=args.batch_size).run(stop)
+    finally:
+        processor.close()
+        job_queue.shutdown(wait=True)
+        audit_writer.shutdown()
+        OCRService.shutdown_pool()
+        close_llm_client()
+        redis_manager.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""invoice_data size and GET /invoices/{id} load time: inline OCR text vs
+the blob store.
+
+    python -m benchmarks.bench_invoice_detail
+
+"inline" is the old layout: extracted_text in the row and loaded with every
+InvoiceData. "blob" is what ExtractionService writes now: a text_ref into
+the compressed blob store and no text in the row.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session, joinedload, undefer
+
+from app.db.models import Base, Invoice, InvoiceData, User
+from app.services.blob_store import BlobStore
+
+INVOICES = 300
+TEXT_LINES = 3000  # ~150 KB of OCR text per invoice
+LOOKUPS = 500
+
+
+def make_text(rng):
+    words = ["Consulting", "services", "HSN", "998311", "Qty", "Taxable", "CGST", "SGST", "9%", "Total"]
+    return "\n".join(
+        " ".join(rng.choice(words) for _ in range(6)) + f" {rng.randint(1, 99999)}.00" for _ in range(TEXT_LINES)
+    )
+
+
+def build(path, blobs, texts):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        db.add(User(id=1, email="bench@example.com", password_hash="x"))
+        db.execute(insert(Invoice), [
+            {"id": n, "user_id": 1, "filename": f"{n}.pdf", "stored_path": f"/f/{n}.pdf", "status": "completed"}
+            for n in range(1, INVOICES + 1)
+        ])
+        db.execute(insert(InvoiceData), [
+            {
+                "invoice_id": n,
+                "extracted_json": {"invoice_number": f"INV-{n}", "total_amount": "100.00"},
+                "extracted_text": None if blobs else text,
+                "text_ref": blobs.put_text(text) if blobs else None,
+            }
+            for n, text in enumerate(texts, start=1)
+        ])
+        db.commit()
+    return engine
+
+
+def time_lookups(engine, inline, rng):
+    samples = []
+    options = [joinedload(Invoice.data)]
+    if inline:
+        # The old mapping loaded the text column eagerly
+        options = [joinedload(Invoice.data).options(undefer(InvoiceData.extracted_text))]
+    for _ in range(LOOKUPS):
+        invoice_id = rng.randint(1, INVOICES)
+        started = time.perf_counter()
+        with Session(engine) as db:
+            invoice = db.query(Invoice).options(*options).filter(Invoice.id == invoice_id).first()
+            invoice.data.extracted_json
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000, samples[int(len(samples) * 0.99) - 1] * 1000
+
+
+def main():
+    rng = random.Random(7)
+    texts = [make_text(rng) for _ in range(INVOICES)]
+    print(f"{INVOICES} invoices, ~{len(texts[0]) // 1024} KB OCR text each, {LOOKUPS} lookups")
+    print(f"{'mode':>7} {'db MB':>7} {'blobs MB':>9} {'p50 ms':>7} {'p99 ms':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("inline", "blob"):
+            blobs = BlobStore(os.path.join(tmp, "blobs")) if mode == "blob" else None
+            db_path = os.path.join(tmp, f"{mode}.db")
+            engine = build(db_path, blobs, texts)
+            p50, p99 = time_lookups(engine, mode == "inline", random.Random(1))
+            engine.dispose()
+            blob_bytes = sum(
+                os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(os.path.join(tmp, "blobs")) for f in files
+            ) if blobs else 0
+            print(f"{mode:>7} {os.path.getsize(db_path) / 1e6:>7.1f} {blob_bytes / 1e6:>9.1f} {p50:>7.2f} {p99:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Login burst: bcrypt on the AnyIO threadpool vs the dedicated hash pool.
+
+    python -m benchmarks.bench_login
+
+Fires LOGINS concurrent logins while a client keeps calling a cheap sync
+endpoint, and reports p50/p99 for both. "legacy" is the old sync login
+endpoint that verified bcrypt inline on a threadpool thread.
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+
+os.environ.setdefault("BCRYPT_ROUNDS", "10")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.main import app
+from app.api import deps
+from app.db.models import Base, User
+from app.utils.hashing import Hasher
+
+LOGINS = 200
+CONCURRENCY = 50
+
+bench = APIRouter()
+
+
+@bench.post("/legacy-login")
+def legacy_login(db: Session = Depends(deps.get_db), form_data: OAuth2PasswordRequestForm = Depends()):
+    user = db.query(User).filter(User.email == form_data.username).first()
+    if not user or not Hasher.verify_password(form_data.password, user.password_hash):
+        raise HTTPException(status_code=400, detail="Incorrect email or password")
+    return {"ok": True}
+
+
+@bench.get("/ping")
+def ping():
+    # Stands in for any other sync endpoint sharing the threadpool
+    return {"ok": True}
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2] * 1000, samples[int(len(samples) * 0.99) - 1] * 1000
+
+
+async def _burst(client, path):
+    gate = asyncio.Semaphore(CONCURRENCY)
+    login_times, ping_times = [], []
+    done = asyncio.Event()
+
+    async def login():
+        async with gate:
+            started = time.perf_counter()
+            response = await client.post(path, data={"username": "bench@example.com", "password": "secret"})
+            assert response.status_code == 200, response.text
+            login_times.append(time.perf_counter() - started)
+
+    async def pinger():
+        while not done.is_set():
+            started = time.perf_counter()
+            await client.get("/bench/ping")
+            ping_times.append(time.perf_counter() - started)
+            await asyncio.sleep(0.005)
+
+    ping_task = asyncio.create_task(pinger())
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(LOGINS)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await ping_task
+    return elapsed, _percentiles(login_times), _percentiles(ping_times)
+
+
+async def main():
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = SessionLocal()
+    db.add(User(email="bench@example.com", password_hash=Hasher.get_password_hash("secret"), role="user"))
+    db.commit()
+    db.close()
+
+    def override_get_db():
+        session = SessionLocal()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[deps.get_db] = override_get_db
+    app.include_router(bench, prefix="/bench")
+
+    print(f"{LOGINS} logins, {CONCURRENCY} concurrent, bcrypt rounds {os.environ['BCRYPT_ROUNDS']}")
+    print(f"{'mode':>8} {'total s':>8} {'login p50':>10} {'login p99':>10} {'ping p50':>9} {'ping p99':>9}")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for mode, path in (("legacy", "/bench/legacy-login"), ("pool", "/api/v1/auth/login")):
+            elapsed, (login_p50, login_p99), (ping_p50, ping_p99) = await _burst(client, path)
+            print(f"{mode:>8} {elapsed:>8.2f} {login_p50:>10.1f} {login_p99:>10.1f} {ping_p50:>9.1f} {ping_p99:>9.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+"""Throughput of the heuristic invoice parser on synthetic invoice texts.
+
+    python -m benchmarks.bench_parser
+
+"legacy" is the four re.search calls LLMService used before; it only finds
+the header fields, so it is shown for scale rather than as an equivalent.
+"""
+import random
+import re
+import sys
+import os
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.invoice_parser import parse_invoice_text
+
+DESCRIPTIONS = ["Consulting services", "Printer paper A4", "Laptop bag", "Annual maintenance", "LED monitor 24in"]
+HSN_CODES = ["998311", "4802", "42021290", "998713", "8528"]
+
+
+def legacy_parse(text):
+    def field(pattern):
+        match = re.search(pattern, text, re.IGNORECASE)
+        return match.group(1) if match else None
+
+    return {
+        "invoice_number": field(r"Invoice\s*No\.?\s*[:\-]?\s*([A-Z0-9/-]+)"),
+        "gstin": field(r"GSTIN\s*[:\-]?\s*([0-9]{2}[A-Z]{5}[0-9]{4}[A-Z]{1}[1-9A-Z]{1}Z[0-9A-Z]{1})"),
+        "date": field(r"Date\s*[:\-]?\s*(\d{2}/\d{2}/\d{4})"),
+        "total_amount": field(r"Total\s*[:\-]?\s*([\d,]+\.?\d{0,2})"),
+    }
+
+
+def make_invoice(n_items, rng):
+    lines = [
+        "TAX INVOICE",
+        f"Invoice No: INV/{rng.randint(1000, 9999)}    Date: 0{rng.randint(1, 9)}/12/2024",
+        "Supplier GSTIN: 29ABCDE1234F1Z5",
+        "Billing address: 42 MG Road, Bengaluru 560001",
+        "Buyer GSTIN: 27PQRSX6789K1Z2",
+        "Sr  Description  HSN  Qty  Rate  Taxable  CGST  Amt  SGST  Amt  Total",
+    ]
+    taxable_sum = tax_sum = 0.0
+    for i in range(n_items):
+        k = rng.randrange(len(DESCRIPTIONS))
+        qty, price = rng.randint(1, 20), round(rng.uniform(50, 5000), 2)
+        taxable = round(qty * price, 2)
+        half = round(taxable * 0.09, 2)
+        taxable_sum += taxable
+        tax_sum += 2 * half
+        lines.append(
+            f"{i + 1}  {DESCRIPTIONS[k]}  {HSN_CODES[k]}  {qty}  {price:.2f}  {taxable:,.2f}"
+            f"  9%  {half:.2f}  9%  {half:.2f}  {taxable + 2 * half:,.2f}"
+        )
+    lines += [
+        f"Sub Total: {taxable_sum:,.2f}",
+        f"CGST @ 9%: {tax_sum / 2:,.2f}",
+        f"SGST @ 9%: {tax_sum / 2:,.2f}",
+        f"Grand Total: {taxable_sum + tax_sum:,.2f}",
+        "Terms: payment due within 30 days of the invoice date.",
+    ]
+    return "\n".join(lines)
+
+
+def make_corpus(target_chars, seed=0):
+    """Synthetic invoice text of roughly `target_chars` characters; large
+    sizes are multi-page invoices with many line items."""
+    rng = random.Random(seed)
+    n_items = 1
+    text = make_invoice(n_items, rng)
+    while len(text) < target_chars:
+        n_items *= 2
+        text = make_invoice(n_items, rng)
+    return text[: max(target_chars, text.rfind("\n", 0, target_chars))]
+
+
+def _best(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number
+
+
+def main():
+    print(f"{'chars':>9} {'items':>6} {'parser ms':>10} {'MB/s':>7} {'legacy ms':>10}")
+    for size in (1_000, 10_000, 100_000, 1_000_000):
+        text = make_corpus(size)
+        result = parse_invoice_text(text)
+        number = max(1, 2_000_000 // size)
+        parser = _best(lambda: parse_invoice_text(text), number)
+        legacy = _best(lambda: legacy_parse(text), number)
+        print(
+            f"{len(text):>9} {len(result['line_items']):>6} {parser * 1000:>10.3f}"
+            f" {len(text) / parser / 1e6:>7.1f} {legacy * 1000:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Microbenchmark: per-item Python loop vs columnar RULE_004 evaluation.
+
+    python -m benchmarks.bench_tax_reconciliation
+"""
+import random
+import sys
+import os
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.tax_reconciliation import (
+    LineItemFrame,
+    invoice_total_findings,
+    invoice_total_findings_scalar,
+    line_tax_findings,
+    line_tax_findings_scalar,
+    tax_split_findings,
+    tax_split_findings_scalar,
+)
+
+
+def legacy_line_tax(items, tolerance=1.0):
+    # The loop RULE_004 used before the columnar path
+    findings = []
+    for item in items:
+        try:
+            taxable = float(item.get("taxable_value", 0))
+            rate = float(item.get("tax_rate", 0))
+            tax_amt = float(item.get("tax_amount", 0))
+            expected_tax = taxable * (rate / 100)
+            if abs(expected_tax - tax_amt) > tolerance:
+                findings.append((str(tax_amt), str(expected_tax)))
+        except (ValueError, TypeError):
+            pass
+    return findings
+
+
+def legacy_all_checks(data, tolerance=1.0):
+    # The same three calculation rules written as per-item loops
+    items = data["line_items"]
+    findings = legacy_line_tax(items, tolerance)
+    line_total = 0.0
+    for item in items:
+        try:
+            cgst = float(item.get("cgst_amount") or 0)
+            sgst = float(item.get("sgst_amount") or 0)
+            igst = float(item.get("igst_amount") or 0)
+            tax_amt = float(item.get("tax_amount", 0))
+            line_total += float(item.get("taxable_value", 0)) + tax_amt
+        except (ValueError, TypeError):
+            continue
+        if cgst or sgst or igst:
+            if abs(cgst + sgst + igst - tax_amt) > tolerance or abs(cgst - sgst) > tolerance:
+                findings.append((str(tax_amt), None))
+    if abs(line_total - float(data.get("total_amount") or 0)) > tolerance:
+        findings.append((str(line_total), None))
+    return findings
+
+
+def columnar_all_checks(invoices, tolerance=1.0):
+    frame = LineItemFrame(invoices)
+    return (
+        line_tax_findings(frame, tolerance),
+        tax_split_findings(frame, tolerance),
+        invoice_total_findings(frame, tolerance),
+    )
+
+
+def scalar_all_checks(invoices, tolerance=1.0):
+    # The path used below COMPLIANCE_COLUMNAR_MIN_ITEMS
+    return (
+        line_tax_findings_scalar(invoices, tolerance),
+        tax_split_findings_scalar(invoices, tolerance),
+        invoice_total_findings_scalar(invoices, tolerance),
+    )
+
+
+def make_items(n, error_rate=0.02):
+    rng = random.Random(n)
+    items = []
+    for _ in range(n):
+        taxable = round(rng.uniform(10, 100000), 2)
+        rate = rng.choice([0, 5, 12, 18, 28])
+        tax = round(taxable * rate / 100, 2)
+        if rng.random() < error_rate:
+            tax += rng.uniform(5, 500)
+        items.append({"hsn_code": "998311", "taxable_value": taxable, "tax_rate": rate, "tax_amount": tax})
+    return items
+
+
+def _best(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=7)) / number * 1000
+
+
+def main():
+    # "columnar" includes building the frame from the JSON dicts; "kernel"
+    # reuses a built frame, which is what RULE_005/RULE_006 and batch runs
+    # see since they share the conversion with RULE_004.
+    print(f"{'items':>8} {'legacy ms':>10} {'columnar ms':>12} {'kernel ms':>10} {'speedup':>8} {'kernel x':>9}")
+    for n in (10, 1_000, 100_000):
+        data = {"line_items": make_items(n)}
+        frame = LineItemFrame([data])
+        frame.taxable, frame.rate, frame.tax  # convert once
+        assert len(legacy_line_tax(data["line_items"])) == len(line_tax_findings(frame, 1.0)[0])
+
+        number = max(1, 20_000 // n)
+        legacy = _best(lambda: legacy_line_tax(data["line_items"]), number)
+        columnar = _best(lambda: line_tax_findings(LineItemFrame([data]), 1.0), number)
+        kernel = _best(lambda: line_tax_findings(frame, 1.0), number)
+        print(
+            f"{n:>8} {legacy:>10.3f} {columnar:>12.3f} {kernel:>10.3f}"
+            f" {legacy / columnar:>7.1f}x {legacy / kernel:>8.1f}x"
+        )
+
+    # RULE_004-RULE_006 together: the frame is converted once and shared
+    print()
+    print(f"{'items':>8} {'loops ms':>10} {'scalar ms':>10} {'columnar ms':>12} {'speedup':>8}  (all calculation rules)")
+    for n in (10, 1_000, 100_000):
+        items = make_items(n)
+        for item in items:
+            item["cgst_amount"] = item["sgst_amount"] = item["tax_amount"] / 2
+        data = {"total_amount": sum(i["taxable_value"] + i["tax_amount"] for i in items), "line_items": items}
+        number = max(1, 20_000 // n)
+        legacy = _best(lambda: legacy_all_checks(data), number)
+        scalar = _best(lambda: scalar_all_checks([data]), number)
+        columnar = _best(lambda: columnar_all_checks([data]), number)
+        print(f"{n:>8} {legacy:>10.3f} {scalar:>10.3f} {columnar:>12.3f} {legacy / columnar:>7.1f}x")
+
+    # Batch runs build one frame for a whole chunk of invoices
+    invoices = [{"total_amount": "0", "line_items": make_items(20)} for _ in range(500)]
+    legacy = _best(lambda: [legacy_all_checks(d) for d in invoices], 5)
+    scalar = _best(lambda: scalar_all_checks(invoices), 5)
+    columnar = _best(lambda: columnar_all_checks(invoices), 5)
+    print(f"{'500x20':>8} {legacy:>10.3f} {scalar:>10.3f} {columnar:>12.3f} {legacy / columnar:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import asyncio
+from contextlib import contextmanager
+from typing import NamedTuple, Optional
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool, StaticPool
+
+from app.api import deps
+from app.core.principal import principal_cache
+from app.db.models import Base
+from app.main import app
+
+
+@pytest.fixture(autouse=True)
+def clear_principal_cache():
+    # Tests reuse emails across separate databases
+    principal_cache.clear()
+    yield
+    principal_cache.clear()
+
+
+class AppDatabase(NamedTuple):
+    engine: Engine
+    SessionLocal: sessionmaker
+    async_engine: Optional[AsyncEngine] = None
+
+
+@contextmanager
+def _serving(SessionLocal, AsyncSessionLocal=None):
+    """Point the app's get_db (and get_async_db) at the test database,
+    restoring whatever overrides were there before."""
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def override_get_async_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    previous = dict(app.dependency_overrides)
+    app.dependency_overrides[deps.get_db] = override_get_db
+    if AsyncSessionLocal is not None:
+        app.dependency_overrides[deps.get_async_db] = override_get_async_db
+    try:
+        yield
+    finally:
+        app.dependency_overrides.clear()
+        app.dependency_overrides.update(previous)
+
+
+@pytest.fixture
+def app_db():
+    """An empty in-memory database served to the app. Modules seed it."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with _serving(SessionLocal):
+        yield AppDatabase(engine, SessionLocal)
+    engine.dispose()
+
+
+@pytest.fixture
+def app_file_db(tmp_path):
+    """Like app_db, but in a file also opened by an async engine, so the
+    async endpoints see the same data."""
+    url = f"sqlite:///{tmp_path / 'app.db'}"
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"), poolclass=NullPool)
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    with _serving(SessionLocal, AsyncSessionLocal):
+        yield AppDatabase(engine, SessionLocal, async_engine)
+    asyncio.run(async_engine.dispose())
+    engine.dispose()
@@ -0,0 +1,136 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.core import security
+from app.db.models import Invoice, InvoiceData, InvoiceHeader, InvoiceLineItem, User
+from app.services.invoice_parser import parse_invoice_text
+from app.services.normalization import normalize, parse_invoice_date
+from app.services.ocr_service import OCRResult, PageText
+
+SUPPLIER = "27AAPFU0939F1ZV"
+
+
+def invoice_text(n, day):
+    return "\n".join([
+        f"Invoice No: INV-{n}",
+        f"Invoice Date: {day}",
+        f"GSTIN: {SUPPLIER}",
+        "1 Consulting services 998311 1 1000.00 1000.00 18% 180.00 1180.00",
+        "2 Steel rods 7214 10 50.00 500.00 12% 60.00 560.00",
+        "Grand Total 1740.00",
+    ])
+
+
+@pytest.fixture
+def env(app_db):
+    SessionLocal = app_db.SessionLocal
+    db = SessionLocal()
+    db.add_all([User(id=1, email="alice@example.com", password_hash="x"), User(id=2, email="bob@example.com", password_hash="x")])
+    days = {1: "05/04/2024", 2: "20/05/2024", 3: "02/07/2024", 4: "10/04/2024", 5: "05/04/2024"}
+    for n, day in days.items():
+        db.add(Invoice(id=n, user_id=2 if n == 4 else 1, filename=f"{n}.pdf", stored_path="x",
+                       duplicate_of_id=1 if n == 5 else None))
+        db.add(InvoiceData(invoice_id=n, extracted_json=parse_invoice_text(invoice_text(n, day))))
+    db.commit()
+    db.close()
+
+    return TestClient(app), SessionLocal
+
+
+def _get(client, path, **params):
+    token = security.create_access_token(data={"sub": "alice@example.com"})
+    return client.get(f"/api/v1/analytics{path}", params=params, headers={"Authorization": f"Bearer {token}"})
+
+
+def test_normalize_types_the_extracted_fields():
+    header, lines = normalize(7, 1, parse_invoice_text(invoice_text(7, "05/04/24")))
+    assert header["supplier_gstin"] == SUPPLIER and header["invoice_number"] == "INV-7"
+    assert header["invoice_date"] == date(2024, 4, 5)
+    assert header["total_amount"] == Decimal("1740.00")
+    assert [(line["line_no"], line["hsn_code"], line["tax_amount"]) for line in lines] == [
+        (1, "998311", Decimal("180.00")), (2, "7214", Decimal("60.00")),
+    ]
+
+    # Garbage becomes NULL instead of failing the extraction
+    header, lines = normalize(8, 1, {"date": "31/02/2024", "total_amount": "n/a", "line_items": ["x", {"tax_rate": 1e9}]})
+    assert header["invoice_date"] is None and header["total_amount"] is None
+    assert len(lines) == 1 and lines[0]["tax_rate"] is None
+    assert parse_invoice_date("2024-06-30") == date(2024, 6, 30)
+
+
+def test_backfill_is_chunked_resumable_and_skips_duplicates(env):
+    from app.commands.backfill_normalized import backfill
+
+    _, SessionLocal = env
+    assert backfill(SessionLocal, chunk_size=2) == (4, 8)
+    # Already normalized
+    assert backfill(SessionLocal, chunk_size=2) == (0, 0)
+    assert backfill(SessionLocal, chunk_size=3, redo=True) == (4, 8)
+
+    db = SessionLocal()
+    assert db.query(InvoiceHeader).count() == 4
+    assert db.query(InvoiceLineItem).count() == 8
+    assert db.get(InvoiceHeader, 5) is None
+    db.close()
+
+
+def test_backfill_normalizes_duplicates_of_other_users_invoices(env):
+    from app.commands.backfill_normalized import backfill
+
+    _, SessionLocal = env
+    db = SessionLocal()
+    # Bob's copy of alice's invoice 1, linked under DEDUP_SCOPE=global
+    db.add(Invoice(id=6, user_id=2, filename="6.pdf", stored_path="x", duplicate_of_id=1))
+    db.add(InvoiceData(invoice_id=6, extracted_json=parse_invoice_text(invoice_text(6, "05/04/2024"))))
+    db.commit()
+
+    assert backfill(SessionLocal) == (5, 10)
+    assert db.get(InvoiceHeader, 6).user_id == 2
+    assert db.get(InvoiceHeader, 5) is None
+    db.close()
+
+
+def test_tax_by_hsn_and_supplier_invoices(env):
+    from app.commands.backfill_normalized import backfill
+
+    client, SessionLocal = env
+    backfill(SessionLocal)
+
+    # Q1 of FY 2024-25; invoice 3 is in July, 4 is bob's, 5 a duplicate of 1
+    body = _get(client, "/tax-by-hsn", date_from="2024-04-01", date_to="2024-06-30").json()
+    assert body["rows"] == [
+        {"hsn_code": "998311", "line_count": 2, "invoice_count": 2, "taxable_value": "2000.00", "tax_amount": "360.00"},
+        {"hsn_code": "7214", "line_count": 2, "invoice_count": 2, "taxable_value": "1000.00", "tax_amount": "120.00"},
+    ]
+
+    body = _get(client, f"/suppliers/{SUPPLIER.lower()}/invoices", limit=2).json()
+    assert body["gstin"] == SUPPLIER
+    assert body["invoice_count"] == 3 and body["total_amount"] == "5220.00"
+    assert [item["invoice_id"] for item in body["items"]] == [3, 2]
+    assert body["items"][0]["invoice_date"] == "2024-07-02"
+
+
+def test_extraction_writes_normalized_rows(env):
+    from unittest.mock import MagicMock
+    from app.services.extraction_service import ExtractionService
+
+    _, SessionLocal = env
+    db = SessionLocal()
+    service = ExtractionService(db, cache=None)
+    service.ocr = MagicMock()
+    service.ocr.read_pdf.return_value = OCRResult([PageText(1, invoice_text(1, "05/04/2024"), "layout", 0.0)])
+    service.process_invoice(1, "x")
+    # Re-extraction replaces the rows instead of adding more
+    service.process_invoice(1, "x")
+    assert db.get(InvoiceHeader, 1).invoice_date == date(2024, 4, 5)
+    assert db.query(InvoiceLineItem).filter(InvoiceLineItem.invoice_id == 1).count() == 2
+    db.close()
@@ -0,0 +1,182 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.main import app
+from app.api import deps
+from app.core import security
+from app.core.metrics import metrics
+from app.db.models import AuditLog, Base, User
+from app.services.audit_service import AuditWriter, audit_writer
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+def _count_inserts(engine):
+    inserts = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO audit_logs"):
+            inserts.append(len(parameters) if executemany else 1)
+
+    return inserts
+
+
+def test_events_are_written_in_batches(engine):
+    inserts = _count_inserts(engine)
+    writer = AuditWriter(batch_size=4, flush_interval=60, max_queue=100)
+    for i in range(10):
+        writer.record(engine, "login", "/auth/login", user_id=i, payload={"n": i})
+
+    # Two full batches go out by size; the remaining two wait for flush
+    assert writer.flush(timeout=5)
+    assert sorted(inserts, reverse=True) == [4, 4, 2]
+    with engine.connect() as conn:
+        hashes = [row.payload_hash for row in conn.execute(AuditLog.__table__.select())]
+    assert len(hashes) == 10 and all(hashes)
+    writer.shutdown()
+
+
+def test_partial_batch_is_written_after_interval(engine):
+    writer = AuditWriter(batch_size=100, flush_interval=0.05, max_queue=100)
+    writer.record(engine, "login", "/auth/login", user_id=1)
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        with engine.connect() as conn:
+            if conn.execute(AuditLog.__table__.select()).first():
+                break
+        time.sleep(0.01)
+    else:
+        pytest.fail("event not flushed within the interval")
+    writer.shutdown()
+
+
+def test_shutdown_drains_queue(engine):
+    writer = AuditWriter(batch_size=1000, flush_interval=60, max_queue=1000)
+    for i in range(50):
+        writer.record(engine, "login", "/auth/login", user_id=i)
+    writer.shutdown(timeout=5)
+    with engine.connect() as conn:
+        assert len(conn.execute(AuditLog.__table__.select()).all()) == 50
+
+
+def test_full_queue_drops_instead_of_blocking(engine, monkeypatch):
+    writer = AuditWriter(batch_size=10, flush_interval=60, max_queue=2, overflow_policy="drop")
+    # Stalled writer thread: nothing drains the queue
+    monkeypatch.setattr(writer, "_ensure_started", lambda: None)
+    dropped = metrics.get("audit_events_dropped")
+    started = time.perf_counter()
+    for i in range(5):
+        writer.record(engine, "login", "/auth/login", user_id=i)
+    assert time.perf_counter() - started < 0.5
+    assert metrics.get("audit_events_dropped") == dropped + 3
+
+
+def test_full_queue_never_blocks_the_event_loop(engine, monkeypatch):
+    import asyncio
+
+    writer = AuditWriter(batch_size=10, flush_interval=60, max_queue=2, overflow_policy="block", enqueue_timeout=1.0)
+    monkeypatch.setattr(writer, "_ensure_started", lambda: None)
+    dropped = metrics.get("audit_events_dropped")
+
+    async def handler():
+        for i in range(5):
+            writer.record(engine, "login", "/auth/login", user_id=i)
+
+    started = time.perf_counter()
+    asyncio.run(handler())
+    assert time.perf_counter() - started < 0.5
+    assert metrics.get("audit_events_dropped") == dropped + 3
+
+
+def test_endpoints_record_events(engine):
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    db = SessionLocal()
+    admin = User(id=1, email="root@example.com", password_hash="x", role="admin")
+    db.add_all([admin, User(id=2, email="ops@example.com", password_hash="x", role="user")])
+    db.commit()
+    token = security.create_access_token(data=security.user_token_claims(admin))
+
+    previous = dict(app.dependency_overrides)
+    app.dependency_overrides[deps.get_db] = override_get_db
+    try:
+        client = TestClient(app)
+        response = client.put(
+            "/api/v1/auth/users/2/role", json={"role": "admin"}, headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 200
+    finally:
+        app.dependency_overrides.clear()
+        app.dependency_overrides.update(previous)
+
+    assert audit_writer.flush(timeout=5)
+    log = db.query(AuditLog).filter(AuditLog.event == "role_changed").one()
+    assert log.user_id == 1 and log.endpoint == "/auth/users/{user_id}/role" and log.payload_hash
+    db.close()
+
+
+def test_payload_digest_is_canonical_and_stable_across_processes():
+    import subprocess
+    from app.utils.digest import payload_digest
+
+    assert payload_digest({"b": 1, "a": [1, 2]}) == payload_digest({"a": [1, 2], "b": 1})
+    assert payload_digest({}) is None
+    script = "from app.utils.digest import payload_digest; print(payload_digest({'a': [1, 2], 'b': 1}))"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    outputs = {
+        subprocess.run(
+            [sys.executable, "-c", script], cwd=root, capture_output=True, text=True,
+            env=dict(os.environ, PYTHONHASHSEED=seed),
+        ).stdout.strip()
+        for seed in ("1", "2")
+    }
+    assert outputs == {payload_digest({"b": 1, "a": [1, 2]})}
+
+
+def test_hash_chain_detects_edits_and_deletions(engine):
+    from app.services.audit_service import AuditService
+
+    SessionLocal = sessionmaker(bind=engine)
+    writer = AuditWriter(batch_size=3, flush_interval=60, max_queue=100, hash_chain=True)
+    for i in range(7):
+        writer.record(engine, "login", "/auth/login", user_id=i, payload={"n": i}, token_cost=0.5)
+    writer.shutdown(timeout=5)
+
+    db = SessionLocal()
+    result = AuditService.verify_chain(db, batch_size=2)
+    assert result.ok and result.checked == 7
+
+    db.query(AuditLog).filter(AuditLog.id == 4).update({AuditLog.event: "logout"})
+    db.commit()
+    result = AuditService.verify_chain(db)
+    assert not result.ok and result.broken_at == 4
+
+    db.query(AuditLog).filter(AuditLog.id == 4).update({AuditLog.event: "login"})
+    db.query(AuditLog).filter(AuditLog.id == 6).delete()
+    db.commit()
+    result = AuditService.verify_chain(db)
+    assert not result.ok and result.broken_at == 7
+    db.close()
@@ -0,0 +1,173 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.api import deps
+from app.core import security
+from app.core.metrics import metrics
+from app.db.models import User
+
+
+@pytest.fixture
+def env(app_db):
+    SessionLocal = app_db.SessionLocal
+    db = SessionLocal()
+    root = User(id=1, email="root@example.com", password_hash="x", role="admin")
+    ops = User(id=2, email="ops@example.com", password_hash="x", role="admin")
+    db.add_all([root, ops])
+    db.commit()
+
+    yield TestClient(app), {u.email: security.create_access_token(data=security.user_token_claims(u)) for u in (root, ops)}
+    db.close()
+
+
+class SharedRedis:
+    """RedisManager stand-in whose client is a dict shared by every cache."""
+
+    def __init__(self):
+        self.values = {}
+
+    def is_available(self):
+        return True
+
+    def client(self):
+        return self
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = str(value).encode()
+
+
+@pytest.fixture
+def trusted(monkeypatch):
+    from app.core.principal import principal_cache
+
+    shared = SharedRedis()
+    monkeypatch.setattr("app.core.config.settings.AUTH_TRUST_TOKEN_CLAIMS", True)
+    monkeypatch.setattr(principal_cache, "manager", shared)
+    return shared
+
+
+def _audit(client, token):
+    return client.get("/api/v1/audit/runs/some-run", headers={"Authorization": f"Bearer {token}"})
+
+
+def test_claims_token_needs_no_user_lookup(env, trusted):
+    client, tokens = env
+    lookups, hits = metrics.get("auth_db_lookups"), metrics.get("auth_cache_hits")
+    assert _audit(client, tokens["ops@example.com"]).status_code == 200
+    assert _audit(client, tokens["ops@example.com"]).status_code == 200
+    assert metrics.get("auth_db_lookups") == lookups
+    assert metrics.get("auth_cache_hits") == hits + 1
+
+
+def test_legacy_token_is_looked_up_once(env):
+    client, _ = env
+    token = security.create_access_token(data={"sub": "ops@example.com"})
+    lookups = metrics.get("auth_db_lookups")
+    for _ in range(3):
+        assert _audit(client, token).status_code == 200
+    assert metrics.get("auth_db_lookups") == lookups + 1
+
+
+def test_role_change_invalidates_cached_principal(env):
+    client, tokens = env
+    ops_token = tokens["ops@example.com"]
+    assert _audit(client, ops_token).status_code == 200
+
+    response = client.put(
+        "/api/v1/auth/users/2/role", json={"role": "user"},
+        headers={"Authorization": f"Bearer {tokens['root@example.com']}"},
+    )
+    assert response.status_code == 200 and response.json()["role"] == "user"
+
+    # The old token still says admin, but its claims predate the change
+    assert _audit(client, ops_token).status_code == 400
+
+
+def _login(client, email, password):
+    return client.post("/api/v1/auth/login", data={"username": email, "password": password})
+
+
+def test_login_upgrades_hash_when_cost_changes(env, monkeypatch):
+    from passlib.context import CryptContext
+    from app.db.models import User as UserModel
+
+    client, _ = env
+    db = next(app.dependency_overrides[deps.get_db]())
+    db.add(UserModel(id=3, email="old@example.com", password_hash=CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("pw")))
+    db.commit()
+
+    monkeypatch.setattr("app.utils.hashing.pwd_context", CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=5))
+    assert _login(client, "old@example.com", "wrong").status_code == 400
+    response = _login(client, "old@example.com", "pw")
+    assert response.status_code == 200 and response.json()["access_token"]
+
+    db.expire_all()
+    new_hash = db.query(UserModel.password_hash).filter(UserModel.id == 3).scalar()
+    assert new_hash.startswith("$2b$05$")
+    assert _login(client, "old@example.com", "pw").status_code == 200
+    db.close()
+
+
+def test_login_is_rejected_fast_when_hash_pool_is_full(env, monkeypatch):
+    from app.utils.hashing import PasswordHashPool
+
+    client, _ = env
+    monkeypatch.setattr("app.api.auth.password_pool", PasswordHashPool(workers=1, max_pending=0))
+    response = _login(client, "ops@example.com", "anything")
+    assert response.status_code == 503 and response.headers["Retry-After"] == "1"
+
+
+def test_unusable_password_never_verifies():
+    from app.utils.hashing import Hasher
+
+    assert Hasher.verify_and_update("", Hasher.unusable_password()) == (False, None)
+    assert Hasher.verify_password("x", "not-a-hash") is False
+
+
+def test_claims_revoked_in_another_process_are_not_trusted(trusted):
+    import time
+    from app.core.principal import PrincipalCache
+
+    here, elsewhere = PrincipalCache(60, 100, trusted), PrincipalCache(60, 100, trusted)
+    issued = time.time() - 1
+    assert not here.claims_revoked(2, issued)
+    elsewhere.invalidate_user(2)
+    assert here.claims_revoked(2, issued)
+    assert not here.claims_revoked(2, time.time() + 1)
+
+
+def test_claims_are_not_trusted_without_redis(monkeypatch):
+    from unittest.mock import MagicMock
+    from app.core.principal import PrincipalCache
+
+    manager = MagicMock()
+    manager.is_available.return_value = False
+    assert PrincipalCache(60, 100, manager).claims_revoked(2, 0.0)
+
+
+def test_admin_routes_recheck_the_role(env):
+    client, tokens = env
+    ops_token = tokens["ops@example.com"]
+    assert _audit(client, ops_token).status_code == 200
+    # Demoted by another process: this one's cached principal is stale
+    db = next(app.dependency_overrides[deps.get_db]())
+    db.query(User).filter(User.id == 2).update({"role": "user"})
+    db.commit()
+    db.close()
+    assert _audit(client, ops_token).status_code == 400
+
+
+def test_worker_metrics_are_admin_only(env):
+    client, tokens = env
+    assert client.get("/metrics/workers").status_code == 401
+    response = client.get("/metrics/workers", headers={"Authorization": f"Bearer {tokens['root@example.com']}"})
+    assert response.status_code == 200
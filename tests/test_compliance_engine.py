@@ -0,0 +1,336 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.models import Base, Invoice, InvoiceData, Rule, Run, User, Violation, RunStatus
+from app.services.batch_compliance import BatchComplianceService
+from app.services.compliance_engine import ComplianceEngine
+from app.services.rule_engine import RuleRegistry, compile_rule
+from app.services.tax_reconciliation import (
+    LineItemFrame,
+    invoice_total_findings,
+    invoice_total_findings_scalar,
+    line_tax_findings,
+    line_tax_findings_scalar,
+    tax_split_findings,
+    tax_split_findings_scalar,
+)
+
+
+def _columnar(findings):
+    return lambda invoices, tolerance: findings(LineItemFrame(invoices), tolerance)
+
+
+# Each calculation as (columnar, scalar); both must agree on every input
+LINE_TAX = [_columnar(line_tax_findings), line_tax_findings_scalar]
+TAX_SPLIT = [_columnar(tax_split_findings), tax_split_findings_scalar]
+INVOICE_TOTAL = [_columnar(invoice_total_findings), invoice_total_findings_scalar]
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    session.add(User(id=1, email="rules@example.com", password_hash="x"))
+    session.commit()
+    yield session
+    session.close()
+
+
+def _run(db, run_id="run-1"):
+    run = Run(run_id=run_id, user_id=1, status=RunStatus.RUNNING)
+    db.add(run)
+    db.commit()
+    return run
+
+
+def _count_queries(db):
+    counter = {"n": 0}
+
+    @event.listens_for(db.get_bind(), "before_cursor_execute")
+    def _count(*args, **kwargs):
+        counter["n"] += 1
+
+    return counter
+
+
+def test_registry_seeds_default_rules(db):
+    registry = RuleRegistry(ttl_seconds=60)
+    ruleset = registry.get(db)
+    assert [r.rule_id for r in ruleset.rules] == ["RULE_001", "RULE_002", "RULE_003", "RULE_004", "RULE_005", "RULE_006"]
+    assert db.query(Rule).count() == 6
+
+
+def test_seeding_leaves_the_callers_transaction_alone(db):
+    db.add(User(id=2, email="pending@example.com", password_hash="x"))
+    RuleRegistry(ttl_seconds=60).get(db)
+    # Neither committed nor rolled back by the seeding
+    assert db.get(User, 2) is not None
+    db.rollback()
+    assert db.get(User, 2) is None
+
+
+def test_deleted_default_rules_are_not_reseeded(db):
+    from app.services.rule_engine import seed_default_rules
+
+    assert seed_default_rules(db)
+    db.query(Rule).filter(Rule.rule_id == "RULE_003").delete()
+    db.commit()
+    assert not seed_default_rules(db)
+    ruleset = RuleRegistry(ttl_seconds=60).get(db)
+    assert "RULE_003" not in [r.rule_id for r in ruleset.rules]
+    assert db.query(Rule).count() == 5
+
+
+def test_legacy_standard_rules_fall_back_to_defaults(db):
+    db.add(Rule(rule_id="RULE_002", title="Invalid GSTIN Format", severity="low", check_type="standard"))
+    db.commit()
+    ruleset = RuleRegistry(ttl_seconds=60).get(db)
+    rule = next(r for r in ruleset.rules if r.rule_id == "RULE_002")
+    assert rule.check_type == "regex"
+    assert rule.severity == "low"
+
+
+def test_violations_match_previous_engine(db):
+    run = _run(db)
+    data = {
+        "gstin": "BADGSTIN",
+        "line_items": [
+            {"hsn_code": "998311", "taxable_value": 1000, "tax_rate": 18, "tax_amount": 180},
+            {"hsn_code": "", "taxable_value": 500, "tax_rate": 18, "tax_amount": 50},
+            {"hsn_code": "1234", "taxable_value": "n/a", "tax_rate": 18, "tax_amount": 5},
+        ],
+    }
+    ComplianceEngine(db, RuleRegistry(ttl_seconds=60)).run_compliance_checks(run, data)
+
+    found = sorted((v.rule_id, v.detected_value, v.expected_value) for v in db.query(Violation).all())
+    assert found == [
+        ("RULE_002", "BADGSTIN", "Valid Regex"),
+        ("RULE_003", "Missing", "Present"),
+        ("RULE_004", "50.0", "90.0"),
+    ]
+    assert run.status == RunStatus.COMPLETED
+
+
+def test_no_per_violation_queries(db):
+    registry = RuleRegistry(ttl_seconds=60)
+    registry.get(db)
+    run = _run(db)
+    items = [{"hsn_code": "", "taxable_value": 100, "tax_rate": 18, "tax_amount": 0} for _ in range(250)]
+
+    counter = _count_queries(db)
+    ComplianceEngine(db, registry).run_compliance_checks(run, {"gstin": None, "line_items": items})
+
+    assert db.query(Violation).count() == 252
+    # Run refresh, batched violation inserts, run update, one upsert each
+    # into the monthly and per-rule summaries and the count above; rules
+    # come from the cache and nothing scales with the violation count.
+    assert counter["n"] <= 7
+
+
+def test_ruleset_recompiles_only_on_change(db):
+    registry = RuleRegistry(ttl_seconds=0)
+    first = registry.get(db)
+    assert registry.get(db) is first
+
+    rule = db.query(Rule).filter(Rule.rule_id == "RULE_004").first()
+    rule.meta = {"formula": "line_tax", "tolerance": 100.0}
+    db.commit()
+
+    second = registry.get(db)
+    assert second is not first
+    assert second.version != first.version
+
+
+def test_invalid_rule_is_skipped():
+    with pytest.raises(ValueError):
+        compile_rule("RULE_X", "Bad", "low", "regex", {"field": "gstin", "pattern": "("})
+
+
+def test_batch_evaluates_owned_processed_invoices(db, monkeypatch):
+    monkeypatch.setattr("app.core.config.settings.COMPLIANCE_BATCH_CHUNK_SIZE", 2)
+    db.add(User(id=2, email="other@example.com", password_hash="x"))
+    for invoice_id, user_id, data in [
+        (1, 1, {"gstin": None, "line_items": []}),
+        (2, 1, {"gstin": "29ABCDE1234F1Z5", "line_items": []}),
+        (3, 1, None),  # not extracted yet
+        (4, 2, {"gstin": None, "line_items": []}),  # someone else's
+        (5, 1, {"gstin": "BAD", "line_items": []}),
+    ]:
+        db.add(Invoice(id=invoice_id, user_id=user_id, filename=f"{invoice_id}.pdf", stored_path="x"))
+        if data is not None:
+            db.add(InvoiceData(invoice_id=invoice_id, extracted_json=data))
+    db.commit()
+
+    service = BatchComplianceService(db, RuleRegistry(ttl_seconds=60))
+    batch = service.run_batch(1, service.resolve_invoice_ids(1, invoice_ids=[1, 2, 3, 4, 5]))
+
+    assert (batch.invoice_count, batch.skipped_count, batch.violation_count) == (3, 2, 2)
+    results = service.get_results(batch.batch_id)
+    assert [(r["invoice_id"], r["violation_count"]) for r in results] == [(1, 1), (2, 0), (5, 1)]
+    assert [r["invoice_id"] for r in service.get_results(batch.batch_id, skip=1, limit=1)] == [2]
+
+
+def test_runs_do_not_recount_extraction_spend(db):
+    db.add(Invoice(id=1, user_id=1, filename="1.pdf", stored_path="x"))
+    db.add(InvoiceData(invoice_id=1, extracted_json={"gstin": None, "line_items": []}, token_cost=0.25))
+    db.commit()
+
+    service = BatchComplianceService(db, RuleRegistry(ttl_seconds=60))
+    for _ in range(2):
+        service.run_batch(1, [1])
+    ComplianceEngine(db).stage_runs([(1, 1, {"gstin": None, "line_items": []})])
+    db.commit()
+
+    assert [run.token_cost for run in db.query(Run).all()] == [0.0, 0.0, 0.0]
+    assert db.query(InvoiceData).one().token_cost == 0.25
+
+
+@pytest.mark.parametrize("line_tax", LINE_TAX, ids=["columnar", "scalar"])
+def test_line_tax_across_invoices_with_decimal_fallback(line_tax):
+    invoices = [
+        {"line_items": [
+            {"taxable_value": 1000, "tax_rate": 18, "tax_amount": 180},
+            {"taxable_value": "1,000.00", "tax_rate": "18", "tax_amount": "150"},
+        ]},
+        {"line_items": []},
+        {"line_items": [
+            {"taxable_value": None, "tax_rate": 18, "tax_amount": 5},
+            # Exactly on the tolerance boundary: 0.1 + 0.2 style float noise must not flag it
+            {"taxable_value": 0.3, "tax_rate": 100, "tax_amount": 1.3},
+            {"taxable_value": 200, "tax_rate": 5, "tax_amount": 20},
+        ]},
+    ]
+    findings = line_tax(invoices, tolerance=1.0)
+    assert findings == [[("150.0", "180.0")], [], [("20.0", "10.0")]]
+
+
+@pytest.mark.parametrize("tax_split,invoice_total", list(zip(TAX_SPLIT, INVOICE_TOTAL)), ids=["columnar", "scalar"])
+def test_tax_split_and_invoice_total(tax_split, invoice_total):
+    invoices = [
+        {
+            "total_amount": "1180.00",
+            "cgst_amount": 90, "sgst_amount": 90,
+            "line_items": [{"taxable_value": 1000, "tax_rate": 18, "tax_amount": 180, "cgst_amount": 90, "sgst_amount": 90}],
+        },
+        {
+            "total_amount": "2000.00",
+            "igst_amount": 180,
+            "line_items": [{"taxable_value": 1000, "tax_rate": 18, "tax_amount": 180, "cgst_amount": 100, "sgst_amount": 80}],
+        },
+        {
+            "total_amount": "1180.00",
+            "line_items": [{"taxable_value": 1000, "tax_rate": 18, "tax_amount": 180, "igst_amount": 90, "cgst_amount": 45, "sgst_amount": 45}],
+        },
+    ]
+    split = tax_split(invoices, tolerance=1.0)
+    assert split[0] == []
+    assert [expected for _, expected in split[1]] == ["CGST equal to SGST"]
+    assert [expected for _, expected in split[2]] == ["Either IGST or CGST + SGST"]
+
+    totals = invoice_total(invoices, tolerance=1.0)
+    assert totals == [[], [("2000.0", "1180.0")], []]
+
+
+def test_scalar_and_columnar_paths_agree_on_messy_items(monkeypatch):
+    import random
+    from app.services.rule_engine import DEFAULT_RULES, RuleSet, compile_rule
+
+    rng = random.Random(7)
+    values = [0, 18, 180, "1,000.00", "n/a", None, 0.3, 1.3, 100, 90.5, "90.5", True]
+    invoices = []
+    for _ in range(200):
+        items = [
+            {field: rng.choice(values) for field in
+             ("taxable_value", "tax_rate", "tax_amount", "cgst_amount", "sgst_amount", "igst_amount") if rng.random() < 0.9}
+            for _ in range(rng.randint(0, 6))
+        ]
+        invoices.append({"total_amount": rng.choice(values), "cgst_amount": rng.choice(values), "line_items": items})
+
+    ruleset = RuleSet("v", [compile_rule(r["rule_id"], r["title"], r["severity"], r["check_type"], r["meta"]) for r in DEFAULT_RULES])
+    monkeypatch.setattr("app.core.config.settings.COMPLIANCE_COLUMNAR_MIN_ITEMS", 0)
+    columnar = ruleset.evaluate_many(invoices)
+    monkeypatch.setattr("app.core.config.settings.COMPLIANCE_COLUMNAR_MIN_ITEMS", 10 ** 9)
+    assert ruleset.evaluate_many(invoices) == columnar
+
+
+def test_missing_indexes_are_added_to_existing_tables():
+    from sqlalchemy import inspect, text
+    from app.db.base import create_missing_indexes
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    # A database created before violations.run_id was indexed
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_violations_run_id"))
+
+    create_missing_indexes(engine)
+    create_missing_indexes(engine)
+    assert "ix_violations_run_id" in {index["name"] for index in inspect(engine).get_indexes("violations")}
+
+
+def test_schema_upgrade_adds_new_columns_to_existing_tables():
+    from sqlalchemy import inspect, text
+    from app.db.base import upgrade_schema
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    # The tables as the first release created them
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE invoices (id INTEGER PRIMARY KEY, user_id INTEGER, filename VARCHAR NOT NULL, "
+            "stored_path VARCHAR NOT NULL, invoice_hash VARCHAR, status VARCHAR, uploaded_at DATETIME)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE invoice_data (id INTEGER PRIMARY KEY, invoice_id INTEGER, extracted_json JSON, "
+            "extracted_text TEXT, extraction_quality FLOAT)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE runs (run_id VARCHAR PRIMARY KEY, user_id INTEGER, invoice_id INTEGER, status VARCHAR, "
+            "start_ts DATETIME, end_ts DATETIME, token_cost FLOAT)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE audit_logs (id INTEGER PRIMARY KEY, run_id VARCHAR, user_id INTEGER, endpoint VARCHAR, "
+            "event VARCHAR, payload_hash VARCHAR, response_hash VARCHAR, token_cost FLOAT, timestamp DATETIME)"
+        ))
+        conn.execute(text("INSERT INTO invoices (id, user_id, filename, stored_path, status) VALUES (1, 1, 'a.pdf', '/a', 'uploaded')"))
+        conn.execute(text("INSERT INTO invoice_data (id, invoice_id, extraction_quality) VALUES (1, 1, 0.9)"))
+
+    upgrade_schema(engine)
+    upgrade_schema(engine)
+
+    inspector = inspect(engine)
+    for table in ("invoices", "invoice_data", "runs", "audit_logs"):
+        assert {column["name"] for column in inspector.get_columns(table)} == set(Base.metadata.tables[table].columns.keys())
+    assert "ix_invoices_status_lease" in {index["name"] for index in inspector.get_indexes("invoices")}
+
+    db = sessionmaker(bind=engine)()
+    invoice = db.query(Invoice).one()
+    assert invoice.lease_expires_at is None and invoice.data.extraction_quality == 0.9
+    db.close()
+
+
+def test_batch_result_limits_are_bounded(db):
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.api import deps
+    from app.core.principal import Principal
+
+    previous = dict(app.dependency_overrides)
+    app.dependency_overrides[deps.get_db] = lambda: db
+    app.dependency_overrides[deps.get_current_user] = lambda: Principal(id=1, email="rules@example.com", role="user")
+    try:
+        client = TestClient(app)
+        assert client.post("/api/v1/compliance/batches", params={"limit": 501}, json={"invoice_ids": [1]}).status_code == 422
+        assert client.get("/api/v1/compliance/batches/missing", params={"limit": 0}).status_code == 422
+        assert client.get("/api/v1/compliance/batches/missing", params={"skip": -1}).status_code == 422
+        assert client.get("/api/v1/compliance/batches/missing", params={"limit": 500}).status_code == 404
+    finally:
+        app.dependency_overrides.clear()
+        app.dependency_overrides.update(previous)
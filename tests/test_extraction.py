@@ -0,0 +1,350 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.ocr_service import OCRResult, OCRService, PageText
+
+
+def make_pdf(pages):
+    """Minimal PDF with one Helvetica text line per page."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>"
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+
+def test_parallel_extraction_keeps_page_order(tmp_path, monkeypatch):
+    pdf = tmp_path / "bundle.pdf"
+    pdf.write_bytes(make_pdf([f"Invoice page number {n} of the bundle" for n in range(1, 11)]))
+    monkeypatch.setattr("app.core.config.settings.OCR_PROCESS_WORKERS", 2)
+    monkeypatch.setattr("app.core.config.settings.OCR_PARALLEL_MIN_PAGES", 4)
+    monkeypatch.setattr("app.core.config.settings.OCR_PAGES_PER_TASK", 3)
+    monkeypatch.setattr("app.core.config.settings.OCR_MAX_TASKS_PER_JOB", 2)
+    try:
+        result = OCRService.extract_pdf(str(pdf))
+    finally:
+        OCRService.shutdown_pool()
+
+    assert [page.page_number for page in result.pages] == list(range(1, 11))
+    assert all(page.method == "text_layer" and page.elapsed_ms >= 0 for page in result.pages)
+    assert result.text.splitlines()[0].strip() == "Invoice page number 1 of the bundle"
+    # Measured in the pool processes and carried back with the pages
+    assert result.cpu_ms > 0
+
+
+def test_pool_workers_start_while_pdfium_is_locked(tmp_path, monkeypatch):
+    from app.services import ocr_service
+    from app.services.ocr_service import extract_page_range
+
+    pdf = tmp_path / "locked.pdf"
+    pdf.write_bytes(make_pdf(["Invoice page read by a fresh worker process"]))
+    monkeypatch.setattr("app.core.config.settings.OCR_PROCESS_WORKERS", 2)
+    try:
+        # Another thread is inside PDFium when the pool starts its workers
+        with ocr_service._pdfium_lock:
+            future = OCRService._get_pool().submit(extract_page_range, str(pdf), 0, 1, True, 10)
+        pages = future.result(timeout=60)
+    finally:
+        OCRService.shutdown_pool()
+    assert pages[0].text.strip() == "Invoice page read by a fresh worker process"
+
+
+def test_short_text_layer_falls_back_to_layout(tmp_path):
+    pdf = tmp_path / "short.pdf"
+    pdf.write_bytes(make_pdf(["Hi"]))
+    result = OCRService.extract_pdf(str(pdf))
+    assert [(page.method, page.text.strip()) for page in result.pages] == [("layout", "Hi")]
+
+
+def test_concurrent_in_process_extraction(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    paths = []
+    for n in range(8):
+        pdf = tmp_path / f"{n}.pdf"
+        pdf.write_bytes(make_pdf([f"Invoice {n} page {p} from a request thread" for p in range(1, 4)]))
+        paths.append(str(pdf))
+    # Request and worker threads share PDFium, which must see one call at a time
+    with ThreadPoolExecutor(max_workers=8) as threads:
+        results = list(threads.map(OCRService.extract_pdf, paths * 4))
+    for n, result in enumerate(results):
+        assert result.text.splitlines()[0].strip() == f"Invoice {n % 8} page 1 from a request thread"
+
+
+def test_unreadable_pdf_returns_empty_text(tmp_path):
+    pdf = tmp_path / "broken.pdf"
+    pdf.write_bytes(b"%PDF-1.4 header dummy content")
+    assert OCRService.extract_text_from_pdf(str(pdf)) == ""
+
+
+def test_extraction_cache_reparses_from_cached_text(tmp_path, monkeypatch):
+    from unittest.mock import MagicMock
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    from app.db.models import Base, Invoice, InvoiceData, User
+    from app.services.extraction_cache import DiskLRUStore, ExtractionCache
+    from app.services.extraction_service import ExtractionService
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add(User(id=1, email="alice@example.com", password_hash="x"))
+    db.add(Invoice(id=1, user_id=1, filename="a.pdf", stored_path="unused", invoice_hash="ab" * 32))
+    db.commit()
+
+    cache = ExtractionCache(DiskLRUStore(tmp_path / "cache", max_bytes=1_000_000))
+    service = ExtractionService(db, cache=cache)
+    service.ocr = MagicMock()
+    service.ocr.read_pdf.return_value = OCRResult([PageText(1, "Invoice No: INV-7\nTotal: 500.00", "layout", 1.0, 40.0)])
+
+    data = service.process_invoice(1, "unused", "ab" * 32)
+    first, cpu_ms = data.extracted_json, data.extraction_cpu_ms
+    assert cpu_ms >= 40.0
+    # Nothing was extracted again, so no CPU is attributed to it
+    data = service.process_invoice(1, "unused", "ab" * 32)
+    assert data.extracted_json == first and data.extraction_cpu_ms == 0.0
+    assert service.ocr.read_pdf.call_count == 1
+    assert db.query(InvoiceData).count() == 1
+
+    # A parser upgrade re-parses the cached text without reading the PDF again
+    monkeypatch.setattr("app.services.invoice_parser.PARSER_VERSION", "heuristic-next")
+    monkeypatch.setattr("app.services.invoice_parser.parse_invoice_text", lambda text: {"parsed": text.splitlines()[0]})
+    assert service.process_invoice(1, "unused", "ab" * 32).extracted_json == {"parsed": "Invoice No: INV-7"}
+    assert service.ocr.read_pdf.call_count == 1
+    db.close()
+
+
+def test_disk_store_evicts_least_recently_used(tmp_path):
+    import os
+    from app.services.extraction_cache import DiskLRUStore
+
+    store = DiskLRUStore(tmp_path, max_bytes=1000)
+    for n, key in enumerate(["aa01", "aa02", "aa03"]):
+        store.put(key, b"x" * 100)
+        os.utime(tmp_path / "aa" / key, (n, n))
+    os.utime(tmp_path / "aa" / "aa01", (10, 10))  # recently read
+
+    store.max_bytes = 250
+    store.put("aa04", b"x" * 100)
+    assert store.get("aa02") is None and store.get("aa03") is None
+    assert store.get("aa01") is not None and store.get("aa04") is not None
+
+
+def test_disk_store_overwrite_replaces_the_entry_size(tmp_path):
+    from app.services.extraction_cache import DiskLRUStore
+
+    store = DiskLRUStore(tmp_path, max_bytes=1000)
+    store.put("aa01", b"x" * 100)
+    for _ in range(5):
+        store.put("aa02", b"y" * 100)
+    # Rewriting the same key does not grow the store towards its cap
+    assert store._size == 200
+
+
+def test_parser_reads_header_totals_and_line_items():
+    from app.services.invoice_parser import parse_invoice_text
+
+    text = "\n".join([
+        "Invoice Number: KA/2024/0042     Invoice Date: 05-04-2024",
+        "Supplier GSTIN: 29ABCDE1234F1Z5",
+        "Buyer GSTIN: 27pqrsx6789k1z2",
+        "Sr  Description          HSN     Qty  Taxable    CGST  Amt     SGST  Amt     Total",
+        "1   Consulting services  998311  1    10,000.00  9%    900.00  9%    900.00  11,800.00",
+        "2   Laptop bag           4202    2    2000.00    18    360.00  2360.00",
+        "Sub Total: 12,000.00",
+        "CGST @ 9%: 900.00",
+        "SGST @ 9%: 900.00",
+        "IGST: 360.00",
+        "Total Tax: 2160",
+        "Grand Total: 14,160.00",
+    ])
+    data = parse_invoice_text(text)
+
+    assert data["invoice_number"] == "KA/2024/0042"
+    assert data["date"] == "05-04-2024"
+    assert data["gstin"] == "29ABCDE1234F1Z5"
+    assert data["gstins"] == ["29ABCDE1234F1Z5", "27PQRSX6789K1Z2"]
+    assert (data["taxable_value"], data["total_amount"]) == ("12000.00", "14160.00")
+    assert (data["cgst_amount"], data["sgst_amount"], data["igst_amount"]) == ("900.00", "900.00", "360.00")
+    assert data["line_items"] == [
+        {"description": "Consulting services", "hsn_code": "998311", "taxable_value": 10000.0,
+         "tax_rate": 18.0, "tax_amount": 1800.0, "cgst_amount": 900.0, "sgst_amount": 900.0},
+        {"description": "Laptop bag", "hsn_code": "4202", "taxable_value": 2000.0,
+         "tax_rate": 18.0, "tax_amount": 360.0},
+    ]
+
+
+def test_parser_without_line_items_invents_none():
+    from app.services.invoice_parser import parse_invoice_text
+
+    data = parse_invoice_text("Invoice No: INV-001\nGSTIN: 29ABCDE1234F1Z5\nDate: 12/12/2023\nTotal: 1,000.00")
+    assert (data["invoice_number"], data["date"], data["total_amount"]) == ("INV-001", "12/12/2023", "1000.00")
+    assert data["line_items"] == []
+    assert parse_invoice_text("")["total_amount"] == "0.00"
+
+
+def test_llm_client_batches_under_concurrency_limit():
+    import asyncio
+    from app.services.llm_providers import LLMClient, StubProvider
+
+    provider = StubProvider(latency_ms=30, max_batch_size=4)
+    in_flight, peak = 0, 0
+    complete_batch = provider.complete_batch
+
+    async def tracked(texts):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            return await complete_batch(texts)
+        finally:
+            in_flight -= 1
+
+    provider.complete_batch = tracked
+    client = LLMClient(provider, max_concurrency=2)
+    try:
+        texts = [f"Invoice No: INV-{n}\nTotal: {n}00.00" for n in range(14)]
+        results = client.run(client.extract_many(texts))
+    finally:
+        client.close()
+
+    assert provider.calls == 4 and peak == 2
+    assert [r.data["invoice_number"] for r in results] == [f"INV-{n}" for n in range(14)]
+    assert all(r.usage.prompt_tokens > 0 and r.usage.cost > 0 for r in results)
+
+
+def test_failed_batch_is_retried_per_invoice():
+    import pytest
+    from app.services.llm_providers import LLMClient, LLMProvider, LLMResult
+
+    with pytest.raises(TypeError):
+        LLMProvider()
+
+    class Flaky(LLMProvider):
+        name = "flaky"
+        max_batch_size = 4
+
+        def __init__(self):
+            self.batches = []
+
+        async def complete_batch(self, texts):
+            self.batches.append(len(texts))
+            if "poison" in texts[0]:
+                raise ValueError("model refused")
+            # Drops one invoice when given several
+            return [LLMResult({"text": text}) for text in texts[:1 if len(texts) == 1 else -1]]
+
+    provider = Flaky()
+    client = LLMClient(provider, max_concurrency=4)
+    try:
+        results = client.run(client.extract_many(["a", "poison", "c"], return_exceptions=True))
+        with pytest.raises(ValueError):
+            client.run(client.extract_many(["poison"]))
+    finally:
+        client.close()
+
+    assert provider.batches[0] == 3 and sorted(provider.batches[1:4]) == [1, 1, 1]
+    assert results[0].data == {"text": "a"} and results[2].data == {"text": "c"}
+    assert isinstance(results[1], ValueError)
+
+
+def test_openai_provider_retries_and_splits_usage():
+    import json
+    import httpx
+    from tenacity import wait_none
+    from app.services.llm_providers import LLMClient, OpenAICompatibleProvider
+
+    calls = []
+
+    def handler(request):
+        calls.append(json.loads(request.content))
+        if len(calls) == 1:
+            return httpx.Response(429)
+        content = json.dumps({"invoices": [{"invoice_number": "A"}, {"invoice_number": "B"}]})
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": content}}],
+            "usage": {"prompt_tokens": 300, "completion_tokens": 30},
+        })
+
+    provider = OpenAICompatibleProvider("http://llm.test/v1", "key", "test-model", 8, 5, 3)
+    provider.retry_wait = wait_none()
+    provider.client = httpx.AsyncClient(base_url="http://llm.test/v1", transport=httpx.MockTransport(handler))
+    client = LLMClient(provider, max_concurrency=1)
+    try:
+        first, second = client.run(client.extract_many(["x" * 200, "y" * 100]))
+    finally:
+        client.close()
+
+    assert len(calls) == 2 and "### Document 2" in calls[1]["messages"][1]["content"]
+    assert (first.data, second.data) == ({"invoice_number": "A"}, {"invoice_number": "B"})
+    assert (first.usage.prompt_tokens, second.usage.prompt_tokens) == (200, 100)
+    assert abs(first.usage.cost - 2 * second.usage.cost) < 1e-12
+    assert provider.version == "openai:test-model:prompt-1"
+
+
+def test_extracted_text_is_stored_out_of_row(tmp_path):
+    from unittest.mock import MagicMock
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    from app.db.models import Base, Invoice, InvoiceData, User
+    from app.services.blob_store import BlobStore, load_extracted_text
+    from app.services.extraction_service import ExtractionService
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add(User(id=1, email="alice@example.com", password_hash="x"))
+    db.add_all([Invoice(id=n, user_id=1, filename=f"{n}.pdf", stored_path=f"/files/{n}.pdf") for n in (1, 2)])
+    db.commit()
+
+    blobs = BlobStore(tmp_path / "blobs")
+    service = ExtractionService(db, cache=None, blobs=blobs)
+    service.ocr = MagicMock()
+    text = "Invoice No: INV-9\nTotal: 100.00\n" + "line item text\n" * 5000
+    service.ocr.read_pdf.return_value = OCRResult([PageText(1, text, "layout", 0.0)])
+
+    inserts = []
+    event.listen(engine, "before_cursor_execute", lambda c, cur, stmt, *a: inserts.append(stmt) if stmt.startswith("INSERT INTO invoice_data") else None)
+    staged, errors = service.stage_many([(1, "/files/1.pdf", None), (2, "/files/2.pdf", None)])
+    db.commit()
+    assert not errors and len(inserts) == 1
+
+    # Same text, one compressed blob
+    assert staged[1]["text_ref"] == staged[2]["text_ref"]
+    assert len(list((tmp_path / "blobs").rglob("*.gz"))) == 1
+    assert sum(p.stat().st_size for p in (tmp_path / "blobs").rglob("*.gz")) < len(text) // 20
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda c, cur, stmt, *a: statements.append(stmt))
+    data = db.query(InvoiceData).filter(InvoiceData.invoice_id == 1).one()
+    assert data.extracted_json["invoice_number"] == "INV-9"
+    assert "extracted_text" not in statements[-1]
+    assert load_extracted_text(data, blobs) == text
+
+    # Rows written before the blob store fall back to the inline column
+    legacy = InvoiceData(invoice_id=2, extracted_text="inline")
+    assert load_extracted_text(legacy, blobs) == "inline"
+    db.close()
@@ -11,12 +11,16 @@ from app.main import app
 from app.api import invoices, deps
 from app.db.models import Base
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
 # Setup In-Memory DB for testing
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 def override_get_db():
     try:
@@ -25,12 +29,17 @@ def override_get_db():
     finally:
         db.close()
 
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
 def override_get_queue():
     mock_q = MagicMock()
     mock_q.enqueue.return_value = MagicMock(id="123")
     return mock_q
 
 app.dependency_overrides[deps.get_db] = override_get_db
+app.dependency_overrides[deps.get_async_db] = override_get_async_db
 app.dependency_overrides[deps.get_queue] = override_get_queue
 
 # Create tables
@@ -106,6 +115,7 @@ def test_invoice_upload_flow():
         # We need to use the same DB session or update the DB the test is using.
         # Since we are using a file based sqlite, we can open a new session.
         from app.services.extraction_service import ExtractionService
+        from app.services.ocr_service import OCRResult, PageText
         from app.db.models import Invoice, InvoiceStatus
         
         db = TestingSessionLocal()
@@ -115,7 +125,8 @@ def test_invoice_upload_flow():
         
         # Mock OCR since we don't have a real PDF with text usually in test env
         
-        with patch("app.services.ocr_service.OCRService.extract_text_from_pdf", return_value="Invoice No: INV-001\nGSTIN: 29ABCDE1234F1Z5\nDate: 12/12/2023\nTotal: 1000.00"):
+        text = "Invoice No: INV-001\nGSTIN: 29ABCDE1234F1Z5\nDate: 12/12/2023\nTotal: 1000.00"
+        with patch("app.services.ocr_service.OCRService.read_pdf", return_value=OCRResult([PageText(1, text, "layout", 0.0)])):
              service = ExtractionService(db)
             #  file endpoint mock
              service.process_invoice(invoice.id, str(invoice.stored_path))
@@ -131,6 +142,16 @@ def test_invoice_upload_flow():
 
         # 5. Run Compliance
         response = client.post(f"/api/v1/compliance/run?invoice_id={invoice_id}", headers=headers)
+        assert response.status_code == 202
+        run_data = response.json()
+        assert run_data["status"] == "running"
+
+        # Evaluation happens in the background; the event stream ends with the final status
+        with client.stream("GET", f"/api/v1/compliance/runs/{run_data['run_id']}/events", headers=headers) as stream:
+            events = [line[len("event: "):] for line in stream.iter_lines() if line.startswith("event: ")]
+        assert events[0] == "status" and events[-1] == "status"
+
+        response = client.get(f"/api/v1/compliance/runs/{run_data['run_id']}", headers=headers)
         assert response.status_code == 200
         run_data = response.json()
         assert run_data["status"] == "completed"
@@ -0,0 +1,178 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datetime
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from fastapi.testclient import TestClient
+from google.auth import crypt, jwt
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.main import app
+from app.api import deps
+from app.core.google_auth import GoogleTokenVerifier, cache_ttl
+from app.db.models import Base, User
+
+CLIENT_ID = "test-client.apps.googleusercontent.com"
+
+
+def _key_pair():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "test")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder().subject_name(name).issuer_name(name)
+        .public_key(key.public_key()).serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1)).not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    return private_pem.decode(), cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+class FakeKeyServer:
+    """Serves {kid: pem} like Google's v1 certs endpoint."""
+
+    def __init__(self):
+        self.certs = {}
+        self.cache_control = "public, max-age=3600"
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                body = json.dumps(server.certs).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Cache-Control", server.cache_control)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/oauth2/v1/certs"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def add_key(self, kid):
+        private_pem, cert_pem = _key_pair()
+        self.certs[kid] = cert_pem
+        return crypt.RSASigner.from_string(private_pem, key_id=kid)
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def key_server():
+    server = FakeKeyServer()
+    try:
+        yield server
+    finally:
+        server.stop()
+
+
+def _token(signer, email="g@example.com", aud=CLIENT_ID, iss="https://accounts.google.com"):
+    now = int(time.time())
+    payload = {"iss": iss, "aud": aud, "sub": "123", "email": email, "iat": now, "exp": now + 600}
+    return jwt.encode(signer, payload).decode()
+
+
+def test_certs_are_fetched_once_while_fresh(key_server):
+    signer = key_server.add_key("k1")
+    verifier = GoogleTokenVerifier(CLIENT_ID, key_server.url)
+    for _ in range(5):
+        assert verifier.verify(_token(signer))["email"] == "g@example.com"
+    assert key_server.requests == 1
+    verifier.close()
+
+
+def test_unknown_kid_refreshes_and_max_age_zero_refetches(key_server):
+    old = key_server.add_key("k1")
+    verifier = GoogleTokenVerifier(CLIENT_ID, key_server.url, min_refresh_interval=0)
+    verifier.verify(_token(old))
+
+    # Key rotation: the new kid is picked up before the cached certs expire
+    new = key_server.add_key("k2")
+    key_server.cache_control = "no-cache"
+    verifier.verify(_token(new))
+    assert key_server.requests == 2
+
+    # That response may not be reused
+    verifier.verify(_token(new))
+    verifier.verify(_token(new))
+    assert key_server.requests == 4
+    verifier.close()
+
+
+def test_rejects_bad_tokens_and_survives_key_server_outage(key_server):
+    signer = key_server.add_key("k1")
+    verifier = GoogleTokenVerifier(CLIENT_ID, key_server.url)
+    verifier.verify(_token(signer))
+
+    with pytest.raises(ValueError):
+        verifier.verify(_token(signer, aud="someone-else"))
+    with pytest.raises(ValueError):
+        verifier.verify(_token(signer, iss="https://evil.example.com"))
+    with pytest.raises(ValueError):
+        verifier.verify(_token(crypt.RSASigner.from_string(_key_pair()[0], key_id="k1")))
+
+    key_server.stop()
+    verifier._expires_at = 0
+    assert verifier.verify(_token(signer))["email"] == "g@example.com"
+    verifier.close()
+
+
+def test_cache_ttl_honours_age():
+    assert cache_ttl({"Cache-Control": "public, max-age=100", "Age": "30"}) == 70
+    assert cache_ttl({"Cache-Control": "no-store"}) == 0
+    assert cache_ttl({}) is None
+
+
+def test_google_login_endpoint(key_server, monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    signer = key_server.add_key("k1")
+    monkeypatch.setattr("app.api.auth.google_verifier", GoogleTokenVerifier(CLIENT_ID, key_server.url))
+    previous = dict(app.dependency_overrides)
+    app.dependency_overrides[deps.get_db] = override_get_db
+    try:
+        client = TestClient(app)
+        response = client.post("/api/v1/auth/google", json={"token": _token(signer)})
+        assert response.status_code == 200 and response.json()["access_token"]
+        assert client.post("/api/v1/auth/google", json={"token": "garbage"}).status_code == 400
+    finally:
+        app.dependency_overrides.clear()
+        app.dependency_overrides.update(previous)
+
+    db = SessionLocal()
+    assert db.query(User).filter(User.email == "g@example.com").one().password_hash.startswith("!")
+    db.close()
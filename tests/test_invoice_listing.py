@@ -0,0 +1,77 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.main import app
+from app.core import security
+from app.db.models import Invoice, InvoiceStatus, User
+
+BASE = datetime(2024, 4, 1)
+
+
+@pytest.fixture
+def env(app_db):
+    SessionLocal = app_db.SessionLocal
+    db = SessionLocal()
+    db.add_all([User(id=1, email="alice@example.com", password_hash="x"), User(id=2, email="bob@example.com", password_hash="x")])
+    for n in range(1, 26):
+        # Pairs share a timestamp so the id tie-breaker matters
+        db.add(Invoice(
+            id=n, user_id=1, filename=f"{'march' if n % 2 else 'april'}_{n}.pdf", stored_path="x",
+            status=InvoiceStatus.COMPLETED if n % 3 else InvoiceStatus.FAILED, uploaded_at=BASE + timedelta(hours=n // 2),
+        ))
+    db.add(Invoice(id=26, user_id=2, filename="march_x.pdf", stored_path="x", uploaded_at=BASE))
+    db.commit()
+    db.close()
+
+    return TestClient(app), app_db.engine
+
+
+def _list(client, **params):
+    token = security.create_access_token(data={"sub": "alice@example.com"})
+    return client.get("/api/v1/invoices/", params=params, headers={"Authorization": f"Bearer {token}"})
+
+
+def _walk(client, **params):
+    ids, cursor = [], None
+    while True:
+        body = _list(client, **params, **({"cursor": cursor} if cursor else {})).json()
+        ids.extend(item["id"] for item in body["items"])
+        cursor = body["next_cursor"]
+        if not cursor:
+            return ids
+
+
+def test_cursor_walks_every_invoice_once_newest_first(env):
+    client, _ = env
+    assert _walk(client, limit=4) == list(range(25, 0, -1))
+
+
+def test_filters_combine_with_cursor(env):
+    client, _ = env
+    ids = _walk(client, limit=2, status="completed", filename_prefix="march_", uploaded_from=(BASE + timedelta(hours=3)).isoformat())
+    assert ids == [n for n in range(25, 0, -1) if n % 2 and n % 3 and n // 2 >= 3]
+    # LIKE wildcards in the prefix are matched literally
+    assert _list(client, filename_prefix="%").json()["items"] == []
+
+
+def test_invalid_cursor_is_rejected(env):
+    client, _ = env
+    assert _list(client, cursor="not-a-cursor").status_code == 400
+
+
+def test_listing_uses_composite_index(env):
+    _, engine = env
+    with engine.connect() as conn:
+        plan = " ".join(row[-1] for row in conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id FROM invoices WHERE user_id = 1 AND (uploaded_at, id) < ('2024-04-02', 9) "
+            "ORDER BY uploaded_at DESC, id DESC LIMIT 5"
+        )))
+    assert "ix_invoices_user_uploaded" in plan and "TEMP B-TREE" not in plan
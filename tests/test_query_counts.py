@@ -0,0 +1,91 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.main import app
+from app.core import security
+from app.core.principal import principal_cache
+from app.db.models import Invoice, InvoiceData, InvoiceStatus, Run, RunStatus, User, Violation
+
+# Statements per request, auth lookup included. Raise a budget only when a
+# request genuinely needs another round trip.
+QUERY_BUDGETS = {
+    "invoice_detail": 2,
+    "invoice_list": 2,
+    "invoice_list_summary": 3,
+    "run_detail": 3,
+}
+
+
+@pytest.fixture
+def env(app_file_db):
+    # The async endpoints read through the async engine of the same file
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(app_file_db.engine, "before_cursor_execute", count)
+    event.listen(app_file_db.async_engine.sync_engine, "before_cursor_execute", count)
+
+    db = app_file_db.SessionLocal()
+    db.add(User(id=1, email="alice@example.com", password_hash="x"))
+    now = datetime.utcnow()
+    for n in range(1, 6):
+        db.add(Invoice(id=n, user_id=1, filename=f"{n}.pdf", stored_path="x", status=InvoiceStatus.COMPLETED))
+        db.add(InvoiceData(invoice_id=n, extracted_json={"n": n}, extracted_text="text", extraction_quality=0.85))
+        for age in range(3):
+            run_id = f"run-{n}-{age}"
+            db.add(Run(run_id=run_id, user_id=1, invoice_id=n, status=RunStatus.COMPLETED, start_ts=now - timedelta(minutes=age)))
+            db.add_all(Violation(run_id=run_id, rule_id="RULE_001", severity="high") for _ in range(age + 1))
+    db.commit()
+    db.close()
+
+    return TestClient(app), statements
+
+
+def _get(env, url):
+    client, statements = env
+    token = security.create_access_token(data={"sub": "alice@example.com"})
+    principal_cache.clear()
+    statements.clear()
+    response = client.get(url, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    return response.json(), len(statements)
+
+
+def test_invoice_detail_query_count(env):
+    body, queries = _get(env, "/api/v1/invoices/3")
+    assert body["extracted_data"] == {"n": 3}
+    assert queries <= QUERY_BUDGETS["invoice_detail"]
+
+
+def test_invoice_list_query_count(env):
+    body, queries = _get(env, "/api/v1/invoices/")
+    assert len(body["items"]) == 5 and "latest_run" not in body["items"][0]
+    assert queries <= QUERY_BUDGETS["invoice_list"]
+
+
+def test_invoice_list_summary_query_count_is_fixed(env):
+    body, queries = _get(env, "/api/v1/invoices/?include=summary")
+    assert queries <= QUERY_BUDGETS["invoice_list_summary"]
+    by_id = {item["id"]: item for item in body["items"]}
+    assert by_id[2]["has_extraction"] is True and by_id[2]["extraction_quality"] == 0.85
+    assert by_id[2]["latest_run"]["run_id"] == "run-2-0"
+    assert by_id[2]["latest_run"]["violation_count"] == 1
+
+    _, queries_for_two = _get(env, "/api/v1/invoices/?include=summary&limit=2")
+    assert queries_for_two == queries
+
+
+def test_run_detail_query_count(env):
+    body, queries = _get(env, "/api/v1/compliance/runs/run-1-2")
+    assert len(body["violations"]) == 3
+    assert queries <= QUERY_BUDGETS["run_detail"]
@@ -0,0 +1,125 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+from app.main import app
+from app.core import security
+from app.db.models import Invoice, MonthlySummary, Run, RunStatus, User
+from app.services.batch_compliance import BatchComplianceService
+from app.services.compliance_engine import ComplianceEngine
+from app.services.extraction_service import ExtractionService
+from app.services.ocr_service import OCRResult, PageText
+from app.services.rule_engine import RuleRegistry
+
+
+def invoice_text(day, gstin="27AAPFU0939F1ZV"):
+    return "\n".join([
+        "Invoice No: INV-1",
+        f"Invoice Date: {day}",
+        f"GSTIN: {gstin}" if gstin else "",
+        "1 Consulting services 998311 1 1000.00 1000.00 18% 180.00 1180.00",
+        "2 Steel rods 7214 10 50.00 500.00 12% 60.00 560.00",
+        "Taxable Value 1500.00",
+        "Grand Total 1740.00",
+    ])
+
+
+@pytest.fixture
+def env(app_db):
+    SessionLocal = app_db.SessionLocal
+    db = SessionLocal()
+    db.add_all([User(id=1, email="alice@example.com", password_hash="x"), User(id=2, email="bob@example.com", password_hash="x")])
+    db.add_all([Invoice(id=n, user_id=2 if n == 4 else 1, filename=f"{n}.pdf", stored_path=f"/files/{n}.pdf",
+                        uploaded_at=datetime(2024, 6, 15)) for n in range(1, 5)])
+    db.commit()
+
+    texts = {
+        "/files/1.pdf": invoice_text("05/04/2024"),
+        "/files/2.pdf": invoice_text("20/04/2024", gstin=None),
+        "/files/3.pdf": invoice_text("no date"),
+        "/files/4.pdf": invoice_text("05/04/2024"),
+    }
+    extraction = ExtractionService(db, cache=None)
+    extraction.ocr = MagicMock()
+    extraction.ocr.read_pdf.side_effect = lambda path: OCRResult([PageText(1, texts[path], "layout", 0.0)])
+    extraction.stage_many([(n, f"/files/{n}.pdf", None) for n in range(1, 5)])
+    db.commit()
+
+    yield TestClient(app), db, SessionLocal, extraction, texts
+    db.close()
+
+
+def _report(client, **params):
+    token = security.create_access_token(data={"sub": "alice@example.com"})
+    response = client.get("/api/v1/reports/monthly", params=params, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200, response.text
+    return response.json()["months"]
+
+
+def test_summaries_follow_extraction_and_runs(env, monkeypatch):
+    from app.commands.rebuild_reports import rebuild
+
+    client, db, SessionLocal, extraction, texts = env
+    registry = RuleRegistry(ttl_seconds=60)
+    run = Run(run_id="run-1", user_id=1, invoice_id=2, status=RunStatus.RUNNING)
+    db.add(run)
+    db.commit()
+    ComplianceEngine(db, registry).run_compliance_checks(run, {"gstin": None, "line_items": []})
+    BatchComplianceService(db, registry).run_batch(1, [1, 2])
+
+    months = _report(client)
+    # Invoice 3 has no readable date and counts in its upload month
+    assert [m["period"] for m in months] == ["2024-04", "2024-06", datetime.utcnow().strftime("%Y-%m")]
+    april = months[0]
+    assert april["invoice_count"] == 2 and april["total_amount"] == "3480.00" and april["taxable_value"] == "3000.00"
+    assert april["tax_slabs"] == [
+        {"tax_rate": "12.00", "line_count": 2, "taxable_value": "1000.00", "tax_amount": "120.00"},
+        {"tax_rate": "18.00", "line_count": 2, "taxable_value": "2000.00", "tax_amount": "360.00"},
+    ]
+    runs = months[-1]
+    assert runs["runs_completed"] == 3 and runs["invoice_count"] == 0
+    assert {(v["rule_id"], v["violation_count"]) for v in runs["violations"]} >= {("RULE_001", 2)}
+    assert runs["violation_count"] == sum(v["violation_count"] for v in runs["violations"])
+
+    # Re-extraction moves the invoice to its new month instead of counting it twice
+    texts["/files/1.pdf"] = invoice_text("03/05/2024")
+    extraction.stage_many([(1, "/files/1.pdf", None)])
+    db.commit()
+    months = _report(client, period_from="2024-04", period_to="2024-05")
+    assert [(m["period"], m["invoice_count"], m["total_amount"]) for m in months] == [
+        ("2024-04", 1, "1740.00"), ("2024-05", 1, "1740.00"),
+    ]
+
+    # What was maintained incrementally matches a rebuild from scratch
+    assert rebuild(SessionLocal, chunk_size=2, check=True) == []
+
+
+def test_rebuild_repairs_drifted_summaries(env):
+    from app.commands.rebuild_reports import rebuild
+
+    client, db, SessionLocal, _, _ = env
+    db.execute(update(MonthlySummary).where(MonthlySummary.user_id == 1).values(invoice_count=99))
+    db.commit()
+
+    problems = rebuild(SessionLocal, check=True)
+    assert len(problems) == 2 and all(p.startswith("monthly_summaries") for p in problems)
+    assert _report(client, period_from="2024-04", period_to="2024-04")[0]["invoice_count"] == 99
+
+    assert len(rebuild(SessionLocal)) == 2
+    assert rebuild(SessionLocal, check=True) == []
+    assert _report(client, period_from="2024-04", period_to="2024-04")[0]["invoice_count"] == 2
+
+
+def test_bad_period_is_rejected(env):
+    client = env[0]
+    token = security.create_access_token(data={"sub": "alice@example.com"})
+    response = client.get("/api/v1/reports/monthly", params={"period_from": "April"}, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 400
@@ -0,0 +1,100 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api.compliance import _replay_from_db
+from app.db.models import Base, Invoice, InvoiceData, Run, RunStatus, User, Violation
+from app.services.run_executor import RunExecutor
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add(User(id=1, email="alice@example.com", password_hash="x"))
+    db.add(Invoice(id=1, user_id=1, filename="a.pdf", stored_path="x"))
+    db.add(InvoiceData(invoice_id=1, extracted_json={"gstin": None, "line_items": []}))
+    db.commit()
+    db.close()
+    return engine
+
+
+def _add_run(engine, run_id, status=RunStatus.RUNNING, start_ts=None):
+    db = sessionmaker(bind=engine)()
+    db.add(Run(run_id=run_id, user_id=1, invoice_id=1, status=status, start_ts=start_ts or datetime.utcnow()))
+    db.commit()
+    db.close()
+
+
+def _collect(events):
+    async def run():
+        return [event async for event in events]
+    return asyncio.run(run())
+
+
+def _execute(engine, run_id):
+    executor = RunExecutor(max_workers=1, retention_seconds=60)
+    channel = executor.submit(engine, run_id)
+    executor.shutdown(wait=True)
+    return channel.events
+
+
+def test_executor_publishes_violations_after_commit(engine):
+    _add_run(engine, "run-ok")
+    events = _execute(engine, "run-ok")
+    names = [name for name, _ in events]
+    assert names[0] == "status" and names[-1] == "status" and "violation" in names
+    assert events[-1][1]["status"] == "completed"
+
+
+def test_failed_run_publishes_no_violations(engine, monkeypatch):
+    from app.services.compliance_engine import ComplianceEngine
+
+    def fail_after_finding(self, run, data, on_violation=None):
+        on_violation({"rule_id": "RULE_001", "severity": "high", "detected_value": None,
+                      "expected_value": None, "suggestion": None})
+        raise RuntimeError("rule blew up")
+
+    monkeypatch.setattr(ComplianceEngine, "run_compliance_checks", fail_after_finding)
+    _add_run(engine, "run-bad")
+    events = _execute(engine, "run-bad")
+    assert [(name, payload["status"]) for name, payload in events] == [("status", "running"), ("status", "failed")]
+
+    db = sessionmaker(bind=engine)()
+    assert db.get(Run, "run-bad").status == RunStatus.FAILED
+    assert db.query(Violation).count() == 0
+    db.close()
+
+
+def test_replay_of_a_finished_run(engine):
+    _add_run(engine, "run-done", status=RunStatus.COMPLETED)
+    db = sessionmaker(bind=engine)()
+    db.add(Violation(run_id="run-done", rule_id="RULE_001", severity="high"))
+    db.commit()
+    db.close()
+
+    events = _collect(_replay_from_db(engine, "run-done"))
+    assert [name for name, _ in events] == ["status", "violation", "status"]
+    assert events[1][1]["rule_id"] == "RULE_001"
+    assert events[-1][1]["status"] == "completed"
+
+
+def test_replay_gives_up_on_a_run_stuck_in_running(engine, monkeypatch):
+    monkeypatch.setattr("app.core.config.settings.COMPLIANCE_RUN_STREAM_TIMEOUT_SECONDS", 60)
+    monkeypatch.setattr("app.core.config.settings.COMPLIANCE_RUN_STREAM_POLL_SECONDS", 0.01)
+    # Its executor died an hour ago
+    _add_run(engine, "run-lost", start_ts=datetime.utcnow() - timedelta(hours=1))
+
+    events = _collect(_replay_from_db(engine, "run-lost"))
+    assert [name for name, _ in events] == ["status", "error"]
+    assert "did not finish" in events[-1][1]["detail"]
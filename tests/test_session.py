@@ -0,0 +1,46 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+from sqlalchemy import text
+
+from app.db import session
+
+
+def test_postgres_engine_options_come_from_settings(monkeypatch):
+    monkeypatch.setattr("app.core.config.settings.DB_POOL_SIZE", 7)
+    monkeypatch.setattr("app.core.config.settings.DB_STATEMENT_TIMEOUT_MS", 1500)
+    url = "postgresql://u:p@db.internal/gst"
+
+    options = session.engine_options(url)
+    assert options["pool_size"] == 7 and options["pool_pre_ping"] is True
+    assert options["connect_args"]["options"] == "-c statement_timeout=1500"
+
+    async_url = session.async_database_url(url)
+    assert async_url == "postgresql+asyncpg://u:p@db.internal/gst"
+    assert session.engine_options(async_url, is_async=True)["connect_args"]["server_settings"] == {"statement_timeout": "1500"}
+
+
+def test_sqlite_file_engine_uses_wal(tmp_path):
+    engine = session.build_engine(f"sqlite:///{tmp_path / 'local.db'}")
+    try:
+        with engine.connect() as conn:
+            assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+    finally:
+        engine.dispose()
+
+
+def test_async_session_reads_sqlite(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.core.config.settings.SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'async.db'}")
+
+    async def query():
+        try:
+            async with session.get_async_sessionmaker()() as db:
+                return (await db.execute(text("PRAGMA journal_mode"))).scalar()
+        finally:
+            await session.dispose_async_engine()
+
+    assert asyncio.run(query()) == "wal"
@@ -0,0 +1,222 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from unittest.mock import MagicMock
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.main import app
+from app.api import deps
+from app.core import security
+from app.core.metrics import metrics
+from app.db.models import Base, Invoice, InvoiceData, InvoiceHeader, InvoiceStatus, User
+
+
+@pytest.fixture
+def env():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    queue = MagicMock()
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    db = SessionLocal()
+    db.add_all([
+        User(id=1, email="alice@example.com", password_hash="x"),
+        User(id=2, email="bob@example.com", password_hash="x"),
+    ])
+    db.commit()
+
+    previous = dict(app.dependency_overrides)
+    app.dependency_overrides[deps.get_db] = override_get_db
+    app.dependency_overrides[deps.get_queue] = lambda: queue
+    try:
+        yield TestClient(app), db, queue
+    finally:
+        app.dependency_overrides.clear()
+        app.dependency_overrides.update(previous)
+        db.close()
+
+
+def _headers(email):
+    return {"Authorization": f"Bearer {security.create_access_token(data={'sub': email})}"}
+
+
+def _upload(client, email, content=b"%PDF-1.4 same bytes", name="inv.pdf"):
+    return client.post("/api/v1/invoices/upload", files={"file": (name, content, "application/pdf")}, headers=_headers(email))
+
+
+def _complete(db, invoice_id, cpu_ms=250.0):
+    db.add(InvoiceData(invoice_id=invoice_id, extracted_json={"gstin": "29ABCDE1234F1Z5"}, extraction_cpu_ms=cpu_ms))
+    db.query(Invoice).filter(Invoice.id == invoice_id).update({Invoice.status: InvoiceStatus.COMPLETED})
+    db.commit()
+
+
+def test_reupload_reuses_extraction(env):
+    client, db, queue = env
+    first = _upload(client, "alice@example.com").json()
+    assert first["invoice_hash"] and first["status"] == "uploaded"
+    queue.enqueue_invoices.assert_called_once_with([first["id"]], priority="interactive")
+    _complete(db, first["id"])
+
+    hits, saved = metrics.get("dedup_hits"), metrics.get("dedup_cpu_ms_saved")
+    second = _upload(client, "alice@example.com", name="again.pdf").json()
+
+    assert second["status"] == "completed"
+    assert second["duplicate_of_id"] == first["id"]
+    assert queue.enqueue_invoices.call_count == 1
+    assert db.query(InvoiceData).filter(InvoiceData.invoice_id == second["id"]).one().extracted_json["gstin"] == "29ABCDE1234F1Z5"
+    assert metrics.get("dedup_hits") == hits + 1
+    assert metrics.get("dedup_cpu_ms_saved") == saved + 250.0
+
+
+def test_dedup_is_per_user_by_default(env, monkeypatch):
+    client, db, queue = env
+    first = _upload(client, "alice@example.com").json()
+    _complete(db, first["id"])
+
+    assert _upload(client, "bob@example.com").json()["duplicate_of_id"] is None
+
+    monkeypatch.setattr("app.core.config.settings.DEDUP_SCOPE", "global")
+    linked = _upload(client, "bob@example.com").json()
+    assert linked["duplicate_of_id"] == first["id"]
+    response = client.post(
+        "/api/v1/invoices/bulk-upload", files=[("files", ("again.pdf", b"%PDF-1.4 same bytes", "application/pdf"))],
+        headers=_headers("bob@example.com"),
+    )
+    bulk = response.json()["created"][0]
+    assert bulk["duplicate_of_id"] == first["id"]
+    # Alice's rows are not in bob's aggregates: his copies get their own
+    headers = db.query(InvoiceHeader).filter(InvoiceHeader.invoice_id.in_([linked["id"], bulk["invoice_id"]])).all()
+    assert [h.user_id for h in headers] == [2, 2]
+
+
+def test_upload_rejects_non_pdf_content(env):
+    client, db, queue = env
+    response = _upload(client, "alice@example.com", content=b"MZ\x90\x00 not a pdf")
+    assert response.status_code == 400
+    assert db.query(Invoice).count() == 0
+
+
+def test_upload_rejects_oversized_body(env, monkeypatch):
+    client, db, queue = env
+    monkeypatch.setattr("app.core.config.settings.MAX_UPLOAD_SIZE_MB", 0)
+    response = _upload(client, "alice@example.com", content=b"%PDF-1.4" + b"0" * 200_000)
+    assert response.status_code == 413
+    assert queue.enqueue_invoices.call_count == 0
+
+
+def test_inspector_counts_pages_across_chunks():
+    from app.utils.file_utils import PDFStreamInspector
+
+    body = b"%PDF-1.7\n" + b"<< /Type /Pages /Count 3 >>" + b"<< /Type /Page >>" * 3 + b"%%EOF"
+    for split in range(1, len(body)):
+        inspector = PDFStreamInspector(max_bytes=10_000)
+        inspector.feed(body[:split])
+        inspector.feed(body[split:])
+        assert inspector.finish().page_count == 3
+
+
+def test_bulk_upload_zip_and_loose_files(env):
+    import io
+    import zipfile
+
+    client, db, queue = env
+    first = _upload(client, "alice@example.com").json()
+    _complete(db, first["id"])
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("march/a.pdf", b"%PDF-1.4 a")
+        zf.writestr("march/b.pdf", b"%PDF-1.4 b")
+        zf.writestr("march/dup.pdf", b"%PDF-1.4 same bytes")
+        zf.writestr("march/notes.txt", b"hello")
+        zf.writestr("march/fake.pdf", b"GIF89a")
+        zf.writestr("__MACOSX/march/._a.pdf", b"junk")
+
+    response = client.post(
+        "/api/v1/invoices/bulk-upload",
+        files=[
+            ("files", ("march.zip", archive.getvalue(), "application/zip")),
+            ("files", ("c.pdf", b"%PDF-1.4 c", "application/pdf")),
+            ("files", ("d.docx", b"PK", "application/octet-stream")),
+        ],
+        headers=_headers("alice@example.com"),
+    )
+    assert response.status_code == 200
+    body = response.json()
+
+    created = {item["filename"]: item for item in body["created"]}
+    assert sorted(created) == ["a.pdf", "b.pdf", "c.pdf", "dup.pdf"]
+    assert created["dup.pdf"]["duplicate_of_id"] == first["id"]
+    assert created["dup.pdf"]["status"] == "completed"
+    assert sorted(r["filename"] for r in body["rejected"]) == ["d.docx", "march.zip/march/fake.pdf", "march.zip/march/notes.txt"]
+
+    assert db.query(Invoice).count() == 5
+    assert db.query(InvoiceData).filter(InvoiceData.invoice_id == created["dup.pdf"]["invoice_id"]).count() == 1
+    # Counted once in alice's aggregates, through the original
+    assert db.get(InvoiceHeader, created["dup.pdf"]["invoice_id"]) is None
+    # One bulk-priority enqueue for the three new files, none for the duplicate
+    bulk_calls = [c for c in queue.enqueue_invoices.call_args_list if c[1] == {"priority": "bulk"}]
+    assert len(bulk_calls) == 1 and len(bulk_calls[0][0][0]) == 3
+
+
+def test_zip_total_expanded_size_is_capped(tmp_path):
+    import io
+    import zipfile
+    from app.utils.file_utils import FileUtils, UploadRejected
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+        for n in range(3):
+            # Compresses to almost nothing, expands to 1000 bytes each
+            zf.writestr(f"{n}.pdf", b"%PDF-1.4 " + b"0" * 991)
+
+    archive.seek(0)
+    accepted, _ = FileUtils.extract_zip_pdfs(archive, tmp_path, max_bytes=2000, max_members=10, max_total_bytes=3000)
+    assert len(accepted) == 3
+
+    capped = tmp_path / "capped"
+    capped.mkdir()
+    archive.seek(0)
+    with pytest.raises(UploadRejected) as e:
+        FileUtils.extract_zip_pdfs(archive, capped, max_bytes=2000, max_members=10, max_total_bytes=2500)
+    assert e.value.status_code == 413
+    # Members extracted before the cap was hit are removed again
+    assert list(capped.iterdir()) == []
+
+
+def test_queue_runs_jobs_in_process_when_redis_is_down(monkeypatch):
+    from app.core.queue import JobQueue
+    from app.core.redis_pool import RedisManager
+
+    monkeypatch.setattr("app.core.config.settings.REDIS_HOST", "127.0.0.1")
+    monkeypatch.setattr("app.core.config.settings.REDIS_PORT", 1)  # nothing listens here
+    monkeypatch.setattr("app.core.config.settings.REDIS_CONNECT_TIMEOUT_SECONDS", 0.2)
+    manager = RedisManager()
+    queue = JobQueue(manager=manager)
+    ran = []
+    fallback_jobs = metrics.get("queue_fallback_jobs")
+
+    monkeypatch.setattr("app.workers.ingestion_worker.process_invoice_job", ran.append)
+    queue.enqueue_invoices([1])
+    checked_at = manager._checked_at
+    queue.enqueue_invoices([2, 3], priority="bulk")
+    queue.shutdown(wait=True)
+    manager.close()
+
+    assert sorted(ran) == [1, 2, 3]
+    assert metrics.get("queue_fallback_jobs") == fallback_jobs + 3
+    # Redis is not pinged again until REDIS_RETRY_AFTER_SECONDS has passed
+    assert manager._checked_at == checked_at and not manager._healthy
@@ -0,0 +1,209 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.queue import ingestion_key
+from app.db.models import Base, Invoice, InvoiceData, InvoiceStatus, User
+from app.services.ocr_service import OCRResult, PageText
+from app.workers.runtime import IngestionProcessor, IngestionWorker
+
+
+class FakeRedis:
+    """The list and hash commands the worker uses, in memory."""
+
+    def __init__(self):
+        self.lists = defaultdict(deque)
+        self.hashes = {}
+
+    def rpush(self, key, *values):
+        self.lists[key].extend(str(v).encode() for v in values)
+
+    def blpop(self, keys, timeout=0):
+        for key in keys:
+            if self.lists[key]:
+                return key.encode(), self.lists[key].popleft()
+        return None
+
+    def lpop(self, key, count):
+        items = self.lists[key]
+        return [items.popleft() for _ in range(min(count, len(items)))] or None
+
+    def hset(self, key, mapping):
+        self.hashes[key] = dict(mapping)
+
+    def expire(self, key, seconds):
+        pass
+
+
+@pytest.fixture
+def env():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = SessionLocal()
+    db.add(User(id=1, email="alice@example.com", password_hash="x"))
+    db.add_all([Invoice(id=n, user_id=1, filename=f"{n}.pdf", stored_path=f"/files/{n}.pdf") for n in range(1, 5)])
+    db.commit()
+
+    queue = MagicMock()
+    processor = IngestionProcessor("test-worker", session_factory=SessionLocal, queue=queue, max_attempts=2)
+    processor.extraction.cache = None
+    processor.extraction.ocr = MagicMock()
+
+    def ocr(path):
+        if path == "/files/4.pdf":
+            raise RuntimeError("unreadable")
+        return OCRResult([PageText(1, f"Invoice No: INV-{path[7]}\nTotal: 100.00", "layout", 0.0)])
+
+    processor.extraction.ocr.read_pdf.side_effect = ocr
+    try:
+        yield engine, db, processor, queue
+    finally:
+        processor.close()
+        db.close()
+
+
+def test_batch_is_claimed_extracted_and_committed_together(env):
+    engine, db, processor, _ = env
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+
+    assert processor.process_batch([1, 2, 3, 4]) == (3, 1)
+    # One commit to claim the batch, one for all of its results
+    assert len(commits) == 2
+
+    db.expire_all()
+    invoices = {i.id: i for i in db.query(Invoice)}
+    assert [invoices[n].status for n in (1, 2, 3, 4)] == ["completed"] * 3 + ["failed"]
+    assert all(i.lease_owner is None and i.lease_expires_at is None and i.attempts == 1 for i in invoices.values())
+    assert db.query(InvoiceData).filter(InvoiceData.invoice_id == 2).one().extracted_json["invoice_number"] == "INV-2"
+
+    # Duplicate queue entries for finished invoices are skipped
+    assert processor.process_batch([1, 2]) == (0, 0)
+
+
+def test_reaper_requeues_expired_leases_and_fails_exhausted(env):
+    _, db, processor, queue = env
+    past = datetime.utcnow() - timedelta(minutes=1)
+    db.query(Invoice).filter(Invoice.id == 1).update(
+        {"status": InvoiceStatus.PROCESSING, "lease_owner": "dead", "lease_expires_at": past, "attempts": 1}
+    )
+    db.query(Invoice).filter(Invoice.id == 2).update(
+        {"status": InvoiceStatus.PROCESSING, "lease_owner": "dead", "lease_expires_at": past, "attempts": 2}
+    )
+    # Still leased by a live worker
+    db.query(Invoice).filter(Invoice.id == 3).update(
+        {"status": InvoiceStatus.PROCESSING, "lease_owner": "alive", "lease_expires_at": datetime.utcnow() + timedelta(minutes=5)}
+    )
+    # Queue entry lost long ago
+    db.query(Invoice).filter(Invoice.id == 4).update({"uploaded_at": datetime.utcnow() - timedelta(hours=1)})
+    db.commit()
+
+    assert processor.reap() == (2, 1)
+    queue.enqueue_invoices.assert_called_once_with([1, 4], priority="bulk")
+    db.expire_all()
+    assert [db.get(Invoice, n).status for n in (1, 2, 3, 4)] == ["uploaded", "failed", "processing", "uploaded"]
+
+    # Invoice 4 is not pushed again until requeue_after_seconds have passed
+    assert processor.reap() == (0, 0)
+
+
+def test_worker_pulls_interactive_before_bulk(env):
+    _, db, processor, _ = env
+    client = FakeRedis()
+    client.rpush(ingestion_key("bulk"), 1, 2, 3)
+    client.rpush(ingestion_key("interactive"), 4)
+    manager = MagicMock()
+    manager.client.return_value = client
+
+    worker = IngestionWorker(processor, manager=manager, batch_size=3, reap_interval=3600)
+    assert worker.pop_batch() == [4, 1, 2]
+
+    assert worker.run_once() == 1
+    stats = client.hashes["ingest:workers:test-worker"]
+    assert stats["processed"] == 1 and stats["failed"] == 0 and stats["batches"] == 1
+    assert stats["invoices_per_sec"] > 0
+
+
+def test_auto_compliance_runs_checks_in_the_batch_transaction(env):
+    from app.core.metrics import metrics
+    from app.db.models import Rule, Run, Violation
+    from app.db.models import AuditLog
+    from app.services.audit_service import audit_writer
+    from app.services.compliance_engine import ComplianceEngine
+    from app.services.rule_engine import RuleRegistry
+
+    engine, db, processor, _ = env
+    processor.auto_compliance = True
+    # Fresh database: the rules get seeded by the batch itself
+    processor.compliance = ComplianceEngine(processor.db, RuleRegistry(ttl_seconds=60))
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+    errors_before = metrics.get("ingestion_auto_compliance_errors")
+
+    assert processor.process_batch([1, 2, 3, 4]) == (3, 1)
+    assert len(commits) == 2
+
+    assert metrics.get("ingestion_auto_compliance_errors") == errors_before
+    runs = db.query(Run).order_by(Run.invoice_id).all()
+    assert [(r.invoice_id, r.user_id, r.status) for r in runs] == [(n, 1, "completed") for n in (1, 2, 3)]
+    assert db.query(Rule).count() == 6
+    # No GSTIN in the extracted text
+    assert db.query(Violation).filter(Violation.run_id == runs[0].run_id, Violation.rule_id == "RULE_001").count() == 1
+
+    assert audit_writer.flush(timeout=5)
+    events = db.query(AuditLog).filter(AuditLog.event == "compliance_run_auto").all()
+    assert sorted(e.run_id for e in events) == sorted(r.run_id for r in runs)
+
+
+def test_auto_compliance_failure_keeps_extraction(env, monkeypatch):
+    from sqlalchemy import insert
+    from app.db.models import Run
+
+    _, db, processor, _ = env
+    processor.auto_compliance = True
+
+    def half_done(invoices, ruleset=None):
+        processor.db.execute(insert(Run), [{"run_id": "partial", "user_id": 1, "invoice_id": 1}])
+        raise RuntimeError("rule blew up")
+
+    monkeypatch.setattr(processor.compliance, "stage_runs", half_done)
+    assert processor.process_batch([1, 2]) == (2, 0)
+    assert db.query(Run).count() == 0
+    assert db.query(InvoiceData).count() == 2
+
+
+def test_invoices_reclaimed_mid_batch_are_left_to_their_new_owner(env):
+    from app.core.metrics import metrics
+
+    engine, db, processor, _ = env
+    ocr = processor.extraction.ocr.read_pdf.side_effect
+    lost_before = metrics.get("ingestion_leases_lost")
+
+    def slow_ocr(path):
+        if path == "/files/2.pdf":
+            # Our lease ran out and another worker reclaimed the invoice
+            other = sessionmaker(bind=engine)()
+            other.query(Invoice).filter(Invoice.id == 2).update({"lease_owner": "other"})
+            other.commit()
+            other.close()
+        return ocr(path)
+
+    processor.extraction.ocr.read_pdf.side_effect = slow_ocr
+    assert processor.process_batch([1, 2, 3, 4]) == (2, 1)
+    assert metrics.get("ingestion_leases_lost") == lost_before + 1
+
+    db.expire_all()
+    assert sorted(row.invoice_id for row in db.query(InvoiceData)) == [1, 3]
+    stolen = db.get(Invoice, 2)
+    assert stolen.status == "processing" and stolen.lease_owner == "other"